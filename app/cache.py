@@ -0,0 +1,350 @@
+# app/cache.py
+
+import os
+import re
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+DSL_CACHE_ENABLED = os.getenv("DSL_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+DSL_CACHE_MAX_ENTRIES = int(os.getenv("DSL_CACHE_MAX_ENTRIES", "1024"))
+DSL_CACHE_TTL = float(os.getenv("DSL_CACHE_TTL", "3600"))
+DSL_CACHE_SIMILARITY = float(os.getenv("DSL_CACHE_SIMILARITY", "0.85"))
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024"))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "3600"))
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_CHECK_INTERVAL = float(os.getenv("RESULT_CACHE_CHECK_INTERVAL", "5"))
+
+# Filler words that do not change the meaning of a query for this index (never negations, see NEGATIONS)
+STOPWORDS = {
+    "a", "an", "the", "in", "at", "on", "of", "from", "to", "is", "are", "who", "whom", "which",
+    "what", "that", "those", "these", "all", "any", "me", "please", "show", "list", "find", "get",
+    "give", "people", "person", "persons", "everyone", "anyone", "live", "lives", "living", "based",
+    "located", "do", "does",
+}
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+# Words that invert a query; "didn't" is normalized to "didn t", hence the bare "t" after an n-word
+NEGATIONS = {"not", "no", "never", "none", "nor", "neither", "without", "except", "excluding"}
+_NEGATION = re.compile(rf"\b(?:{'|'.join(sorted(NEGATIONS))})\b|(?<=n) t\b")
+
+
+def normalize_query(nl_query: str) -> str:
+    """
+    Normalize a natural language query for exact-match lookups.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+
+    Returns:
+        str: The lower-cased query with punctuation removed and whitespace collapsed.
+    """
+    return _SPACES.sub(" ", _PUNCT.sub(" ", nl_query.lower())).strip()
+
+
+def shingles(text: str, n: int = 3) -> frozenset:
+    """
+    Build the character n-gram signature of a normalized query, ignoring stopwords.
+
+    Args:
+        text (str): A query already passed through `normalize_query`.
+        n (int): The shingle length (default is 3).
+
+    Returns:
+        frozenset: The set of character n-grams of the query's content words.
+    """
+    content = " ".join(w for w in text.split() if w not in STOPWORDS) or text
+    if len(content) <= n:
+        return frozenset([content])
+    return frozenset(content[i:i + n] for i in range(len(content) - n + 1))
+
+
+def negations(text: str) -> list:
+    """
+    List the negation words of a normalized query, so "joined" and "never joined" can be told apart.
+
+    Args:
+        text (str): A query already passed through `normalize_query`.
+
+    Returns:
+        list: The sorted negation words ("n't" contractions count as "not").
+    """
+    return sorted("not" if m == " t" else m for m in _NEGATION.findall(text))
+
+
+def canonical_json(obj: Any) -> str:
+    """
+    Serialize a JSON value deterministically, so equal DSL bodies produce equal cache keys.
+
+    Args:
+        obj: Any JSON-serializable value.
+
+    Returns:
+        str: Compact JSON with sorted object keys.
+    """
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class LRUCache:
+    """
+    A thread-safe LRU cache with per-entry TTL and an entry-count cap.
+
+    Args:
+        max_entries (int): Maximum number of entries kept before the least recently used is evicted.
+        ttl (float): Time-to-live of an entry in seconds (0 disables expiry).
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for `key`, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Insert or refresh `key`, evicting least recently used entries over the cap."""
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, keeping the counters."""
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss/eviction counters and the current size."""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _remove(self, key: Hashable):
+        # Called with the lock held; subclasses extend this to keep side indexes in sync
+        self._data.pop(key, None)
+
+
+class SemanticDSLCache(LRUCache):
+    """
+    Cache of generated DSL keyed by natural language query.
+
+    Lookups first try an exact match on the normalized query, then an approximate match on the
+    character-shingle signature (Jaccard similarity above `similarity`). Queries whose numbers differ
+    ("top 5" vs "top 10") or negations ("joined" vs "never joined") differ never match approximately.
+    The system prompt is read once at startup, so entries stay valid for the life of the process.
+
+    Args:
+        max_entries (int): Maximum number of cached queries.
+        ttl (float): Time-to-live of an entry in seconds.
+        similarity (float): Minimum Jaccard similarity for an approximate hit (>= 1 disables it).
+    """
+
+    def __init__(self, max_entries: int = DSL_CACHE_MAX_ENTRIES, ttl: float = DSL_CACHE_TTL,
+                 similarity: float = DSL_CACHE_SIMILARITY):
+        super().__init__(max_entries, ttl)
+        self.similarity = similarity
+        self.approx_hits = 0
+        self._signatures: Dict[str, frozenset] = {}
+        self._postings: Dict[str, set] = {}
+
+    def get(self, nl_query: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the DSL for a natural language query.
+
+        Args:
+            nl_query (str): The natural language query from the user.
+
+        Returns:
+            Optional[dict]: A private copy of the cached DSL, or None on a miss.
+        """
+        key = normalize_query(nl_query)
+        dsl = super().get(key)
+        if dsl is None and self.similarity < 1:
+            dsl = self._approximate(key)
+        return copy.deepcopy(dsl) if dsl is not None else None
+
+    def put(self, nl_query: str, dsl: Dict[str, Any]):
+        """
+        Store the DSL generated for a natural language query.
+
+        Args:
+            nl_query (str): The natural language query from the user.
+            dsl (dict): The validated DSL to cache (a copy is stored).
+        """
+        key = normalize_query(nl_query)
+        super().put(key, copy.deepcopy(dsl))
+        with self._lock:
+            if key in self._data and key not in self._signatures:
+                sig = shingles(key)
+                self._signatures[key] = sig
+                for s in sig:
+                    self._postings.setdefault(s, set()).add(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters, including how many hits were approximate."""
+        return {**super().stats(), "approx_hits": self.approx_hits}
+
+    def _approximate(self, key: str) -> Optional[Dict[str, Any]]:
+        # Count shared shingles per candidate through the postings index instead of scanning all entries
+        sig = shingles(key)
+        digits = _DIGITS.findall(key)
+        negated = negations(key)
+        with self._lock:
+            overlap: Dict[str, int] = {}
+            for s in sig:
+                for cand in self._postings.get(s, ()):
+                    overlap[cand] = overlap.get(cand, 0) + 1
+            best, best_score = None, self.similarity
+            for cand, shared in overlap.items():
+                score = shared / (len(sig) + len(self._signatures[cand]) - shared)
+                if score >= best_score and _DIGITS.findall(cand) == digits and negations(cand) == negated:
+                    best, best_score = cand, score
+        if best is None:
+            return None
+        # Go through LRUCache.get so TTL, recency and counters stay consistent
+        dsl = super().get(best)
+        if dsl is not None:
+            with self._lock:
+                self.misses -= 1
+                self.approx_hits += 1
+        return dsl
+
+    def _remove(self, key: str):
+        super()._remove(key)
+        for s in self._signatures.pop(key, ()):
+            keys = self._postings.get(s)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[s]
+
+
+class ResultCache(LRUCache):
+    """
+    Cache of Elasticsearch responses keyed by index and canonical search body, bounded by size in bytes.
+
+    Responses are stored as serialized JSON, which both measures their size and hands every caller
+    a private copy. Entries belong to an index generation (the concrete indices behind ES_INDEX and
+    the `_meta.generation` counter that ingest runs bump); when the generation changes the cache
+    empties itself.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached responses.
+        ttl (float): Time-to-live of an entry in seconds.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, ttl: float = RESULT_CACHE_TTL):
+        super().__init__(max_entries=0, ttl=ttl)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.invalidations = 0
+        self.generation: Optional[Hashable] = None
+        self.checked_at = float("-inf")
+        self._sizes: Dict[Hashable, int] = {}
+
+    def get(self, index: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Look up the response of a search.
+
+        Args:
+            index (str): The target index or alias.
+            body (dict): The search body as sent to Elasticsearch.
+
+        Returns:
+            Optional[dict]: A private copy of the cached response, or None on a miss.
+        """
+        data = super().get((index, canonical_json(body)))
+        return json.loads(data) if data is not None else None
+
+    def put(self, index: str, body: Dict[str, Any], response: Dict[str, Any]):
+        """
+        Store the response of a search, evicting least recently used entries over `max_bytes`.
+
+        Args:
+            index (str): The target index or alias.
+            body (dict): The search body as sent to Elasticsearch.
+            response (dict): The search response. Responses larger than `max_bytes` are not cached.
+        """
+        key = (index, canonical_json(body))
+        data = json.dumps(response, separators=(",", ":"))
+        if len(data) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires_at, data)
+            self._sizes[key] = len(data)
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def needs_check(self) -> bool:
+        """Return True when the index generation was last checked over RESULT_CACHE_CHECK_INTERVAL ago."""
+        return time.monotonic() - self.checked_at >= RESULT_CACHE_CHECK_INTERVAL
+
+    def set_generation(self, generation: Optional[Hashable]):
+        """
+        Record the current index generation, emptying the cache if it changed.
+
+        Args:
+            generation: The generation token, or None if it could not be read (always invalidates).
+        """
+        self.checked_at = time.monotonic()
+        if generation is None or generation != self.generation:
+            if self._data:
+                self.invalidations += 1
+            self.clear()
+            self.generation = generation
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters, the cached bytes and the number of generation invalidations."""
+        return {**super().stats(), "bytes": self.bytes, "invalidations": self.invalidations}
+
+    def _remove(self, key: Hashable):
+        super()._remove(key)
+        self.bytes -= self._sizes.pop(key, 0)
+
+
+# Shared caches used by the API
+dsl_cache = SemanticDSLCache()
+result_cache = ResultCache()
+summary_cache = LRUCache(SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL)
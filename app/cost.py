@@ -0,0 +1,298 @@
+# app/cost.py
+
+import os
+import re
+import copy
+import logging
+from typing import Any, Dict, List, Tuple
+from dotenv import load_dotenv
+from .validators import COMPOUND_QUERIES, METRIC_AGGS
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+QUERY_COST_BUDGET = float(os.getenv("QUERY_COST_BUDGET", "100"))
+TERMS_SIZE_CAP = int(os.getenv("TERMS_SIZE_CAP", "100"))
+TRACK_TOTAL_HITS_LIMIT = int(os.getenv("TRACK_TOTAL_HITS_LIMIT", "10000"))
+
+log = logging.getLogger("nl2es")
+
+# Text fields indexed with the ngram analyzer (see es/mapping_v2.json); matches on them touch many postings
+NGRAM_FIELDS = {"People", "Families", "Locations", "Events"}
+
+# Keyword fields without a normalizer (see es/mapping_v2.json): a match on them is already an exact
+# term, whatever its operator. The text fields above them (ngram or standard analyzed) are not.
+KEYWORD_FIELDS = {"People.keyword", "Families.keyword", "Locations.keyword", "City.keyword", "Country.keyword"}
+
+# Queries that only filter; scoring them is wasted work
+NON_SCORING = {"term", "terms", "range", "exists", "ids"}
+
+# Relative cost of the work each construct makes a shard do
+CLAUSE_COST = 1.0
+NGRAM_MATCH_COST = 2.0
+PATTERN_COST = {"prefix": 3.0, "fuzzy": 5.0, "wildcard": 10.0, "regexp": 10.0}
+LEADING_WILDCARD_COST = 50.0
+QUERY_STRING_COST = 5.0
+BUCKETS_PER_COST = 100.0
+HITS_PER_COST = 50.0
+DEFAULT_BUCKETS = 10
+HISTOGRAM_BUCKETS = 100
+
+
+# A query_string term starting with a wildcard, or a /regex/, scans the whole term dictionary
+_EXPENSIVE_SYNTAX = re.compile(r"(?:^|[\s(:])[*?]|(?:^|[\s(:])/")
+
+
+def _as_list(value: Any) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def _leaf_field(body: Dict[str, Any]) -> Tuple[str, Any]:
+    # Leaf queries are {field: value or params}, optionally next to boost/_name
+    for field, value in body.items():
+        if field not in {"boost", "_name"}:
+            return field, value
+    return "", None
+
+
+def query_cost(query: Dict[str, Any]) -> float:
+    """
+    Estimate the cost of a query clause and its sub-queries.
+
+    Args:
+        query (dict): A validated query clause.
+
+    Returns:
+        float: The cost in units of one simple clause.
+    """
+    (kind, body), = query.items()
+    if kind in COMPOUND_QUERIES:
+        return CLAUSE_COST + sum(
+            query_cost(sub) for key in COMPOUND_QUERIES[kind] for sub in _as_list(body.get(key, []))
+        )
+    if kind in PATTERN_COST:
+        field, value = _leaf_field(body)
+        pattern = value.get("value", value.get("wildcard", "")) if isinstance(value, dict) else value
+        if kind in {"wildcard", "regexp"} and str(pattern)[:1] in {"*", "?", "."}:
+            return LEADING_WILDCARD_COST
+        return PATTERN_COST[kind]
+    if kind == "terms":
+        _, values = _leaf_field(body)
+        return CLAUSE_COST + len(values) / BUCKETS_PER_COST if isinstance(values, list) else CLAUSE_COST
+    if kind.startswith("match") and kind != "match_all":
+        field, _ = _leaf_field(body)
+        return NGRAM_MATCH_COST if field in NGRAM_FIELDS else CLAUSE_COST
+    if kind == "multi_match":
+        return NGRAM_MATCH_COST * max(1, len(body.get("fields", [])))
+    if kind in {"query_string", "simple_query_string"}:
+        if _EXPENSIVE_SYNTAX.search(str(body.get("query", ""))):
+            return LEADING_WILDCARD_COST
+        return QUERY_STRING_COST if kind == "query_string" else NGRAM_MATCH_COST
+    return CLAUSE_COST
+
+
+def _agg_buckets(kind: str, body: Dict[str, Any]) -> int:
+    # How many buckets an aggregation produces per parent bucket
+    if kind in METRIC_AGGS:
+        return body.get("size", 1) if kind == "top_hits" else 1
+    if kind in {"histogram", "date_histogram"}:
+        return HISTOGRAM_BUCKETS
+    if kind in {"range", "date_range"}:
+        return len(body.get("ranges", [])) or 1
+    if kind == "filters":
+        return len(body.get("filters", {})) or 1
+    if kind in {"filter", "missing", "nested", "reverse_nested"}:
+        return 1
+    return body.get("size", DEFAULT_BUCKETS)
+
+
+def aggs_cost(aggs: Dict[str, Any], parent_buckets: int = 1) -> float:
+    """
+    Estimate the cost of an aggregations object from the number of buckets it can produce.
+
+    Sub-aggregations multiply: a terms agg of size 50 under one of size 50 may build 2,500 buckets.
+
+    Args:
+        aggs (dict): A validated aggregations object.
+        parent_buckets (int): Buckets of the enclosing aggregation (1 at the top level).
+
+    Returns:
+        float: The cost in units of one simple clause.
+    """
+    total = 0.0
+    for agg in aggs.values():
+        kind = next(k for k in agg if k not in {"aggs", "aggregations", "meta"})
+        buckets = parent_buckets * _agg_buckets(kind, agg[kind])
+        total += CLAUSE_COST + buckets / BUCKETS_PER_COST
+        sub = agg.get("aggs", agg.get("aggregations"))
+        if sub:
+            total += aggs_cost(sub, buckets)
+    return total
+
+
+def estimate_cost(dsl: Dict[str, Any]) -> float:
+    """
+    Estimate the cost of a validated DSL: its query, aggregations and number of hits fetched.
+
+    Args:
+        dsl (dict): The validated DSL query.
+
+    Returns:
+        float: The cost, comparable to QUERY_COST_BUDGET.
+    """
+    cost = query_cost(dsl["query"]) + dsl.get("size", 10) / HITS_PER_COST
+    if dsl.get("aggs"):
+        cost += aggs_cost(dsl["aggs"])
+    return cost
+
+
+def _keyword_terms(query: Dict[str, Any], rewrites: List[str]) -> Dict[str, Any]:
+    # Replace matches on keyword fields, which analyze to the value itself, with the equivalent term query
+    (kind, body), = query.items()
+    if kind in COMPOUND_QUERIES:
+        out = dict(body)
+        for key in COMPOUND_QUERIES[kind]:
+            if key in body:
+                subs = [_keyword_terms(sub, rewrites) for sub in _as_list(body[key])]
+                out[key] = subs if isinstance(body[key], list) else subs[0]
+        return {kind: out}
+    if kind != "match" or len(body) != 1:
+        return query
+    field, value = _leaf_field(body)
+    if isinstance(value, dict):
+        if set(value) - {"query", "operator"}:
+            return query
+        value = value.get("query")
+    if field not in KEYWORD_FIELDS or not isinstance(value, str):
+        return query
+    rewrites.append(f"match {field} -> term {field}")
+    return {"term": {field: value}}
+
+
+def _filter_context(query: Dict[str, Any], rewrites: List[str]) -> Dict[str, Any]:
+    # Move non-scoring clauses of bool.must into bool.filter
+    (kind, body), = query.items()
+    if kind != "bool" or "must" not in body:
+        return query
+    must = _as_list(body["must"])
+    moved = [q for q in must if next(iter(q)) in NON_SCORING]
+    if not moved:
+        return query
+    out = dict(body)
+    out["must"] = [q for q in must if next(iter(q)) not in NON_SCORING]
+    if not out["must"]:
+        del out["must"]
+    out["filter"] = _as_list(body.get("filter", [])) + moved
+    rewrites.append(f"{len(moved)} must clause(s) -> filter")
+    return {"bool": out}
+
+
+def _cap_terms(aggs: Dict[str, Any], cap: int, rewrites: List[str]):
+    # Clamp terms agg sizes in place, at every level
+    for name, agg in aggs.items():
+        for kind in ("terms", "significant_terms"):
+            if kind in agg and agg[kind].get("size", DEFAULT_BUCKETS) > cap:
+                agg[kind]["size"] = cap
+                rewrites.append(f"{name}.size -> {cap}")
+        sub = agg.get("aggs", agg.get("aggregations"))
+        if sub:
+            _cap_terms(sub, cap, rewrites)
+
+
+def _drop_sub_aggs(aggs: Dict[str, Any], rewrites: List[str]):
+    # Keep only the top level of the aggregation tree
+    for name, agg in aggs.items():
+        for key in ("aggs", "aggregations"):
+            if agg.pop(key, None) is not None:
+                rewrites.append(f"dropped sub-aggregations of {name}")
+
+
+def rewrite(dsl: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Apply rewrites that make the query cheaper to compute without changing which documents match.
+
+    Clauses moved to filter context no longer add to the score, and the caps bound the work, so
+    the hit order and long aggregation lists can still differ.
+
+    - `match` on a keyword field becomes the equivalent `term`. Matches on analyzed text fields are
+      kept: an exact keyword term would shrink their (OR or ngram) result set.
+    - Non-scoring clauses move from bool.must to bool.filter; aggregation-only queries run entirely
+      in filter context.
+    - Terms aggregation sizes are capped at TERMS_SIZE_CAP and track_total_hits at TRACK_TOTAL_HITS_LIMIT.
+
+    Args:
+        dsl (dict): The validated DSL query (not modified).
+
+    Returns:
+        tuple: The rewritten DSL and a description of each rewrite.
+    """
+    dsl = copy.deepcopy(dsl)
+    rewrites: List[str] = []
+    dsl["query"] = _filter_context(_keyword_terms(dsl["query"], rewrites), rewrites)
+
+    # Scores are not returned when no hits are
+    if dsl.get("size") == 0 and next(iter(dsl["query"])) != "match_all":
+        dsl["query"] = {"bool": {"filter": [dsl["query"]]}}
+        rewrites.append("query -> filter context (size 0)")
+
+    if dsl.get("aggs"):
+        _cap_terms(dsl["aggs"], TERMS_SIZE_CAP, rewrites)
+
+    track = dsl.get("track_total_hits")
+    if track is True or not isinstance(track, (bool, int)) or track > TRACK_TOTAL_HITS_LIMIT:
+        dsl["track_total_hits"] = TRACK_TOTAL_HITS_LIMIT
+    return dsl, rewrites
+
+
+def degrade(dsl: Dict[str, Any], budget: float, rewrites: List[str]) -> Dict[str, Any]:
+    """
+    Make an over-budget DSL cheaper, one step at a time, until it fits.
+
+    Steps: halve terms aggregation sizes down to 10, drop sub-aggregations, fetch at most 10 hits.
+
+    Args:
+        dsl (dict): The rewritten DSL (modified in place).
+        budget (float): The maximum allowed cost.
+        rewrites (list): Descriptions of the changes, appended to.
+
+    Returns:
+        dict: The degraded DSL, which may still be over budget.
+    """
+    aggs = dsl.get("aggs")
+    cap = TERMS_SIZE_CAP
+    while aggs and estimate_cost(dsl) > budget and cap > 10:
+        cap = max(10, cap // 2)
+        _cap_terms(aggs, cap, rewrites)
+    if aggs and estimate_cost(dsl) > budget:
+        _drop_sub_aggs(aggs, rewrites)
+    if estimate_cost(dsl) > budget and dsl.get("size", 10) > 10:
+        dsl["size"] = 10
+        rewrites.append("size -> 10")
+    return dsl
+
+
+def guard_dsl(dsl: Dict[str, Any], budget: float = QUERY_COST_BUDGET) -> Dict[str, Any]:
+    """
+    Cost-check a validated DSL before execution: rewrite it, degrade it if over budget, or reject it.
+
+    Args:
+        dsl (dict): The validated DSL query (not modified).
+        budget (float): The maximum allowed cost (default QUERY_COST_BUDGET).
+
+    Returns:
+        dict: The DSL to execute.
+
+    Raises:
+        ValueError: If the DSL is still over budget after degrading it.
+    """
+    guarded, rewrites = rewrite(dsl)
+    cost = estimate_cost(guarded)
+    if cost > budget:
+        guarded = degrade(guarded, budget, rewrites)
+    final = estimate_cost(guarded)
+    if rewrites:
+        log.info("Query cost %.1f -> %.1f after rewrites: %s", cost, final, "; ".join(rewrites))
+    if final > budget:
+        raise ValueError(f"Query too expensive (cost {final:.0f} > budget {budget:.0f})")
+    return guarded
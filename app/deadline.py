@@ -0,0 +1,98 @@
+# app/deadline.py
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration: the time budget of a request when it does not ask for one, and the largest it may ask for
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", "120"))
+
+# Shortest per-call timeout derived from a deadline; calls with less time left fail fast instead
+MIN_CALL_TIMEOUT = 0.05
+
+# Monotonic time by which the current request must be answered (None: no deadline)
+_deadline: ContextVar[Optional[float]] = ContextVar("nl2es_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the current request runs out of time."""
+
+
+def request_budget(requested: Optional[float] = None) -> float:
+    """Return the time budget of a request: the one it asked for (or REQUEST_TIMEOUT), capped at MAX_REQUEST_TIMEOUT."""
+    return min(requested or REQUEST_TIMEOUT, MAX_REQUEST_TIMEOUT)
+
+
+def set_deadline(seconds: Optional[float]) -> Optional[float]:
+    """
+    Start the deadline of the current request (and the tasks it spawns).
+
+    Args:
+        seconds (Optional[float]): The time budget from now; None or 0 clears the deadline.
+
+    Returns:
+        Optional[float]: The deadline as a `time.monotonic()` value.
+    """
+    deadline = time.monotonic() + seconds if seconds else None
+    _deadline.set(deadline)
+    return deadline
+
+
+def current() -> Optional[float]:
+    """Return the deadline of the current request as a `time.monotonic()` value, or None."""
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Return the seconds left until the current request's deadline (possibly negative), or None."""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def expired() -> bool:
+    """Return True if the current request has a deadline and it has passed."""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def budget(default: float) -> float:
+    """Return a call timeout: `default`, shortened to the time left before the deadline but never below MIN_CALL_TIMEOUT."""
+    left = remaining()
+    return default if left is None else max(MIN_CALL_TIMEOUT, min(default, left))
+
+
+@asynccontextmanager
+async def enforce(stage: str, reserve: float = 0.0) -> AsyncIterator[None]:
+    """
+    Cancel the awaits inside the block when the current request's deadline passes.
+
+    Args:
+        stage (str): The stage name used in the error message, e.g. "planning".
+        reserve (float): Seconds before the deadline at which the block is cancelled, kept for later stages.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed before or during the block. Other `TimeoutError`s
+                          raised inside the block are re-raised unchanged.
+    """
+    left = remaining()
+    if left is not None:
+        left -= reserve
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+    timeout = asyncio.timeout(left)
+    try:
+        async with timeout:
+            yield
+    except TimeoutError as e:
+        # Only the deadline firing is a DeadlineExceeded; other timeouts raised in the block propagate as they are
+        if isinstance(e, DeadlineExceeded) or not timeout.expired():
+            raise
+        raise DeadlineExceeded(f"Deadline exceeded during {stage}") from e
@@ -0,0 +1,100 @@
+# app/embeddings.py
+
+import os
+import threading
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_DIMS = int(os.getenv("EMBED_DIMS", "384"))
+EMBED_FIELD = os.getenv("EMBED_FIELD", "embedding")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Load the local CPU embedding model once.
+
+    Returns:
+        SentenceTransformer: The embedding model named by EMBED_MODEL.
+
+    Raises:
+        ImportError: If the optional `sentence-transformers` dependency is not installed.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError(
+                        "Vector search needs the optional dependency: pip install 'elastic_semantic_search[vectors]'"
+                    ) from e
+                _model = SentenceTransformer(EMBED_MODEL, device="cpu")
+    return _model
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts in batches of EMBED_BATCH_SIZE.
+
+    Args:
+        texts (List[str]): The texts to embed.
+
+    Returns:
+        np.ndarray: A float32 array of shape (len(texts), EMBED_DIMS) with unit-length rows.
+    """
+    if not texts:
+        return np.empty((0, EMBED_DIMS), dtype=np.float32)
+    return get_model().encode(
+        texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True
+    ).astype(np.float32)
+
+
+@lru_cache(maxsize=4096)
+def embed_query(nl_query: str) -> tuple:
+    """
+    Embed a natural language query, caching recent queries.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+
+    Returns:
+        tuple: The query vector.
+    """
+    return tuple(embed_texts([nl_query])[0].tolist())
+
+
+def doc_text(src: Dict[str, str]) -> str:
+    """Return the text embedded for a document: its source fields joined in a fixed order."""
+    return " | ".join(src.get(f, "") for f in ("People", "Families", "Locations", "Events"))
+
+
+def vector_mapping(dims: int = EMBED_DIMS, quantize: bool = False) -> Dict[str, object]:
+    """
+    Return the mapping of the dense_vector field.
+
+    Args:
+        dims (int): The vector dimensions of EMBED_MODEL.
+        quantize (bool): Store the HNSW graph vectors as int8 (about 4x less memory, slightly lower recall).
+
+    Returns:
+        dict: The field mapping, indexed for approximate kNN with cosine similarity.
+    """
+    return {
+        "type": "dense_vector",
+        "dims": dims,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {"type": "int8_hnsw" if quantize else "hnsw"},
+    }
@@ -1,43 +1,66 @@
 # app/es.py
 
 import os
-from typing import Dict
-from elasticsearch import Elasticsearch
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from .es_client import ES_URL, make_async_client, bounded
+from .deadline import remaining
+from .embeddings import EMBED_FIELD, embed_query
+from .cache import result_cache, canonical_json, RESULT_CACHE_ENABLED
+from .singleflight import SingleFlight
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Configuration
-ES_URL = os.getenv("ES_URL", "http://localhost:9200")
 ES_INDEX = os.getenv("ES_INDEX", "people-index")
 MAX_SIZE = int(os.getenv("MAX_SIZE", "100"))
+ES_CONCURRENCY = int(os.getenv("ES_CONCURRENCY", "32"))
+HYBRID_WINDOW = int(os.getenv("HYBRID_WINDOW", "50"))
+KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", "100"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+FILTER_PATH_ENABLED = os.getenv("FILTER_PATH_ENABLED", "true").lower() in {"1", "true", "yes"}
 
-# Initialize Elasticsearch client
-es = Elasticsearch(ES_URL)
+# The response parts the API reads; Elasticsearch drops the rest (_index, _shards, ...) before sending
+SEARCH_FILTER_PATH = [
+    "took", "timed_out", "pit_id", "hits.total", "hits.max_score", "hits.hits._id", "hits.hits._score",
+    "hits.hits._source", "hits.hits.sort", "aggregations", "error",
+]
+MSEARCH_FILTER_PATH = [f"responses.{path}" for path in SEARCH_FILTER_PATH] + ["responses.status"]
 
+# Share of the time left before the deadline given to shards as the search `timeout`, leaving the rest
+# for the coordinating node to answer with what the shards returned before the client gives up
+SEARCH_TIMEOUT_SHARE = 0.8
 
-def execute_search(dsl: Dict[str, any]) -> Dict[str, any]:
+# Elasticsearch client for the API (ES_URL may list several nodes; see app.es_client for the transport policy);
+# one instance shares its connection pool across requests
+aes = make_async_client(ES_URL, connections_per_node=ES_CONCURRENCY)
+
+# Upper bound on concurrent in-flight ES calls from the async path
+es_semaphore = asyncio.Semaphore(ES_CONCURRENCY)
+
+# Identical searches in flight at the same time share one round-trip
+search_flight = SingleFlight("search")
+
+
+def build_search(dsl: Dict[str, any]) -> Tuple[str, Dict[str, any]]:
     """
-    Executes a DSL query against Elasticsearch.
+    Split a DSL query into the target index and the request body sent to Elasticsearch.
 
     Args:
         dsl (dict): The Elasticsearch query in the form of a dictionary, containing the query, aggregation,
-                    size, and sorting parameters.
+                    size, and sorting parameters, and optionally the `_source` fields to return.
 
     Returns:
-        dict: The search result from Elasticsearch containing the matching documents and any aggregations.
-
-    Note:
-        - The query is executed against the index specified in the `dsl` argument or the default index `ES_INDEX`.
-        - The `size` parameter is enforced to respect the `MAX_SIZE` limit set in the configuration.
-        - If the query is an aggregation-only query, the `size` is set to 0.
+        tuple: The index name and the filtered search body.
     """
     # Extract index from DSL, using the default index if not specified
     index = dsl.get("index", ES_INDEX)
 
-    # Filter the DSL to include only valid parameters: query, aggs, size, and sort
-    body = {k: v for k, v in dsl.items() if k in {"query", "aggs", "size", "sort"}}
+    # Filter the DSL to include only valid parameters: query, aggs, size, sort, and the hit-count limit
+    body = {k: v for k, v in dsl.items() if k in {"query", "aggs", "size", "sort", "track_total_hits"}}
 
     # If it's an aggregation-only query (no size specified), set size to 0
     if "aggs" in body and "size" not in body:
@@ -47,5 +70,261 @@ def execute_search(dsl: Dict[str, any]) -> Dict[str, any]:
     if body.get("size", 10) > MAX_SIZE:
         body["size"] = MAX_SIZE
 
-    # Execute the search query against Elasticsearch and return the results
-    return es.search(index=index, body=body)
+    # Return only the requested source fields, and never the stored embeddings
+    body["_source"] = {"excludes": [EMBED_FIELD]}
+    includes = dsl.get("_source")
+    if isinstance(includes, str):
+        includes = [includes]
+    if isinstance(includes, list) and includes and all(isinstance(f, str) for f in includes):
+        body["_source"]["includes"] = includes
+
+    return index, body
+
+
+def filter_path(paths: List[str]) -> Optional[List[str]]:
+    """Return the `filter_path` to send with a request, or None when FILTER_PATH_ENABLED is off."""
+    return paths if FILTER_PATH_ENABLED else None
+
+
+def with_search_timeout(body: Dict[str, any]) -> Dict[str, any]:
+    """
+    Add the server-side `timeout` for the time left before the current request's deadline.
+
+    Shards still running when it passes stop and the response carries the hits found so far with
+    `timed_out: true`. Without a deadline the body is returned unchanged.
+
+    Args:
+        body (dict): The search body (not modified).
+
+    Returns:
+        dict: The body to send.
+    """
+    left = remaining()
+    if left is None:
+        return body
+    return {**body, "timeout": f"{max(1, int(left * 1000 * SEARCH_TIMEOUT_SHARE))}ms"}
+
+
+def storable(index: str, res: Dict[str, any]) -> bool:
+    """Cache only complete responses: a timed-out search holds partial results."""
+    return cacheable(index) and not res.get("timed_out")
+
+
+def request_cache_param(body: Dict[str, any]) -> Optional[bool]:
+    """Ask for the shard request cache on aggregation-only (size 0) searches; leave the default otherwise."""
+    return True if body.get("size") == 0 else None
+
+
+def cacheable(index: str) -> bool:
+    """Only searches on ES_INDEX are cached: it is the index whose generation is tracked."""
+    return RESULT_CACHE_ENABLED and index == ES_INDEX
+
+
+def index_generation(mappings: Dict[str, any]) -> tuple:
+    """
+    Build the generation token of ES_INDEX from its `get_mapping` response.
+
+    The token changes when the alias moves to other concrete indices (reindex) or when an ingest
+    run bumps `_meta.generation` (see ingest.index_settings.bump_generation).
+
+    Args:
+        mappings (dict): The `get_mapping` response body.
+
+    Returns:
+        tuple: Sorted (concrete index, generation) pairs.
+    """
+    return tuple(sorted(
+        (name, (body.get("mappings") or {}).get("_meta", {}).get("generation", 0))
+        for name, body in mappings.items()
+    ))
+
+
+async def acheck_generation():
+    """Invalidate the result cache if ES_INDEX changed, polling at most every RESULT_CACHE_CHECK_INTERVAL."""
+    if not RESULT_CACHE_ENABLED or not result_cache.needs_check():
+        return
+    # Claim the check before awaiting so concurrent requests do not all poll
+    result_cache.checked_at = time.monotonic()
+    try:
+        async with es_semaphore:
+            resp = await bounded(aes).indices.get_mapping(index=ES_INDEX)
+        generation = index_generation(resp.body)
+    except Exception:
+        generation = None
+    result_cache.set_generation(generation)
+
+
+async def aexecute_search(dsl: Dict[str, any]) -> Dict[str, any]:
+    """
+    Executes a DSL query against Elasticsearch, bounded by ES_CONCURRENCY.
+
+    Args:
+        dsl (dict): The Elasticsearch query in the form of a dictionary, containing the query, aggregation,
+                    size, and sorting parameters.
+
+    Returns:
+        dict: The search result from Elasticsearch containing the matching documents and any aggregations.
+
+    Note:
+        - The query is executed against the index specified in the `dsl` argument or the default index `ES_INDEX`.
+        - The `size` parameter is enforced to respect the `MAX_SIZE` limit set in the configuration.
+        - If the query is an aggregation-only query, the `size` is set to 0.
+        - Responses are served from `result_cache` until ES_INDEX's generation changes or they expire.
+        - Concurrent calls for the same index and search body share one Elasticsearch call.
+    """
+    index, body = build_search(dsl)
+    if cacheable(index):
+        await acheck_generation()
+        cached = result_cache.get(index, body)
+        if cached is not None:
+            return cached
+    return await search_flight.do((index, canonical_json(body)), lambda: _asearch(index, body))
+
+
+async def _asearch(index: str, body: Dict[str, any]) -> Dict[str, any]:
+    # One search round-trip, cached when complete
+    async with es_semaphore:
+        resp = await bounded(aes).search(index=index, body=with_search_timeout(body),
+                                         request_cache=request_cache_param(body),
+                                         filter_path=filter_path(SEARCH_FILTER_PATH))
+    if storable(index, resp.body):
+        result_cache.put(index, body, resp.body)
+    return resp.body
+
+
+async def amulti_search(dsls: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Execute several DSL queries in a single `_msearch` round-trip.
+
+    Searches found in the result cache are not sent; successful responses are cached.
+
+    Args:
+        dsls (list): The DSL queries, in the same form accepted by `aexecute_search`.
+
+    Returns:
+        list: One entry per DSL, in order: either a search result or an `{"error": ..., "status": ...}` item.
+    """
+    await acheck_generation()
+    results: List[Optional[Dict[str, any]]] = [None] * len(dsls)
+    pending, searches = [], []
+    for i, dsl in enumerate(dsls):
+        index, body = build_search(dsl)
+        if cacheable(index):
+            results[i] = result_cache.get(index, body)
+        if results[i] is None:
+            header = {"index": index}
+            if request_cache_param(body):
+                header["request_cache"] = True
+            pending.append((i, index, body))
+            searches.extend([header, with_search_timeout(body)])
+
+    if searches:
+        async with es_semaphore:
+            resp = await bounded(aes).msearch(searches=searches, filter_path=filter_path(MSEARCH_FILTER_PATH))
+        for (i, index, body), res in zip(pending, resp.body["responses"]):
+            results[i] = res
+            if "error" not in res and storable(index, res):
+                result_cache.put(index, body, res)
+    return results
+
+
+def rrf_merge(result_lists: List[List[Dict[str, any]]], size: int, k: int = RRF_K) -> List[Dict[str, any]]:
+    """
+    Merge ranked hit lists with reciprocal rank fusion.
+
+    Each document scores the sum of 1 / (k + rank) over the lists it appears in, so documents
+    ranked well by several retrievers rise to the top without comparing their raw scores.
+
+    Args:
+        result_lists (list): Hit lists, each in ranked order.
+        size (int): Number of merged hits to return.
+        k (int): The RRF rank constant (default RRF_K).
+
+    Returns:
+        list: The top `size` hits, each with `_score` set to its fused score.
+    """
+    scores, hits = {}, {}
+    for result in result_lists:
+        for rank, hit in enumerate(result, start=1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + 1.0 / (k + rank)
+            hits.setdefault(hit["_id"], hit)
+    top = sorted(scores, key=scores.get, reverse=True)[:size]
+    return [{**hits[i], "_score": scores[i]} for i in top]
+
+
+async def ahybrid_search(dsl: Dict[str, any], nl_query: str) -> Dict[str, any]:
+    """
+    Run the DSL (BM25) and a kNN search on the query embedding together, merged with reciprocal rank fusion.
+
+    Both legs go out in one `_msearch` round-trip and fetch the top HYBRID_WINDOW hits; the kNN leg
+    is filtered by the DSL query, and aggregations and the hit total come from the BM25 leg.
+    Aggregation-only queries (size 0) run lexically. Concurrent calls for the same search body and
+    query share one embedding and round-trip.
+
+    Args:
+        dsl (dict): The Elasticsearch query in the form of a dictionary.
+        nl_query (str): The natural language query, embedded for the kNN leg.
+
+    Returns:
+        dict: A search result shaped like Elasticsearch's, with fused `_score` values.
+
+    Raises:
+        ValueError: If either leg fails (e.g. the index has no EMBED_FIELD vectors).
+    """
+    index, body = build_search(dsl)
+    size = body.get("size", 10)
+    if size == 0:
+        return await aexecute_search(dsl)
+    return await search_flight.do((index, canonical_json(body), nl_query),
+                                  lambda: _ahybrid_search(index, body, size, nl_query))
+
+
+def knn_filter(query: Optional[Dict[str, any]]) -> Optional[Dict[str, any]]:
+    """
+    Build the `filter` of the kNN leg from the DSL query, so both legs only return matching documents.
+
+    Args:
+        query (Optional[dict]): The `query` of the search body.
+
+    Returns:
+        Optional[dict]: The query to filter kNN candidates with, or None when the DSL matches everything.
+    """
+    if not query or "match_all" in query:
+        return None
+    return query
+
+
+async def _ahybrid_search(index: str, body: Dict[str, any], size: int, nl_query: str) -> Dict[str, any]:
+    # Embedding runs on CPU; keep it off the event loop
+    window = max(size, HYBRID_WINDOW)
+    vector = await asyncio.to_thread(embed_query, nl_query)
+    knn = {
+        "knn": {"field": EMBED_FIELD, "query_vector": list(vector), "k": window,
+                "num_candidates": max(KNN_NUM_CANDIDATES, window)},
+        "size": window,
+        "_source": body["_source"],
+    }
+
+    # The kNN leg honours the DSL's constraints, so fused hits agree with the lexical hit total
+    constraints = knn_filter(body.get("query"))
+    if constraints is not None:
+        knn["knn"]["filter"] = constraints
+    searches = [{"index": index}, with_search_timeout({**body, "size": window}), {"index": index},
+                with_search_timeout(knn)]
+    async with es_semaphore:
+        resp = await bounded(aes).msearch(searches=searches, filter_path=filter_path(MSEARCH_FILTER_PATH))
+    lexical, semantic = resp.body["responses"]
+    for name, leg in (("BM25", lexical), ("kNN", semantic)):
+        if "error" in leg:
+            raise ValueError(f"{name} search failed: {leg['error']}")
+
+    merged = rrf_merge([lexical["hits"]["hits"], semantic["hits"]["hits"]], size)
+    result = {
+        "took": max(lexical.get("took", 0), semantic.get("took", 0)),
+        "timed_out": lexical.get("timed_out", False) or semantic.get("timed_out", False),
+        "hits": {"total": lexical["hits"].get("total"), "max_score": merged[0]["_score"] if merged else None,
+                 "hits": merged},
+    }
+    if "aggregations" in lexical:
+        result["aggregations"] = lexical["aggregations"]
+    return result
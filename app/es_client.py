@@ -0,0 +1,112 @@
+# app/es_client.py
+
+import os
+from typing import Any, Dict, List, Union
+from elasticsearch import Elasticsearch, AsyncElasticsearch
+from dotenv import load_dotenv
+from .deadline import remaining, budget
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration: one or more comma-separated node URLs, credentials and the transport policy
+ES_URL = os.getenv("ES_URL", "http://localhost:9200")
+ES_API_KEY = os.getenv("ES_API_KEY", "")
+ES_USERNAME = os.getenv("ES_USERNAME", "")
+ES_PASSWORD = os.getenv("ES_PASSWORD", "")
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", "10"))
+ES_HTTP_COMPRESS = os.getenv("ES_HTTP_COMPRESS", "false").lower() in {"1", "true", "yes"}
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "10"))
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
+ES_RETRY_ON_TIMEOUT = os.getenv("ES_RETRY_ON_TIMEOUT", "true").lower() in {"1", "true", "yes"}
+ES_RETRY_ON_STATUS = [int(s) for s in os.getenv("ES_RETRY_ON_STATUS", "429,502,503,504").split(",") if s.strip()]
+ES_DEAD_NODE_BACKOFF = float(os.getenv("ES_DEAD_NODE_BACKOFF", "1.0"))
+ES_MAX_DEAD_NODE_BACKOFF = float(os.getenv("ES_MAX_DEAD_NODE_BACKOFF", "30"))
+ES_SNIFF = os.getenv("ES_SNIFF", "false").lower() in {"1", "true", "yes"}
+ES_SNIFF_INTERVAL = float(os.getenv("ES_SNIFF_INTERVAL", "60"))
+
+
+def es_hosts(urls: Union[str, List[str]] = ES_URL) -> List[str]:
+    """Split a comma-separated node URL list (as in ES_URL or --es) into hosts."""
+    if isinstance(urls, str):
+        urls = urls.split(",")
+    return [u.strip() for u in urls if u.strip()]
+
+
+def client_options(**overrides: Any) -> Dict[str, Any]:
+    """
+    Build the keyword arguments shared by every Elasticsearch client of the project.
+
+    Requests are spread over the nodes round-robin; a failed node is skipped with exponential
+    backoff (ES_DEAD_NODE_BACKOFF doubling up to ES_MAX_DEAD_NODE_BACKOFF) while the request is
+    retried on another node, up to ES_MAX_RETRIES times for timeouts and ES_RETRY_ON_STATUS codes.
+
+    Args:
+        **overrides: Client arguments replacing the configured ones (e.g. request_timeout for bulk loads).
+
+    Returns:
+        dict: Arguments for `Elasticsearch` / `AsyncElasticsearch`.
+    """
+    options: Dict[str, Any] = {
+        "connections_per_node": ES_CONNECTIONS_PER_NODE,
+        "http_compress": ES_HTTP_COMPRESS,
+        "request_timeout": ES_REQUEST_TIMEOUT,
+        "max_retries": ES_MAX_RETRIES,
+        "retry_on_timeout": ES_RETRY_ON_TIMEOUT,
+        "retry_on_status": ES_RETRY_ON_STATUS,
+        "dead_node_backoff_factor": ES_DEAD_NODE_BACKOFF,
+        "max_dead_node_backoff": ES_MAX_DEAD_NODE_BACKOFF,
+    }
+
+    # Credentials: an API key wins over basic auth
+    if ES_API_KEY:
+        options["api_key"] = ES_API_KEY
+    elif ES_USERNAME:
+        options["basic_auth"] = (ES_USERNAME, ES_PASSWORD)
+
+    # Sniffing discovers the other nodes of the cluster, which must be reachable at their publish addresses
+    if ES_SNIFF:
+        options.update(sniff_on_start=True, sniff_on_node_failure=True,
+                       min_delay_between_sniffing=ES_SNIFF_INTERVAL)
+
+    options.update(overrides)
+    return options
+
+
+def make_client(hosts: Union[str, List[str]] = ES_URL, **overrides: Any) -> Elasticsearch:
+    """
+    Create a synchronous Elasticsearch client with the shared pool, retry and timeout policy.
+
+    Args:
+        hosts (Union[str, list]): Node URLs, comma-separated or as a list (default ES_URL).
+        **overrides: Client arguments replacing the configured ones.
+
+    Returns:
+        Elasticsearch: The client.
+    """
+    return Elasticsearch(es_hosts(hosts), **client_options(**overrides))
+
+
+def make_async_client(hosts: Union[str, List[str]] = ES_URL, **overrides: Any) -> AsyncElasticsearch:
+    """
+    Create an async Elasticsearch client with the shared pool, retry and timeout policy.
+
+    Args:
+        hosts (Union[str, list]): Node URLs, comma-separated or as a list (default ES_URL).
+        **overrides: Client arguments replacing the configured ones.
+
+    Returns:
+        AsyncElasticsearch: The client.
+    """
+    return AsyncElasticsearch(es_hosts(hosts), **client_options(**overrides))
+
+
+def bounded(client: Union[Elasticsearch, AsyncElasticsearch]) -> Union[Elasticsearch, AsyncElasticsearch]:
+    """
+    Return the client itself, or a view of it whose calls time out at the current request's deadline.
+
+    Under a deadline a timed-out call is not retried, since the retry could not finish in time either.
+    """
+    if remaining() is None:
+        return client
+    return client.options(request_timeout=budget(ES_REQUEST_TIMEOUT), retry_on_timeout=False)
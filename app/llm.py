@@ -2,29 +2,110 @@
 
 import os
 import json
-from openai import AzureOpenAI
-from typing import Dict, Any
+import asyncio
+from openai import AsyncAzureOpenAI
+from typing import Dict, Any, AsyncIterator
 from .prompts import QUERY_SYS, FEWSHOTS, SUMM_SYS
+from .summary import compact_results, summary_key, estimate_tokens
+from .cache import summary_cache, SUMMARY_CACHE_ENABLED, normalize_query, shingles
+from .metrics import span, record_usage
+from .deadline import budget, remaining, expired, DeadlineExceeded
+from .singleflight import SingleFlight
 from dotenv import load_dotenv
 
 # ---------------------- Environment Setup ---------------------- #
 load_dotenv()
 
-# Azure OpenAI Client Initialization
-client = AzureOpenAI(
+# Timeout of one LLM call in seconds (shortened to the time left when the request has a deadline)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Azure OpenAI client; one instance shares its HTTP connection pool across requests
+aclient = AsyncAzureOpenAI(
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
     api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    timeout=LLM_TIMEOUT
 )
 
+# Upper bound on concurrent in-flight LLM calls from the async path
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+# Identical queries and summaries in flight at the same time share one LLM call
+dsl_flight = SingleFlight("dsl")
+summary_flight = SingleFlight("summary")
+
 MODEL_DSL = os.getenv("AZURE_OPENAI_COMPLETION_DEPLOYMENT", "gpt-4o-mini")
 MODEL_SUM = os.getenv("AZURE_OPENAI_COMPLETION_DEPLOYMENT", "gpt-4o-mini")
 
+# Approximate token budget of the few-shot examples sent with each DSL request (0 sends them all)
+FEWSHOT_TOKEN_BUDGET = int(os.getenv("FEWSHOT_TOKEN_BUDGET", "150"))
+
+# The system message is built once and shared by every DSL request, so the prompt prefix is byte-identical
+PREFIX_MESSAGES = ({"role": "system", "content": QUERY_SYS},)
+
+# Few-shots serialized once: (query signature, token estimate, user/assistant messages), in FEWSHOTS order
+FEWSHOT_MESSAGES = []
+for _q, _dsl in FEWSHOTS:
+    _answer = json.dumps(_dsl, separators=(",", ":"), ensure_ascii=False)
+    FEWSHOT_MESSAGES.append((
+        shingles(normalize_query(_q)),
+        estimate_tokens(_q) + estimate_tokens(_answer),
+        ({"role": "user", "content": _q}, {"role": "assistant", "content": _answer}),
+    ))
+
+
+def select_fewshots(nl_query: str, budget: int = FEWSHOT_TOKEN_BUDGET) -> list:
+    """
+    Choose the few-shot examples most similar to a query that fit in a token budget.
+
+    Examples are taken by shingle similarity to the query while they fit; the best one is always
+    kept. The chosen examples keep their FEWSHOTS order, so queries picking the same examples send
+    identical prompts.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        budget (int): Approximate token budget of the examples (0 or less selects all of them).
+
+    Returns:
+        list: Indexes into FEWSHOT_MESSAGES, in ascending order.
+    """
+    if budget <= 0:
+        return list(range(len(FEWSHOT_MESSAGES)))
+
+    # Rank by Jaccard similarity of character shingles, ties in FEWSHOTS order
+    sig = shingles(normalize_query(nl_query))
+    scores = [len(sig & shot_sig) / len(sig | shot_sig) for shot_sig, _, _ in FEWSHOT_MESSAGES]
+    ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+
+    # Take examples in rank order while they fit
+    chosen, used = [], 0
+    for i in ranked:
+        if chosen and used + FEWSHOT_MESSAGES[i][1] > budget:
+            continue
+        chosen.append(i)
+        used += FEWSHOT_MESSAGES[i][1]
+    return sorted(chosen)
+
+
+def bounded(llm):
+    """
+    Return the client itself, or a copy whose calls time out at the current request's deadline.
+
+    Under a deadline failed calls are not retried by the SDK, since the retry could not finish in time.
+    """
+    if remaining() is None:
+        return llm
+    return llm.with_options(timeout=budget(LLM_TIMEOUT), max_retries=0)
+
 
 def build_messages(nl_query: str) -> list:
     """
     Build the messages required for LLM completion.
 
+    The shared system message comes first, then the few-shots chosen by `select_fewshots`, then
+    the query, so the longest possible prefix is the same across requests.
+
     Args:
         nl_query (str): The natural language query from the user.
 
@@ -32,11 +113,10 @@ def build_messages(nl_query: str) -> list:
         list: A list of message objects, formatted for use with the LLM API.
     """
 
-    # Initialize the system message and user prompts from the FEWSHOTS data
-    msgs = [{"role": "system", "content": QUERY_SYS}]
-    for q, dsl in FEWSHOTS:
-        msgs.append({"role": "user", "content": q})
-        msgs.append({"role": "assistant", "content": json.dumps(dsl)})
+    # Start from the precomputed prefix and add the selected, pre-serialized few-shots
+    msgs = list(PREFIX_MESSAGES)
+    for i in select_fewshots(nl_query):
+        msgs.extend(FEWSHOT_MESSAGES[i][2])
 
     # Add the user's current query
     msgs.append({"role": "user", "content": nl_query})
@@ -44,9 +124,66 @@ def build_messages(nl_query: str) -> list:
     return msgs
 
 
-def llm_to_dsl(nl_query: str) -> Dict[str, Any]:
+def build_repair_messages(text: str) -> list:
     """
-    Convert a natural language query into a DSL response using Azure OpenAI.
+    Build the messages asking the LLM to repair malformed JSON.
+
+    Args:
+        text (str): The LLM output that failed to parse as JSON.
+
+    Returns:
+        list: A list of message objects, formatted for use with the LLM API.
+    """
+    return [
+        {"role": "system", "content": "Return ONLY valid JSON. Repair the following into a valid JSON object. No comments."},
+        {"role": "user", "content": text}
+    ]
+
+
+def build_summary_messages(payload: Dict[str, Any]) -> list:
+    """
+    Build the messages asking the LLM to summarize Elasticsearch results.
+
+    Args:
+        payload (dict): The token-budgeted results built by `summary.compact_results`.
+
+    Returns:
+        list: A list of message objects, formatted for use with the LLM API.
+    """
+    return [
+        {"role": "system", "content": SUMM_SYS},
+        {"role": "user", "content": json.dumps(payload, separators=(",", ":"), ensure_ascii=False)}
+    ]
+
+
+def cached_summary(nl_query: str, es_response: Dict[str, Any]) -> tuple:
+    """
+    Build the summarization payload and look it up in the summary cache.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        es_response (dict): The response from Elasticsearch containing query results.
+
+    Returns:
+        tuple: (payload, cache key, cached summary or None).
+    """
+    payload = compact_results(nl_query, es_response)
+    key = summary_key(nl_query, payload)
+    return payload, key, summary_cache.get(key) if SUMMARY_CACHE_ENABLED else None
+
+
+def store_summary(key: tuple, summary: str):
+    """Cache a generated summary under the key returned by `cached_summary`."""
+    if SUMMARY_CACHE_ENABLED and summary:
+        summary_cache.put(key, summary)
+
+
+async def allm_to_dsl(nl_query: str) -> Dict[str, Any]:
+    """
+    Convert a natural language query into a DSL response using Azure OpenAI, bounded by LLM_CONCURRENCY.
+
+    Concurrent calls for the same normalized query share one LLM call. A response that is not valid
+    JSON is sent back once for repair.
 
     Args:
         nl_query (str): The natural language query from the user.
@@ -55,33 +192,42 @@ def llm_to_dsl(nl_query: str) -> Dict[str, Any]:
         dict: The generated DSL response parsed from the LLM's output.
 
     Raises:
-        JSONDecodeError: If the response is not valid JSON, an attempt to repair is made.
+        JSONDecodeError: If the repaired response is still not valid JSON.
     """
+    return await dsl_flight.do(normalize_query(nl_query), lambda: _agenerate_dsl(nl_query))
 
-    # Make a request to the LLM for a response
-    resp = client.chat.completions.create(
-        model=MODEL_DSL, temperature=0, messages=build_messages(nl_query)
-    )
+
+async def _agenerate_dsl(nl_query: str) -> Dict[str, Any]:
+    # Stage timings include the wait for a free LLM slot
+    with span("llm_dsl"):
+        async with llm_semaphore:
+            resp = await bounded(aclient).chat.completions.create(
+                model=MODEL_DSL, temperature=0, messages=build_messages(nl_query)
+            )
+    record_usage("dsl", resp.usage)
     text = resp.choices[0].message.content.strip()
 
-    # Attempt to parse the response as JSON
     try:
         return json.loads(text)
     except json.JSONDecodeError:
-        # If JSONDecodeError occurs, try repairing the response
-        fix = client.chat.completions.create(
-            model=MODEL_DSL, temperature=0,
-            messages=[
-              {"role": "system", "content": "Return ONLY valid JSON. Repair the following into a valid JSON object. No comments."},
-              {"role": "user", "content": text}
-            ]
-        )
+        # If JSONDecodeError occurs, try repairing the response under a fresh slot
+        if expired():
+            raise DeadlineExceeded("Deadline exceeded before JSON repair")
+        with span("llm_repair"):
+            async with llm_semaphore:
+                fix = await bounded(aclient).chat.completions.create(
+                    model=MODEL_DSL, temperature=0, messages=build_repair_messages(text)
+                )
+        record_usage("repair", fix.usage)
         return json.loads(fix.choices[0].message.content.strip())
 
 
-def summarize(nl_query: str, es_response: Dict[str, Any]) -> str:
+async def asummarize(nl_query: str, es_response: Dict[str, Any]) -> str:
     """
-    Summarize the Elasticsearch query results based on the user's query.
+    Summarize the Elasticsearch query results based on the user's query, bounded by LLM_CONCURRENCY.
+
+    Summaries of identical results for the same query come from the summary cache, and concurrent
+    calls for the same query and results share one LLM call.
 
     Args:
         nl_query (str): The natural language query from the user.
@@ -90,22 +236,59 @@ def summarize(nl_query: str, es_response: Dict[str, Any]) -> str:
     Returns:
         str: The summary generated by the LLM based on the query and results.
     """
+    payload, key, summary = cached_summary(nl_query, es_response)
+    if summary is not None:
+        return summary
+    return await summary_flight.do(key, lambda: _agenerate_summary(key, payload))
+
+
+async def _agenerate_summary(key: tuple, payload: Dict[str, Any]) -> str:
+    # Ask the LLM for a summary of compacted results and cache it
+    with span("llm_summary"):
+        async with llm_semaphore:
+            resp = await bounded(aclient).chat.completions.create(
+                model=MODEL_SUM, temperature=0, messages=build_summary_messages(payload)
+            )
+    record_usage("summary", resp.usage)
+    summary = resp.choices[0].message.content.strip()
+    store_summary(key, summary)
+    return summary
+
+
+async def astream_summary(nl_query: str, es_response: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Stream the summary of Elasticsearch results token by token as the LLM produces it.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        es_response (dict): The response from Elasticsearch containing query results.
 
-    # Prepare the payload for summarization
-    payload = {
-        "query": nl_query,
-        "hits": [h.get("_source", {}) for h in es_response.get("hits", {}).get("hits", [])],
-        "aggs": es_response.get("aggregations", {})
-    }
-
-    # Request the summary from the LLM
-    resp = client.chat.completions.create(
-        model=MODEL_SUM, temperature=0,
-        messages=[
-          {"role": "system", "content": SUMM_SYS},
-          {"role": "user", "content": json.dumps(payload)}
-        ]
-    )
-
-    # Return the generated summary
-    return resp.choices[0].message.content.strip()
+    Yields:
+        str: The next piece of summary text (the whole summary at once on a cache hit, or when an
+             identical summary was already being generated).
+    """
+    payload, key, summary = cached_summary(nl_query, es_response)
+    if summary is None:
+        summary = await summary_flight.follow(key)
+    if summary is not None:
+        yield summary
+        return
+    parts = []
+    async with summary_flight.lead(key) as flight:
+        async with llm_semaphore:
+            stream = await bounded(aclient).chat.completions.create(
+                model=MODEL_SUM, temperature=0, stream=True,
+                messages=build_summary_messages(payload)
+            )
+            async for chunk in stream:
+                # Usage arrives on a final chunk when the deployment reports it for streams
+                if getattr(chunk, "usage", None) is not None:
+                    record_usage("summary", chunk.usage)
+                # Azure sends content-filter chunks without choices; skip them and empty deltas
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        # Only a stream that ran to completion is cached and shared
+        summary = "".join(parts).strip()
+        flight.set_result(summary)
+    store_summary(key, summary)
@@ -0,0 +1,259 @@
+# app/metrics.py
+
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in {"1", "true", "yes"}
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() in {"1", "true", "yes"}
+
+log = logging.getLogger("nl2es")
+
+# Latency buckets in seconds, from a cache hit to a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    # Format a label set, escaping backslashes, quotes and newlines in the values
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """
+    A monotonically increasing Prometheus counter with labels.
+
+    Args:
+        name (str): The metric name.
+        help (str): The metric description.
+        labels (tuple): The label names.
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        """Add `amount` to the series with the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        """Return the metric in Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                # Full precision: a rounded total would stall and then jump once it passes a million
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {float(value)!r}")
+        return lines
+
+
+class Histogram:
+    """
+    A Prometheus histogram with fixed buckets and labels.
+
+    Args:
+        name (str): The metric name.
+        help (str): The metric description.
+        labels (tuple): The label names.
+        buckets (tuple): Increasing upper bounds of the buckets (+Inf is implied).
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help, labels, buckets
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """Record one observation in the series with the given label values."""
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        """Return the metric in Prometheus text exposition format, with cumulative buckets."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+# Metrics recorded on the request path
+stage_seconds = Histogram("nl2es_stage_seconds", "Duration of each request stage.", ("stage",))
+request_seconds = Histogram("nl2es_request_seconds", "Time to response headers per endpoint.", ("endpoint", "status"))
+llm_tokens = Counter("nl2es_llm_tokens_total", "Tokens reported by the LLM API.", ("call", "kind"))
+
+
+class RequestTimer:
+    """
+    ASGI middleware recording the time to response headers of every HTTP request in `request_seconds`.
+
+    It only wraps `send`, so unlike an `@app.middleware("http")` function it adds no task or
+    response wrapping per request, and streamed bodies pass straight through.
+
+    Args:
+        app: The ASGI application to wrap.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]],
+                       send: Callable[[Dict[str, Any]], Awaitable[None]]):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            observed = True
+            # Label by route template so unknown paths cannot blow up the number of series
+            route = scope.get("route")
+            request_seconds.observe(time.perf_counter() - started, route.path if route else "unmatched", str(status))
+
+        async def timed_send(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if not observed:
+                observe(500)
+
+
+# Collectors render metrics whose values live elsewhere (cache counters, ...) at scrape time
+_collectors: List[Callable[[], List[str]]] = []
+
+# Stage durations of the current request, in milliseconds, for the telemetry log
+_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("nl2es_trace", default=None)
+
+_tracer = None
+
+
+def _otel_tracer():
+    # Import OpenTelemetry only when enabled; a missing package disables it with a warning
+    global _tracer, OTEL_ENABLED
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("nl2es")
+        except ImportError:
+            log.warning("OTEL_ENABLED is set but opentelemetry-api is not installed; tracing disabled")
+            OTEL_ENABLED = False
+    return _tracer
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    """
+    Add a function rendering extra metric lines at scrape time.
+
+    Args:
+        collector (callable): Returns Prometheus text lines (with HELP/TYPE headers).
+    """
+    _collectors.append(collector)
+
+
+def start_trace(trace: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Start collecting stage durations for the current request.
+
+    Args:
+        trace (Optional[dict]): An existing trace to keep filling, e.g. one batch item's from another task.
+
+    Returns:
+        dict: Stage name -> milliseconds, filled in by `span` within this request's context.
+    """
+    trace = {} if trace is None else trace
+    _trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a request stage with a monotonic clock.
+
+    The duration goes to the `nl2es_stage_seconds` histogram, to the current trace if one was
+    started, and to an OpenTelemetry span when OTEL_ENABLED is set.
+
+    Args:
+        stage (str): The stage name, e.g. "llm_dsl" or "es".
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    tracer = _otel_tracer() if OTEL_ENABLED else None
+    with tracer.start_as_current_span(stage) if tracer is not None else nullcontext():
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stage_seconds.observe(elapsed, stage)
+            trace = _trace.get()
+            if trace is not None:
+                trace[stage] = round(trace.get(stage, 0.0) + elapsed * 1000, 2)
+
+
+def record_usage(call: str, usage) -> int:
+    """
+    Count the tokens of an LLM response.
+
+    Args:
+        call (str): The kind of call, e.g. "dsl", "repair" or "summary".
+        usage: The `usage` object of an OpenAI response (None is ignored).
+
+    Returns:
+        int: The total number of tokens recorded.
+    """
+    if usage is None or not METRICS_ENABLED:
+        return 0
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    llm_tokens.inc(call, "prompt", amount=prompt)
+    llm_tokens.inc(call, "completion", amount=completion)
+    return prompt + completion
+
+
+def render() -> str:
+    """
+    Render every metric in Prometheus text exposition format.
+
+    Returns:
+        str: The body of a /metrics response.
+    """
+    lines: List[str] = []
+    for metric in (stage_seconds, request_seconds, llm_tokens):
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
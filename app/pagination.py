@@ -0,0 +1,230 @@
+# app/pagination.py
+
+import os
+import json
+import hmac
+import zlib
+import base64
+import hashlib
+import logging
+import secrets
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from elasticsearch import NotFoundError
+from dotenv import load_dotenv
+from .es_client import bounded
+from .es import aes, es_semaphore, build_search, filter_path, with_search_timeout, SEARCH_FILTER_PATH
+from .deadline import set_deadline, enforce, REQUEST_TIMEOUT
+from .metrics import span
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+PAGE_KEEP_ALIVE = os.getenv("PAGE_KEEP_ALIVE", "2m")
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_PAGE_TIMEOUT = float(os.getenv("EXPORT_PAGE_TIMEOUT", str(REQUEST_TIMEOUT)))
+
+# Key signing cursors; without CURSOR_SECRET a random one is used, so cursors only work on this process
+CURSOR_SECRET = (os.getenv("CURSOR_SECRET") or secrets.token_hex(32)).encode()
+
+# Elasticsearch rejects larger pages unless index.max_result_window is raised
+MAX_PAGE_WINDOW = 10000
+
+# Exports only read the documents and where to resume
+EXPORT_FILTER_PATH = ["pit_id", "hits.hits._source", "hits.hits.sort", "error"]
+
+log = logging.getLogger("nl2es")
+
+
+def encode_cursor(dsl: Dict[str, Any], pit_id: str, search_after: List[Any], query: str = "") -> str:
+    """
+    Pack the state needed to fetch the next page into an opaque, URL-safe, signed token.
+
+    The HMAC covers the DSL (and so the sort derived from it), the point-in-time id and the
+    `search_after` values, so a client can neither edit them nor bring a PIT opened on another index.
+
+    Args:
+        dsl (dict): The validated DSL of the paginated search.
+        pit_id (str): The point-in-time id the pages are read from.
+        search_after (list): The sort values of the last hit returned.
+        query (str): The natural language query of the first page, used to summarize later pages.
+
+    Returns:
+        str: The cursor token.
+    """
+    state = json.dumps({"dsl": dsl, "pit": pit_id, "after": search_after, "query": query}, separators=(",", ":"))
+    payload = zlib.compress(state.encode())
+    return _b64encode(payload) + "." + _b64encode(_sign(payload))
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """
+    Check the signature of a token made by `encode_cursor` and unpack it.
+
+    The DSL inside was validated when the cursor was made; callers still validate it again, since
+    the limits may have changed since.
+
+    Args:
+        token (str): The cursor token.
+
+    Returns:
+        dict: The cursor state with `dsl`, `pit`, `after` and `query`.
+
+    Raises:
+        ValueError: If the token is malformed or its signature does not match.
+    """
+    try:
+        payload, signature = (_b64decode(part) for part in token.split("."))
+        if not hmac.compare_digest(signature, _sign(payload)):
+            raise ValueError("Invalid cursor signature")
+        state = json.loads(zlib.decompress(payload))
+    except (ValueError, zlib.error) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(state, dict) or not isinstance(state.get("dsl"), dict) or not state.get("pit") \
+            or not isinstance(state.get("after"), list) or not isinstance(state.setdefault("query", ""), str):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def _sign(payload: bytes) -> bytes:
+    # HMAC-SHA256 of the compressed cursor state under CURSOR_SECRET
+    return hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def page_sort(body: Dict[str, Any], scored: bool = True) -> List[Any]:
+    """
+    Build the sort of a paginated search: the DSL's own sort, then the `_shard_doc` tiebreaker.
+
+    Args:
+        body (dict): The search body built by `es.build_search`.
+        scored (bool): Sort by `_score` when the DSL has no sort; otherwise use index order only,
+                       which lets Elasticsearch skip scoring (used by exports).
+
+    Returns:
+        list: The sort clauses, ending with a unique tiebreaker so `search_after` never skips hits.
+    """
+    sort = body.get("sort")
+    sort = list(sort) if isinstance(sort, list) else [sort] if sort else []
+    if not sort and scored:
+        sort = [{"_score": "desc"}]
+    return sort + [{"_shard_doc": "asc"}]
+
+
+async def aopen_pit(index: str) -> str:
+    """Open a point in time on an index and return its id."""
+    async with es_semaphore:
+        resp = await bounded(aes).open_point_in_time(index=index, keep_alive=PAGE_KEEP_ALIVE)
+    return resp.body["id"]
+
+
+async def aclose_pit(pit_id: str):
+    """Release a point in time; failures are only logged since the PIT expires on its own."""
+    try:
+        async with es_semaphore:
+            await aes.close_point_in_time(id=pit_id)
+    except Exception as e:
+        log.warning("Could not close point in time: %s", e)
+
+
+async def _asearch_pit(body: Dict[str, Any], paths: List[str] = SEARCH_FILTER_PATH) -> Dict[str, Any]:
+    # PIT searches name no index; an unknown PIT id means the keep-alive ran out
+    try:
+        with span("es"):
+            async with es_semaphore:
+                resp = await bounded(aes).search(body=with_search_timeout(body), filter_path=filter_path(paths))
+    except NotFoundError as e:
+        raise ValueError("Cursor expired; start a new search") from e
+    return resp.body
+
+
+async def apage(dsl: Dict[str, Any], state: Optional[Dict[str, Any]] = None,
+                nl_query: str = "") -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Fetch one page of a search through a point in time and `search_after`.
+
+    The first page opens the PIT and returns aggregations and the hit total as usual; later pages
+    resume after the cursor's last sort values and skip both. Results are not served from the
+    result cache, since each page belongs to its own snapshot.
+
+    Args:
+        dsl (dict): The validated DSL; its size is the page size (capped at MAX_SIZE).
+        state (Optional[dict]): The decoded cursor of the previous page, or None for the first page.
+        nl_query (str): The natural language query of the first page, carried by the following cursors.
+
+    Returns:
+        tuple: The search result and the cursor of the next page (None after the last page).
+
+    Raises:
+        ValueError: If the cursor's point in time has expired.
+    """
+    index, body = build_search(dsl)
+    size = body.get("size", 10)
+    pit_id = state["pit"] if state else await aopen_pit(index)
+
+    # Page body: the DSL's query under the PIT, sorted with a tiebreaker
+    body["pit"] = {"id": pit_id, "keep_alive": PAGE_KEEP_ALIVE}
+    body["sort"] = page_sort(body)
+    if state:
+        body["search_after"] = state["after"]
+        body["track_total_hits"] = False
+        body.pop("aggs", None)
+
+    res = await _asearch_pit(body)
+
+    # Elasticsearch may hand back a new PIT id; a short page is the last one
+    pit_id = res.get("pit_id", pit_id)
+    hits = res.get("hits", {}).get("hits", [])
+    if size == 0 or len(hits) < size:
+        await aclose_pit(pit_id)
+        return res, None
+    return res, encode_cursor(dsl, pit_id, hits[-1]["sort"], state["query"] if state else nl_query)
+
+
+async def aexport(dsl: Dict[str, Any], page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the `_source` of every document matching a DSL, one page at a time.
+
+    A point in time keeps the pages consistent and `search_after` keeps each page as cheap as the
+    first, so memory stays constant on both sides whatever the number of matches. Aggregations and
+    the DSL's size are ignored; hits come in the DSL's sort order, or index order without scoring.
+    Each round-trip gets its own EXPORT_PAGE_TIMEOUT deadline, however long the whole export takes.
+
+    Args:
+        dsl (dict): The validated DSL query.
+        page_size (int): Documents fetched per round-trip (capped at MAX_PAGE_WINDOW).
+
+    Yields:
+        dict: The `_source` of each matching document.
+
+    Raises:
+        DeadlineExceeded: If a page takes longer than EXPORT_PAGE_TIMEOUT.
+    """
+    index, body = build_search(dsl)
+    body.pop("aggs", None)
+    body.update(size=max(1, min(page_size, MAX_PAGE_WINDOW)), track_total_hits=False, sort=page_sort(body, scored=False))
+    set_deadline(EXPORT_PAGE_TIMEOUT)
+    async with enforce("export"):
+        pit_id = await aopen_pit(index)
+    try:
+        while True:
+            body["pit"] = {"id": pit_id, "keep_alive": PAGE_KEEP_ALIVE}
+            set_deadline(EXPORT_PAGE_TIMEOUT)
+            async with enforce("export page"):
+                res = await _asearch_pit(body, EXPORT_FILTER_PATH)
+            pit_id = res.get("pit_id", pit_id)
+            hits = res.get("hits", {}).get("hits", [])
+            for hit in hits:
+                yield hit.get("_source", {})
+            if len(hits) < body["size"]:
+                break
+            body["search_after"] = hits[-1]["sort"]
+    finally:
+        await aclose_pit(pit_id)
@@ -0,0 +1,232 @@
+# app/planner.py
+
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from .es import aes, es_semaphore, ES_INDEX
+from .es_client import bounded
+from .deadline import set_deadline
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+PLANNER_ENABLED = os.getenv("PLANNER_ENABLED", "true").lower() in {"1", "true", "yes"}
+PLANNER_MIN_CONFIDENCE = float(os.getenv("PLANNER_MIN_CONFIDENCE", "0.9"))
+GAZETTEER_TTL = float(os.getenv("GAZETTEER_TTL", "600"))
+GAZETTEER_RETRY = float(os.getenv("GAZETTEER_RETRY", "30"))
+GAZETTEER_MAX_TERMS = int(os.getenv("GAZETTEER_MAX_TERMS", "10000"))
+
+log = logging.getLogger("nl2es")
+
+# Keyword fields the gazetteer is built from (see es/mapping_v2.json)
+GAZETTEER_FIELDS = {
+    "locations": "Locations.keyword",
+    "cities": "City.keyword",
+    "countries": "Country.keyword",
+    "families": "Families.keyword",
+}
+
+# Words users use for each groupable dimension, mapped to its keyword field and agg name
+DIMENSIONS = {
+    "team": ("Families.keyword", "team"), "teams": ("Families.keyword", "team"),
+    "family": ("Families.keyword", "family"), "families": ("Families.keyword", "family"),
+    "department": ("Families.keyword", "team"), "departments": ("Families.keyword", "team"),
+    "location": ("Locations.keyword", "location"), "locations": ("Locations.keyword", "location"),
+    "city": ("City.keyword", "city"), "cities": ("City.keyword", "city"),
+    "country": ("Country.keyword", "country"), "countries": ("Country.keyword", "country"),
+}
+
+_WHO = r"(?:people|persons|employees|members|everyone|those|anyone)"
+_DIM = "|".join(sorted(DIMENSIONS, key=len, reverse=True))
+
+COUNT_PER = re.compile(
+    rf"^(?:count|number of)\s+(?:(?:of\s+)?{_WHO}\s+)?(?:per|by|in each|for each|each)\s+(?P<dim>{_DIM})$"
+)
+TOP_N_FOR = re.compile(
+    rf"^top\s+(?P<n>\d{{1,3}})\s+(?P<dim>{_DIM})\s+(?:for|with|of|by)\s+(?P<event>.+)$"
+)
+PEOPLE_IN = re.compile(
+    rf"^(?:(?:list|show|find|get)\s+)?(?:me\s+)?(?:all\s+)?(?:{_WHO}\s+)?(?:who\s+)?"
+    r"(?:lives?|living|based|located|work|works|working|are|is)?\s*(?:in|from|at)\s+(?P<where>.+?)"
+    r"(?:\s+who\s+(?:joined|attended|completed|took|did)\s+(?:an?\s+|the\s+)?(?P<event>.+))?$"
+)
+
+_PUNCT_END = re.compile(r"[\s.?!]+$")
+
+# Phrasings the rules cannot express: negations ("did not join", "without", "except") and a place
+# trailing an event ("workshop in Tokyo"), which the event match would swallow as event text
+_NEGATION = re.compile(r"\b(?:not|no|never|without|except|excluding|nor)\b|n't\b")
+_TRAILING_PLACE = re.compile(r"\s(?:in|at|from)\s+\S")
+
+
+@dataclass
+class Plan:
+    """
+    A DSL produced without the LLM.
+
+    Args:
+        dsl (dict): The generated DSL query.
+        confidence (float): How sure the planner is that the DSL matches the query (0 to 1).
+        rule (str): The name of the rule that produced the DSL.
+    """
+    dsl: Dict[str, Any]
+    confidence: float
+    rule: str
+
+
+class Gazetteer:
+    """
+    Known keyword values of the index (locations, cities, countries, teams), keyed by lower-cased value.
+    """
+
+    def __init__(self):
+        self.terms: Dict[str, Dict[str, str]] = {kind: {} for kind in GAZETTEER_FIELDS}
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def lookup(self, value: str) -> Optional[tuple]:
+        """
+        Resolve a free-text value to a known keyword term.
+
+        Args:
+            value (str): The value as typed by the user.
+
+        Returns:
+            Optional[tuple]: The (kind, canonical value) pair, or None if the value is unknown.
+        """
+        key = value.strip().lower()
+        for kind in ("locations", "cities", "countries", "families"):
+            canonical = self.terms[kind].get(key)
+            if canonical is not None:
+                return kind, canonical
+        return None
+
+    async def refresh(self):
+        """
+        Reload the terms from Elasticsearch when they are older than GAZETTEER_TTL.
+
+        Only the first load runs on the request path, within the request's deadline. Later reloads
+        run in a background task while the stale terms keep being served.
+        """
+        if time.monotonic() - self.loaded_at < GAZETTEER_TTL:
+            return
+        if self.loaded_at:
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._reload(background=True))
+            return
+        async with self._lock:
+            if not self.loaded_at:
+                await self._reload()
+
+    async def _reload(self, background: bool = False):
+        # A background reload is not bound to the deadline of the request that started it
+        if background:
+            set_deadline(None)
+        try:
+            async with es_semaphore:
+                resp = await bounded(aes).search(index=ES_INDEX, body={
+                    "size": 0,
+                    "aggs": {kind: {"terms": {"field": field, "size": GAZETTEER_MAX_TERMS}}
+                             for kind, field in GAZETTEER_FIELDS.items()}
+                })
+            aggs = resp.body.get("aggregations", {})
+            self.terms = {
+                kind: {b["key"].lower(): b["key"] for b in aggs.get(kind, {}).get("buckets", [])}
+                for kind in GAZETTEER_FIELDS
+            }
+            self.loaded_at = time.monotonic()
+        except Exception as e:
+            # Keep the previous terms and retry after GAZETTEER_RETRY instead of on every request
+            log.warning("Gazetteer refresh failed: %s", e)
+            self.loaded_at = time.monotonic() - GAZETTEER_TTL + GAZETTEER_RETRY
+
+
+gazetteer = Gazetteer()
+
+# How each request was served: "planner", "cache" or "llm"
+path_counts: Counter = Counter()
+
+
+def plan(nl_query: str, gaz: Gazetteer = gazetteer) -> Optional[Plan]:
+    """
+    Build the DSL for a query matching one of the common shapes in FEWSHOTS, without the LLM.
+
+    Supported shapes are "count people per <team|location|city|country>", "top N <dimension> for
+    <event>" and "people in <known location or team> [who joined <event>]". Negated queries and
+    events followed by a place are left to the LLM.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        gaz (Gazetteer): The known keyword values used to resolve locations and teams.
+
+    Returns:
+        Optional[Plan]: The plan, or None if the query does not match any supported shape.
+    """
+    text = _PUNCT_END.sub("", nl_query.strip().lower())
+    if _NEGATION.search(text):
+        return None
+
+    m = COUNT_PER.match(text)
+    if m:
+        field, name = DIMENSIONS[m.group("dim")]
+        return Plan({
+            "index": ES_INDEX, "size": 0, "query": {"match_all": {}},
+            "aggs": {f"by_{name}": {"terms": {"field": field, "size": 50}}}
+        }, 1.0, "count_per")
+
+    m = TOP_N_FOR.match(text)
+    if m:
+        if _TRAILING_PLACE.search(m.group("event")):
+            return None
+        field, name = DIMENSIONS[m.group("dim")]
+        return Plan({
+            "index": ES_INDEX, "size": 0,
+            "query": {"match": {"Events": {"query": m.group("event"), "operator": "and"}}},
+            "aggs": {f"top_{name}s": {"terms": {"field": field, "size": int(m.group("n"))}}}
+        }, 0.9, "top_n_for")
+
+    m = PEOPLE_IN.match(text)
+    if m:
+        found = gaz.lookup(m.group("where"))
+        if found is None:
+            # An unknown place may be a typo or a different phrasing; let the LLM handle it
+            return None
+        kind, value = found
+        clause = {"match": {"Families" if kind == "families" else "Locations": value}}
+        if m.group("event"):
+            if _TRAILING_PLACE.search(m.group("event")):
+                return None
+            return Plan({
+                "index": ES_INDEX, "size": 10,
+                "query": {"bool": {"must": [clause, {"match": {"Events": m.group("event")}}]}}
+            }, 0.9, "people_in_with_event")
+        return Plan({"index": ES_INDEX, "query": clause, "size": 10}, 1.0, "people_in")
+
+    return None
+
+
+async def aplan(nl_query: str) -> Optional[Plan]:
+    """
+    Async entry point for the API: refresh the gazetteer if stale, then plan the query.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+
+    Returns:
+        Optional[Plan]: A plan at or above PLANNER_MIN_CONFIDENCE, or None to fall back to the LLM.
+    """
+    if not PLANNER_ENABLED:
+        return None
+    await gazetteer.refresh()
+    p = plan(nl_query)
+    if p is None or p.confidence < PLANNER_MIN_CONFIDENCE:
+        return None
+    return p
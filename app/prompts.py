@@ -1,4 +1,6 @@
 import os
+import re
+import json
 from dotenv import load_dotenv
 
 # ---------------------- Environment Setup ---------------------- #
@@ -7,6 +9,7 @@ load_dotenv()
 
 PROMPT_TEMPLATE_PATH = os.getenv("SYS_PROMPT")
 INDEX = os.getenv("ES_INDEX")
+PROMPT_MINIFY = os.getenv("PROMPT_MINIFY", "true").lower() in {"1", "true", "yes"}
 
 
 def load_prompt_template(file_path: str = PROMPT_TEMPLATE_PATH) -> str:
@@ -15,7 +18,35 @@ def load_prompt_template(file_path: str = PROMPT_TEMPLATE_PATH) -> str:
         return f.read()
 
 
+def minify_prompt(text: str) -> str:
+    """
+    Shrink a prompt template without changing what it says.
+
+    Fenced ```json blocks (the embedded index mapping) are re-serialized without indentation,
+    trailing whitespace is dropped and runs of blank lines are collapsed to one. Blocks that do
+    not parse as JSON are left as they are.
+
+    Args:
+        text (str): The prompt template.
+
+    Returns:
+        str: The compacted prompt.
+    """
+    def compact(m: re.Match) -> str:
+        try:
+            return "```json\n" + json.dumps(json.loads(m.group(1)), separators=(",", ":"), ensure_ascii=False) + "\n```"
+        except json.JSONDecodeError:
+            return m.group(0)
+
+    text = re.sub(r"```json\s*\n(.*?)\n\s*```", compact, text, flags=re.S)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+# Loaded and compacted once; the same string opens every DSL prompt so provider-side prompt caching applies
 QUERY_SYS = load_prompt_template(PROMPT_TEMPLATE_PATH)
+if PROMPT_MINIFY:
+    QUERY_SYS = minify_prompt(QUERY_SYS)
 
 FEWSHOTS = [
     ("Count people per team.",
@@ -28,4 +59,8 @@ FEWSHOTS = [
      {"index": INDEX, "query": {"match": {"Locations":"Vietnam"}},"size":100})
 ]
 
-SUMM_SYS = "Summarize hits or aggregations briefly for a non-technical user. Only use those hits which are more relevant and answers user's query."
+SUMM_SYS = (
+    "Summarize hits or aggregations briefly for a non-technical user. Only use those hits which are more relevant and answers user's query. "
+    "hits_total is the number of matches; only the top hits are listed. Values under common apply to every listed hit, "
+    "and count is how many identical hits a listed hit stands for."
+)
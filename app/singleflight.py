@@ -0,0 +1,126 @@
+# app/singleflight.py
+
+import os
+import copy
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional
+from dotenv import load_dotenv
+from .deadline import expired
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight async work: the first caller of a key (the leader) does it, and
+    callers arriving while it runs (followers) await its result instead of repeating the work.
+
+    Followers get a private copy of the leader's result, or its exception. If the leader is
+    cancelled or runs out of its own request's deadline, a waiting follower takes over as leader,
+    so a short deadline never fails requests that still have time. Results are not kept once the
+    work finishes; that is what the caches are for.
+
+    Args:
+        name (str): The stage name reported in the stats.
+        enabled (bool): When False, every caller does the work itself.
+    """
+
+    def __init__(self, name: str, enabled: bool = COALESCE_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def follow(self, key: Hashable) -> Optional[Any]:
+        """
+        Await the result of the work in flight for `key`, if any.
+
+        Args:
+            key (Hashable): The coalescing key.
+
+        Returns:
+            Optional[Any]: A private copy of the leader's result, or None when nothing is in flight
+                           (or the leader gave up) and the caller should lead.
+
+        Raises:
+            Exception: The exception the leader's work raised.
+        """
+        while self.enabled and key in self._calls:
+            flight = self._calls[key]
+            try:
+                # Shielded, so a follower timing out does not cancel the leader
+                value = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The leader gave up; the next follower to wake up takes over
+                continue
+            self.followers += 1
+            return copy.deepcopy(value)
+        return None
+
+    @asynccontextmanager
+    async def lead(self, key: Hashable) -> AsyncIterator[asyncio.Future]:
+        """
+        Register the caller as the leader of `key` for the duration of the block.
+
+        The block publishes its result with `set_result` on the yielded future; an exception raised
+        in the block is handed to the followers instead, unless the leader was cancelled or out of
+        time, in which case a follower retries. Call `follow` first: `lead` assumes nothing is in flight.
+
+        Args:
+            key (Hashable): The coalescing key.
+
+        Yields:
+            asyncio.Future: The future the followers await.
+        """
+        flight = asyncio.get_running_loop().create_future()
+        # Mark exceptions as retrieved so an unfollowed failure is not reported as unhandled
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if self.enabled:
+            self._calls[key] = flight
+            self.leaders += 1
+        try:
+            yield flight
+        except Exception as e:
+            if not flight.done() and not expired():
+                flight.set_exception(e)
+            raise
+        finally:
+            if self._calls.get(key) is flight:
+                del self._calls[key]
+            # Cancellation, or a block that ended without a result (e.g. a closed stream)
+            if not flight.done():
+                flight.cancel()
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `work()` once for all concurrent callers of `key`.
+
+        Args:
+            key (Hashable): The coalescing key; equal keys must produce equal results.
+            work (Callable): Returns the awaitable doing the work; its result must not be None.
+
+        Returns:
+            Any: The result of the work (a private copy for followers).
+        """
+        value = await self.follow(key)
+        if value is not None:
+            return value
+        async with self.lead(key) as flight:
+            value = await work()
+            flight.set_result(copy.deepcopy(value))
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many callers led or followed, and how many keys are in flight."""
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
@@ -0,0 +1,173 @@
+# app/summary.py
+
+import os
+import json
+import hashlib
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from .cache import canonical_json, normalize_query
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOP_K = int(os.getenv("SUMMARY_TOP_K", "20"))
+SUMMARY_AGG_ONLY_HITS = int(os.getenv("SUMMARY_AGG_ONLY_HITS", "50"))
+SUMMARY_MAX_BUCKETS = int(os.getenv("SUMMARY_MAX_BUCKETS", "20"))
+SUMMARY_FIELDS = [f.strip() for f in os.getenv(
+    "SUMMARY_FIELDS", "People,Families,Locations,City,Country,Events"
+).split(",") if f.strip()]
+
+# Rough size of a token in JSON text; close enough for budgeting without a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(obj: Any) -> int:
+    """
+    Estimate the number of prompt tokens a JSON value takes.
+
+    Args:
+        obj: Any JSON-serializable value.
+
+    Returns:
+        int: The approximate token count.
+    """
+    return len(json.dumps(obj, separators=(",", ":"), ensure_ascii=False)) // CHARS_PER_TOKEN + 1
+
+
+def trim_aggs(aggs: Dict[str, Any], max_buckets: int) -> Dict[str, Any]:
+    """
+    Keep at most `max_buckets` buckets in every (nested) bucket aggregation.
+
+    Args:
+        aggs (dict): The `aggregations` part of an Elasticsearch response.
+        max_buckets (int): The number of buckets to keep per aggregation.
+
+    Returns:
+        dict: A trimmed copy; trimmed aggregations carry `other_buckets` with the number dropped.
+    """
+    out = {}
+    for name, agg in aggs.items():
+        if not isinstance(agg, dict):
+            out[name] = agg
+            continue
+        agg = dict(agg)
+        buckets = agg.get("buckets")
+        if isinstance(buckets, list):
+            agg["buckets"] = [
+                {k: (trim_aggs({k: v}, max_buckets)[k] if isinstance(v, dict) else v) for k, v in b.items()}
+                for b in buckets[:max_buckets]
+            ]
+            if len(buckets) > max_buckets:
+                agg["other_buckets"] = len(buckets) - max_buckets
+        out[name] = agg
+    return out
+
+
+def project_hits(hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Take the best-scoring hits and keep only the SUMMARY_FIELDS of their `_source`.
+
+    Args:
+        hits (list): The hits of an Elasticsearch response.
+        top_k (int): The number of hits to keep.
+
+    Returns:
+        list: The projected documents, best first, without empty fields.
+    """
+    # ES returns hits ranked already unless a sort was given; then the order is the user's intent
+    ranked = hits if any(h.get("_score") is None for h in hits) else sorted(hits, key=lambda h: -h["_score"])
+    docs = []
+    for h in ranked[:top_k]:
+        src = h.get("_source", {})
+        docs.append({f: src[f] for f in SUMMARY_FIELDS if src.get(f) not in (None, "", [])})
+    return docs
+
+
+def dedupe(docs: List[Dict[str, Any]]) -> tuple:
+    """
+    Collapse repeated values: identical documents are merged and values shared by all documents are hoisted.
+
+    Args:
+        docs (list): Projected documents.
+
+    Returns:
+        tuple: (documents with a `count` where merged, {field: value} shared by every document).
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        key = canonical_json(doc)
+        if key in merged:
+            merged[key]["count"] = merged[key].get("count", 1) + 1
+        else:
+            merged[key] = dict(doc)
+    unique = list(merged.values())
+
+    common = {}
+    if len(unique) > 1:
+        for field, value in unique[0].items():
+            if field != "count" and all(d.get(field) == value for d in unique[1:]):
+                common[field] = value
+        unique = [{k: v for k, v in d.items() if k not in common} for d in unique]
+    return unique, common
+
+
+def compact_results(nl_query: str, es_response: Dict[str, Any], budget: int = SUMMARY_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    Build the summarization payload of a search, kept under a token budget.
+
+    Hits are reduced to the top SUMMARY_TOP_K by score, projected to SUMMARY_FIELDS and deduplicated.
+    When the search has aggregations and more than SUMMARY_AGG_ONLY_HITS matches, only the aggregations
+    are sent. Hits, then buckets, are dropped until the payload fits `budget`.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        es_response (dict): The response from Elasticsearch containing query results.
+        budget (int): The approximate maximum number of tokens of the payload.
+
+    Returns:
+        dict: The payload: query, hits_total, hits (and `common` values), hits_omitted and aggs.
+    """
+    hits_block = es_response.get("hits", {})
+    total = hits_block.get("total")
+    total = total.get("value") if isinstance(total, dict) else total
+    hits = hits_block.get("hits", [])
+    aggs = es_response.get("aggregations", {})
+
+    # Large result sets with aggregations are summarized from the aggregations alone
+    docs = [] if aggs and (total or len(hits)) > SUMMARY_AGG_ONLY_HITS else project_hits(hits, SUMMARY_TOP_K)
+    max_buckets = SUMMARY_MAX_BUCKETS
+
+    while True:
+        unique, common = dedupe(docs)
+        payload = {"query": nl_query, "hits_total": total if total is not None else len(hits)}
+        if common:
+            payload["common"] = common
+        payload["hits"] = unique
+        payload["hits_omitted"] = len(hits) - len(docs)
+        payload["aggs"] = trim_aggs(aggs, max_buckets)
+        if estimate_tokens(payload) <= budget:
+            return payload
+        # Drop the lowest-ranked hits first, then halve the buckets per aggregation
+        if docs:
+            docs = docs[:len(docs) // 2]
+        elif max_buckets > 1:
+            max_buckets //= 2
+        else:
+            return payload
+
+
+def summary_key(nl_query: str, payload: Dict[str, Any]) -> tuple:
+    """
+    Return the summary cache key: the normalized query and a fingerprint of the summarized results.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        payload (dict): The payload built by `compact_results`.
+
+    Returns:
+        tuple: The cache key.
+    """
+    fingerprint = hashlib.sha1(canonical_json({k: v for k, v in payload.items() if k != "query"}).encode()).hexdigest()
+    return normalize_query(nl_query), fingerprint
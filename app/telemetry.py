@@ -1,20 +1,197 @@
 # app/telemetry.py
 
+import os
 import time
 import json
+import queue
+import random
+import hashlib
 import logging
-from typing import Optional
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration
+TELEMETRY_LOG = os.getenv("TELEMETRY_LOG", "")
+TELEMETRY_SAMPLE = float(os.getenv("TELEMETRY_SAMPLE", "1.0"))
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000"))
+TELEMETRY_BATCH = int(os.getenv("TELEMETRY_BATCH", "256"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "1.0"))
+TELEMETRY_MAX_BYTES = int(os.getenv("TELEMETRY_MAX_BYTES", str(64 * 1024 * 1024)))
+TELEMETRY_BACKUPS = int(os.getenv("TELEMETRY_BACKUPS", "5"))
+TELEMETRY_SEEN_DSLS = int(os.getenv("TELEMETRY_SEEN_DSLS", "10000"))
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("nl2es")
 
 
-def log_query(nl: str, dsl: dict, ok: bool, hits_total: int | None, took_ms: int | None, error: str | None):
+def dsl_hash(dsl: dict) -> str:
+    """Return a short stable hash of a DSL, used to store each distinct DSL once per log file."""
+    canonical = json.dumps(dsl, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+class TelemetryWriter:
+    """
+    Write query records from a background thread, in batches, to a rotating JSONL file.
+
+    Callers only enqueue; when the queue is full the record is dropped and counted instead of
+    blocking the request. Each distinct DSL is written once per file as a `{"type": "dsl"}` line
+    and query records refer to it by `dsl_hash`; only the `seen` most recent hashes are remembered,
+    so a DSL not used for a long while is written again. Without a path, records go to the "nl2es"
+    logger (still from the background thread).
+
+    Args:
+        path (str): The JSONL file ("" logs through `logging` instead).
+        max_bytes (int): Size at which the file is rotated to `path.1`, `path.2`, ...
+        backups (int): Number of rotated files kept.
+        queue_size (int): Maximum number of records waiting to be written.
+        seen (int): Number of DSL hashes remembered as already written.
+    """
+
+    def __init__(self, path: str = TELEMETRY_LOG, max_bytes: int = TELEMETRY_MAX_BYTES,
+                 backups: int = TELEMETRY_BACKUPS, queue_size: int = TELEMETRY_QUEUE_SIZE,
+                 seen: int = TELEMETRY_SEEN_DSLS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_seen = seen
+        self._dropped = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, record: Dict[str, Any]):
+        """Enqueue a record without blocking; drop it if the queue is full."""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    @property
+    def dropped(self) -> int:
+        """Records dropped on a full queue."""
+        with self._lock:
+            return self._dropped
+
+    @property
+    def written(self) -> int:
+        """Records written by the background thread."""
+        with self._lock:
+            return self._written
+
+    def close(self, timeout: float = 5.0):
+        """Write the queued records and stop the background thread."""
+        if self._thread is None:
+            return
+        # The sentinel may wait briefly for room; closing happens once, at shutdown
+        self._queue.put(None, timeout=timeout)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # Gather up to TELEMETRY_BATCH records (or what arrived within the flush interval) per write
+        running = True
+        while running:
+            batch: List[dict] = []
+            try:
+                batch.append(self._queue.get(timeout=TELEMETRY_FLUSH_INTERVAL))
+                while len(batch) < TELEMETRY_BATCH:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                running = False
+                batch = [r for r in batch if r is not None]
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    log.warning("Telemetry write failed, %d record(s) lost: %s", len(batch), e)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, batch: List[dict]):
+        # Rotate before writing so the current file always exists and starts with its DSL lines
+        if self.path:
+            if self._file is not None and self._file.tell() >= self.max_bytes:
+                self._rotate()
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+        lines = []
+        for record in batch:
+            dsl = record.pop("dsl", None)
+            if dsl:
+                h = dsl_hash(dsl)
+                record["dsl_hash"] = h
+                if h in self._seen:
+                    self._seen.move_to_end(h)
+                else:
+                    self._remember(h)
+                    lines.append(json.dumps({"type": "dsl", "hash": h, "dsl": dsl}, separators=(",", ":")))
+            lines.append(json.dumps({"type": "query", **record}, separators=(",", ":")))
+        if not self.path:
+            for line in lines:
+                log.info(line)
+        else:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        with self._lock:
+            self._written += len(batch)
+
+    def _remember(self, h: str):
+        # Forget the least recently used hashes over the cap; logger mode never rotates to clear them
+        self._seen[h] = None
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+
+    def _rotate(self):
+        # path -> path.1 -> path.2 ...; every file starts over with its own DSL lines
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._seen.clear()
+
+
+# Shared writer used by the API
+writer = TelemetryWriter()
+
+
+def log_query(nl: str, dsl: dict, ok: bool, hits_total: int | None, took_ms: int | None, error: str | None,
+              stages: Optional[dict] = None):
     """
     Logs the details of a query, including the natural language query, DSL query,
     result status, total hits, execution time, and any error that occurred.
 
+    The record is handed to the background writer; successful queries are sampled at
+    TELEMETRY_SAMPLE, failures are always kept.
+
     Args:
         nl (str): The natural language query from the user.
         dsl (dict): The corresponding DSL query.
@@ -22,15 +199,77 @@ def log_query(nl: str, dsl: dict, ok: bool, hits_total: int | None, took_ms: int
         hits_total (Optional[int]): The total number of hits found (can be None if not applicable).
         took_ms (Optional[int]): The time taken to process the query in milliseconds (can be None if not available).
         error (Optional[str]): Any error message generated during query execution (can be None if no error occurred).
+        stages (Optional[dict]): Milliseconds spent in each request stage (see app.metrics.span).
     """
+    if ok and TELEMETRY_SAMPLE < 1.0 and random.random() >= TELEMETRY_SAMPLE:
+        return
 
-    # Log the query information as a JSON object with timestamp
-    log.info(json.dumps({
+    # Queue the query information with timestamp; serialization happens on the writer thread
+    writer.submit({
         "ts": int(time.time()*1000),  # Current timestamp in milliseconds
         "nl_query": nl,               # The user's natural language query
-        "dsl": dsl,                   # The corresponding DSL query
+        "dsl": dsl,                   # The corresponding DSL query (stored once per file by hash)
         "ok": ok,                     # Query success status
         "hits_total": hits_total,     # Total number of hits (if applicable)
         "took_ms": took_ms,           # Time taken in milliseconds (if available)
-        "error": error                # Any error message (if applicable)
-    }))
+        "error": error,               # Any error message (if applicable)
+        "stages_ms": stages or {}     # Time per request stage (planner, llm_dsl, es, ...)
+    })
+
+
+def replay(path: str = TELEMETRY_LOG) -> Iterator[Dict[str, Any]]:
+    """
+    Read query records back in the order they were written, oldest rotated file first.
+
+    DSL references are resolved, so each record has the same shape as the `log_query` arguments.
+    Lines written by the previous synchronous logger (a JSON object, possibly behind a logging
+    prefix such as "INFO:nl2es:") are read too.
+
+    Args:
+        path (str): The telemetry file (rotated siblings `path.N` are included).
+
+    Yields:
+        dict: One query record with its `dsl`.
+    """
+    if not path:
+        return
+    rotated = sorted(
+        (int(name.rsplit(".", 1)[1]) for name in os.listdir(os.path.dirname(path) or ".")
+         if name.startswith(os.path.basename(path) + ".") and name.rsplit(".", 1)[1].isdigit()),
+        reverse=True,
+    )
+    for file_path in [f"{path}.{i}" for i in rotated] + [path]:
+        if not os.path.exists(file_path):
+            continue
+        dsls: Dict[str, dict] = {}
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                start = line.find("{")
+                if start < 0:
+                    continue
+                try:
+                    record = json.loads(line[start:])
+                except json.JSONDecodeError:
+                    continue
+                kind = record.pop("type", None)
+                if kind == "dsl":
+                    dsls[record["hash"]] = record["dsl"]
+                    continue
+                if "dsl_hash" in record:
+                    record["dsl"] = dsls.get(record.pop("dsl_hash"), {})
+                yield record
+
+
+def main():
+    """Print the records of a telemetry log as self-contained JSON lines."""
+    p = argparse.ArgumentParser(description="Replay a telemetry log as JSON lines with DSLs inlined.")
+    p.add_argument("path", nargs="?", default=TELEMETRY_LOG, help="Telemetry JSONL file (default TELEMETRY_LOG)")
+    p.add_argument("--failed", action="store_true", help="Only print failed queries")
+    args = p.parse_args()
+    for record in replay(args.path):
+        if not args.failed or not record.get("ok"):
+            print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
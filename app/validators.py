@@ -1,25 +1,163 @@
 # app/validators.py
 
 import os
-from jsonschema import validate, ValidationError
+from jsonschema.validators import validator_for
 from .schema import DSL_SCHEMA
-from typing import Dict
+from typing import Any, Dict
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
 ES_INDEX = os.getenv("ES_INDEX", "people-index")
+MAX_QUERY_DEPTH = int(os.getenv("MAX_QUERY_DEPTH", "8"))
+MAX_QUERY_CLAUSES = int(os.getenv("MAX_QUERY_CLAUSES", "256"))
+MAX_TERMS_VALUES = int(os.getenv("MAX_TERMS_VALUES", "1024"))
+MAX_AGG_DEPTH = int(os.getenv("MAX_AGG_DEPTH", "3"))
+MAX_AGGS = int(os.getenv("MAX_AGGS", "20"))
+MAX_AGG_SIZE = int(os.getenv("MAX_AGG_SIZE", "1000"))
 
-# Allowed index names and top-level keys for the DSL query
+# Allowed index names for the DSL query; other top-level keys are dropped by es.build_search
 ALLOWED_INDEXES = {ES_INDEX}
-ALLOWED_TOP_KEYS = {"index", "query", "aggs", "size", "sort", "_explain"}
+
+# Compound queries and the keys holding their sub-queries (a single query or a list of them)
+COMPOUND_QUERIES = {
+    "bool": {"must", "should", "filter", "must_not"},
+    "constant_score": {"filter"},
+    "dis_max": {"queries"},
+    "boosting": {"positive", "negative"},
+    "nested": {"query"},
+}
+
+# Leaf queries, shaped {type: {field: value or params}} or {type: params}
+LEAF_QUERIES = {
+    "match", "match_phrase", "match_phrase_prefix", "match_bool_prefix", "multi_match", "match_all",
+    "match_none", "term", "terms", "range", "exists", "prefix", "wildcard", "regexp", "fuzzy", "ids",
+    "query_string", "simple_query_string",
+}
+
+# Aggregation types; sub-aggregations go under "aggs" or "aggregations" next to the type
+BUCKET_AGGS = {
+    "terms", "significant_terms", "rare_terms", "histogram", "date_histogram", "range", "date_range",
+    "filter", "filters", "missing", "composite", "nested", "reverse_nested",
+}
+METRIC_AGGS = {
+    "avg", "sum", "min", "max", "value_count", "cardinality", "stats", "extended_stats",
+    "percentiles", "top_hits",
+}
+
+# Keys that run code or write, rejected wherever they appear as a clause or parameter name
+FORBIDDEN_KEYS = {
+    "script", "_script", "script_score", "script_fields", "scripted_metric", "runtime_mappings",
+    "update_by_query", "delete", "delete_by_query", "reindex",
+}
+
+# The schema is checked once at import; validating against it then reuses the compiled validator
+_schema_validator_cls = validator_for(DSL_SCHEMA)
+_schema_validator_cls.check_schema(DSL_SCHEMA)
+DSL_VALIDATOR = _schema_validator_cls(DSL_SCHEMA)
+
+
+def _check_keys(obj: Any):
+    # Reject forbidden keys in a parameter object and everything below it
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in FORBIDDEN_KEYS:
+                raise ValueError(f"Disallowed operation: {key}")
+            _check_keys(value)
+    elif isinstance(obj, list):
+        for item in obj:
+            _check_keys(item)
+
+
+def _walk_query(query: Any, depth: int, counter: list):
+    """Check one query clause and its sub-queries; `counter` holds the running clause count."""
+    if depth > MAX_QUERY_DEPTH:
+        raise ValueError(f"Query nested deeper than {MAX_QUERY_DEPTH} levels")
+    if not isinstance(query, dict) or len(query) != 1:
+        raise ValueError("Each query clause must be an object with exactly one query type")
+    counter[0] += 1
+    if counter[0] > MAX_QUERY_CLAUSES:
+        raise ValueError(f"Query has more than {MAX_QUERY_CLAUSES} clauses")
+
+    (kind, body), = query.items()
+    if kind in COMPOUND_QUERIES:
+        if not isinstance(body, dict):
+            raise ValueError(f"'{kind}' query must be an object")
+        for key, value in body.items():
+            if key in COMPOUND_QUERIES[kind]:
+                for sub in value if isinstance(value, list) else [value]:
+                    _walk_query(sub, depth + 1, counter)
+            elif key in FORBIDDEN_KEYS:
+                raise ValueError(f"Disallowed operation: {key}")
+            elif key != "path":
+                _check_keys(value)
+    elif kind in LEAF_QUERIES:
+        if not isinstance(body, dict):
+            raise ValueError(f"'{kind}' query must be an object")
+        if kind == "terms":
+            for value in body.values():
+                if isinstance(value, list) and len(value) > MAX_TERMS_VALUES:
+                    raise ValueError(f"'terms' query has more than {MAX_TERMS_VALUES} values")
+        # Field names are user data ("delete" may be a value); only their parameter objects are checked
+        for value in body.values():
+            _check_keys(value)
+    elif kind in FORBIDDEN_KEYS:
+        raise ValueError(f"Disallowed operation: {kind}")
+    else:
+        raise ValueError(f"Query type not allowed: {kind}")
+
+
+def _walk_aggs(aggs: Any, depth: int, counter: list):
+    """Check an aggregations object and its sub-aggregations; `counter` holds the running agg count."""
+    if depth > MAX_AGG_DEPTH:
+        raise ValueError(f"Aggregations nested deeper than {MAX_AGG_DEPTH} levels")
+    if not isinstance(aggs, dict):
+        raise ValueError("'aggs' must be an object")
+    # Aggregation names are user-chosen and not checked against FORBIDDEN_KEYS
+    for name, agg in aggs.items():
+        counter[0] += 1
+        if counter[0] > MAX_AGGS:
+            raise ValueError(f"More than {MAX_AGGS} aggregations")
+        if not isinstance(agg, dict):
+            raise ValueError(f"Aggregation '{name}' must be an object")
+        kinds = [k for k in agg if k not in {"aggs", "aggregations", "meta"}]
+        if len(kinds) != 1:
+            raise ValueError(f"Aggregation '{name}' must have exactly one type")
+        kind = kinds[0]
+        body = agg[kind]
+        if kind in FORBIDDEN_KEYS:
+            raise ValueError(f"Disallowed operation: {kind}")
+        if kind not in BUCKET_AGGS and kind not in METRIC_AGGS:
+            raise ValueError(f"Aggregation type not allowed: {kind}")
+        if not isinstance(body, dict):
+            raise ValueError(f"Aggregation '{name}' must be an object")
+        if isinstance(body.get("size"), int) and body["size"] > MAX_AGG_SIZE:
+            raise ValueError(f"Aggregation '{name}' size exceeds {MAX_AGG_SIZE}")
+        if kind == "filter":
+            _walk_query(body, 1, [0])
+        elif kind == "filters":
+            filters = body.get("filters", {})
+            for sub in filters.values() if isinstance(filters, dict) else filters:
+                _walk_query(sub, 1, [0])
+        else:
+            _check_keys(body)
+        sub_aggs = agg.get("aggs", agg.get("aggregations"))
+        if sub_aggs is not None:
+            if kind in METRIC_AGGS:
+                raise ValueError(f"Metric aggregation '{name}' cannot have sub-aggregations")
+            _walk_aggs(sub_aggs, depth + 1, counter)
 
 
 def validate_dsl(dsl: Dict[str, any]) -> bool:
     """
     Validate the structure and contents of a DSL query.
 
+    The DSL is checked against the precompiled DSL_SCHEMA validator, then walked once: every query
+    clause and aggregation must be of an allowed type, nesting and clause counts stay within the
+    configured limits, and keys that run scripts or write are rejected where they appear as clause
+    or parameter names (field values and aggregation names are not scanned).
+
     Args:
         dsl (dict): The DSL query to validate.
 
@@ -33,17 +171,21 @@ def validate_dsl(dsl: Dict[str, any]) -> bool:
     if dsl.get("index") not in ALLOWED_INDEXES:
         raise ValueError("Index not allowed.")
 
-    # Validate the DSL query against the predefined schema
-    try:
-        validate(instance=dsl, schema=DSL_SCHEMA)
-    except ValidationError as e:
-        raise ValueError(f"DSL schema invalid: {e.message}")
-
-    # Disallow write operations or scripts if they are present erroneously
-    txt = str(dsl).lower()
-    for bad in ["update_by_query", "delete", "script", "reindex"]:
-        if bad in txt:
-            raise ValueError(f"Disallowed operation: {bad}")
+    # Validate the DSL query against the precompiled schema
+    error = next(DSL_VALIDATOR.iter_errors(dsl), None)
+    if error is not None:
+        raise ValueError(f"DSL schema invalid: {error.message}")
+
+    # Disallow write operations or scripts at the top level
+    for key in dsl:
+        if key in FORBIDDEN_KEYS:
+            raise ValueError(f"Disallowed operation: {key}")
+
+    # Walk the query, aggregations and sort structurally
+    _walk_query(dsl["query"], 1, [0])
+    if "aggs" in dsl:
+        _walk_aggs(dsl["aggs"], 1, [0])
+    _check_keys(dsl.get("sort", []))
 
     # Return True if validation passes
     return True
@@ -0,0 +1,5 @@
+"""
+Offline benchmark harness: local stand-ins for Azure OpenAI and Elasticsearch, and a load driver for main.app.
+
+Run from the repository root: python -m bench.run --help
+"""
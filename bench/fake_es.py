@@ -0,0 +1,286 @@
+# bench/fake_es.py
+
+import csv
+import json
+import time
+import random
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+
+# Leaf queries the fake evaluates against the documents; any other leaf matches every document
+TEXT_QUERIES = {"match", "match_phrase", "match_phrase_prefix", "match_bool_prefix"}
+EXACT_QUERIES = {"term", "terms", "prefix", "wildcard"}
+
+# Documents beyond this many are not counted exactly unless track_total_hits is true
+TRACK_TOTAL_HITS = 10000
+
+
+def _doc_field(field: str) -> str:
+    # City and Country are split out of Locations by the ingest pipeline
+    field = field.removesuffix(".keyword").removesuffix("_raw")
+    return "Locations" if field in {"City", "Country"} else field
+
+
+def _leaf_matches(kind: str, spec: Dict[str, Any], doc: Dict[str, str]) -> bool:
+    # Approximate analyzed text and keyword matching, case-insensitively
+    field, value = next(iter(spec.items()))
+    if isinstance(value, dict):
+        value = value.get("query", value.get("value", ""))
+    text = doc.get(_doc_field(field), "").lower()
+    if kind == "terms":
+        return any(str(v).lower() in text for v in value)
+    value = str(value).lower()
+    if kind == "match":
+        return any(word in text.split() for word in value.split())
+    if kind == "wildcard":
+        return all(part in text for part in value.replace("?", "*").split("*"))
+    return value in text
+
+
+def matches(query: Optional[Dict[str, Any]], doc: Dict[str, str]) -> bool:
+    """
+    Evaluate a query against one document, approximately.
+
+    bool queries and the text and exact leaf queries are evaluated; other queries (range, exists,
+    query_string, ...) match every document.
+
+    Args:
+        query (Optional[dict]): The query clause (None matches everything).
+        doc (dict): The document source.
+
+    Returns:
+        bool: Whether the document matches.
+    """
+    if not query:
+        return True
+    kind, spec = next(iter(query.items()))
+    if kind == "bool":
+        required = [*_as_list(spec.get("must")), *_as_list(spec.get("filter"))]
+        should = _as_list(spec.get("should"))
+        return (all(matches(q, doc) for q in required)
+                and not any(matches(q, doc) for q in _as_list(spec.get("must_not")))
+                and (bool(required) or not should or any(matches(q, doc) for q in should)))
+    if kind in {"constant_score", "boosting"}:
+        return matches(spec.get("filter") or spec.get("positive"), doc)
+    if kind in TEXT_QUERIES | EXACT_QUERIES and isinstance(spec, dict) and spec:
+        return _leaf_matches(kind, spec, doc)
+    return True
+
+
+def count_clauses(node: Any) -> int:
+    """Count the query clauses and aggregations of a search body, the fake's measure of its cost."""
+    if isinstance(node, list):
+        return sum(count_clauses(n) for n in node)
+    if not isinstance(node, dict):
+        return 0
+    leaves = sum(1 for k in node if k in TEXT_QUERIES | EXACT_QUERIES | {"range", "exists", "query_string", "nested"})
+    return leaves + sum(count_clauses(v) for v in node.values())
+
+
+def filter_path(obj: Any, paths: List[List[str]]) -> Any:
+    """
+    Keep only the parts of a response named by `filter_path` patterns (split on dots; `*` matches any key).
+
+    Args:
+        obj (Any): The response, or a part of it.
+        paths (List[List[str]]): The remaining segments of each pattern.
+
+    Returns:
+        Any: The filtered response (None when nothing is kept).
+    """
+    if any(not p for p in paths):
+        return obj
+    if isinstance(obj, list):
+        kept = [filter_path(item, paths) for item in obj]
+        return [item for item in kept if item is not None] or None
+    if not isinstance(obj, dict):
+        return None
+    out = {}
+    for key, value in obj.items():
+        rest = [p[1:] for p in paths if p[0] in {"*", key}]
+        if rest:
+            kept = filter_path(value, rest)
+            if kept is not None:
+                out[key] = kept
+    return out or None
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _source(doc: Dict[str, str], spec: Any) -> Optional[Dict[str, str]]:
+    # _source: false, a field list, or includes/excludes
+    if spec is None or spec is True:
+        return doc
+    if spec is False:
+        return None
+    if isinstance(spec, dict):
+        includes, excludes = _as_list(spec.get("includes")), _as_list(spec.get("excludes"))
+    else:
+        includes, excludes = _as_list(spec), []
+    return {k: v for k, v in doc.items() if (not includes or k in includes) and k not in excludes}
+
+
+class FakeElasticsearch:
+    """
+    A stdlib HTTP stand-in for the Elasticsearch endpoints the app uses.
+
+    Documents come from a CSV (data/data.csv). `_search` evaluates bool, match, term and similar
+    queries approximately (others match every document; there is no relevance scoring) and honours
+    `size`, `from`, `_source`, `track_total_hits` and the `filter_path` parameter, so response sizes
+    follow the request. Aggregations are exact terms buckets over all documents. `_msearch`, `_mapping`,
+    points in time with `search_after` (documents sort by position, the last sort value) and the
+    product check are supported. Each request sleeps for the configured latency, plus
+    `clause_latency` per query clause and aggregation. Shard-level costs (caches, segment merges,
+    expensive queries) are not modelled, so ES-side timings only show how the app's request
+    shapes scale, not real cluster latency.
+
+    Args:
+        csv_path (str): The CSV providing the documents.
+        latency (float): Base response time in seconds.
+        jitter (float): Extra uniformly random response time in seconds.
+        port (int): The port to listen on (0 picks a free one).
+        clause_latency (float): Extra response time per query clause or aggregation, in seconds.
+    """
+
+    def __init__(self, csv_path: str, latency: float = 0.005, jitter: float = 0.0, port: int = 0,
+                 clause_latency: float = 0.001):
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            self.docs = [{k: (v or "") for k, v in row.items()} for row in csv.DictReader(f)]
+        self.latency = latency
+        self.jitter = jitter
+        self.clause_latency = clause_latency
+        self.requests = 0
+        self._buckets: Dict[str, List[dict]] = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeElasticsearch":
+        """Serve in a daemon thread and return self."""
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+
+    def delay(self, bodies: List[Dict[str, Any]]) -> float:
+        """Return the simulated response time of a request carrying these search bodies."""
+        clauses = sum(count_clauses(b.get("query")) + (1 + count_clauses(b["knn"]) if b.get("knn") else 0)
+                      + len(b.get("aggs") or {}) for b in bodies)
+        return self.latency + self.clause_latency * clauses + random.uniform(0, self.jitter)
+
+    def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the response to one search body."""
+        size = body.get("size", 10)
+        query = body.get("query")
+        if query is None and isinstance(body.get("knn"), dict):
+            query = body["knn"].get("filter")
+        after = body["search_after"][-1] if body.get("search_after") else -1
+        found = [i for i, doc in enumerate(self.docs) if i > after and matches(query, doc)]
+        offset = body.get("from", 0)
+        hits = []
+        for i in found[offset:offset + size]:
+            hit = {"_index": "people-index", "_id": str(i), "_score": 1.0 / (i + 1)}
+            source = _source(self.docs[i], body.get("_source"))
+            if source is not None:
+                hit["_source"] = source
+            if body.get("sort"):
+                hit["sort"] = [hit["_score"]] * (len(body["sort"]) - 1) + [i]
+            hits.append(hit)
+        resp = {
+            "took": 1, "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {"max_score": 1.0 if hits else None, "hits": hits},
+        }
+        track = body.get("track_total_hits", TRACK_TOTAL_HITS)
+        if track is not False:
+            limit = len(found) if track is True else int(track)
+            resp["hits"]["total"] = {"value": min(len(found), limit),
+                                     "relation": "eq" if len(found) <= limit else "gte"}
+        if body.get("pit"):
+            resp["pit_id"] = body["pit"]["id"]
+        if body.get("aggs"):
+            resp["aggregations"] = {name: self._agg(agg) for name, agg in body["aggs"].items()}
+        return resp
+
+    def _agg(self, agg: Dict[str, Any]) -> Dict[str, Any]:
+        # Exact terms buckets over all documents; other aggregation types get an empty result
+        terms = agg.get("terms")
+        if not terms:
+            return {"value": len(self.docs)}
+        field = terms.get("field", "").removesuffix(".keyword").removesuffix("_raw")
+        if field not in self._buckets:
+            counts = Counter(doc.get(field, "") for doc in self.docs)
+            self._buckets[field] = [{"key": k, "doc_count": n} for k, n in counts.most_common() if k]
+        return {"doc_count_error_upper_bound": 0, "sum_other_doc_count": 0,
+                "buckets": self._buckets[field][:terms.get("size", 10)]}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, obj: Any, status: int = 200, bodies: Optional[List[dict]] = None):
+                fake.requests += 1
+                time.sleep(fake.delay(bodies or []))
+                paths = parse_qs(self.path.partition("?")[2]).get("filter_path")
+                if paths:
+                    obj = filter_path(obj, [p.split(".") for p in ",".join(paths).split(",")]) or {}
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("X-Elastic-Product", "Elasticsearch")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> str:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path.endswith("/_mapping"):
+                    index = path.strip("/").split("/")[0]
+                    return self._reply({f"{index}-v1": {"mappings": {"_meta": {"generation": 0}}}})
+                if path.endswith("/_search"):
+                    return self.do_POST()
+                return self._reply({"version": {"number": "8.13.0"}, "tagline": "You Know, for Search"})
+
+            def do_HEAD(self):
+                self._reply({})
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                raw = self._body()
+                if path.endswith("/_msearch"):
+                    lines = [json.loads(line) for line in raw.splitlines() if line.strip()]
+                    bodies = lines[1::2]
+                    responses = [{**fake.search(body), "status": 200} for body in bodies]
+                    return self._reply({"took": 1, "responses": responses}, bodies=bodies)
+                if path.endswith("/_search"):
+                    body = json.loads(raw) if raw else {}
+                    return self._reply(fake.search(body), bodies=[body])
+                if path.endswith("/_pit"):
+                    return self._reply({"id": "bench-pit"})
+                return self._reply({"acknowledged": True})
+
+            def do_DELETE(self):
+                self._body()
+                self._reply({"succeeded": True, "num_freed": 1})
+
+            do_PUT = do_POST
+
+        return Handler
@@ -0,0 +1,117 @@
+# bench/fake_openai.py
+
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Tuple
+
+SUMMARY_TEXT = (
+    "Most matching people are in Operations and Sales, spread over Tokyo, Jakarta and London; "
+    "the most common event is the Cross-Cultural Communication Workshop."
+)
+
+
+class FakeOpenAI:
+    """
+    A stdlib HTTP stand-in for Azure OpenAI chat completions.
+
+    DSL requests are answered with the few-shot DSL whose question shares the most words with the
+    user's query; summary requests (system prompt starting with "Summarize") get a fixed summary,
+    streamed word by word when `stream` is set. Usage is reported at about 4 characters per token.
+
+    Args:
+        fewshots (list): (question, DSL) pairs, as in app.prompts.FEWSHOTS.
+        latency (float): Base response time in seconds (time to first token when streaming).
+        jitter (float): Extra uniformly random response time in seconds.
+        token_delay (float): Delay between streamed tokens in seconds.
+        port (int): The port to listen on (0 picks a free one).
+    """
+
+    def __init__(self, fewshots: List[Tuple[str, Dict[str, Any]]], latency: float = 0.3, jitter: float = 0.1,
+                 token_delay: float = 0.01, port: int = 0):
+        self.load_fewshots(fewshots)
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeOpenAI":
+        """Serve in a daemon thread and return self."""
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+
+    def load_fewshots(self, fewshots: List[Tuple[str, Dict[str, Any]]]):
+        """Set the (question, DSL) pairs DSL requests are answered from."""
+        self.fewshots = [(set(q.lower().strip(".").split()), dsl) for q, dsl in fewshots]
+
+    def answer(self, messages: List[Dict[str, str]]) -> str:
+        """Return the assistant message for a conversation."""
+        if messages[0]["content"].startswith("Summarize"):
+            return SUMMARY_TEXT
+        words = set(messages[-1]["content"].lower().strip(".?").split())
+        _, dsl = max(self.fewshots, key=lambda shot: len(shot[0] & words))
+        return json.dumps(dsl)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                fake.requests += 1
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                content = fake.answer(req["messages"])
+                prompt_tokens = sum(len(m["content"]) for m in req["messages"]) // 4 + 1
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4 + 1,
+                         "total_tokens": prompt_tokens + len(content) // 4 + 1}
+                time.sleep(fake.latency + random.uniform(0, fake.jitter))
+                if req.get("stream"):
+                    return self._stream(req, content)
+                self._json({
+                    "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                    "model": req.get("model", "bench"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            def _json(self, obj: Any):
+                data = json.dumps(obj).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, req: Dict[str, Any], content: str):
+                # Server-sent events, one word per chunk, closed with [DONE]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, word in enumerate(content.split(" ")):
+                    chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": req.get("model", "bench"),
+                             "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                          "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(fake.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
@@ -0,0 +1,235 @@
+"""
+Drive main.app against local stand-ins for Azure OpenAI and Elasticsearch and report latency percentiles.
+
+No credentials or network are needed: both backends are local stdlib servers (bench.fake_openai,
+bench.fake_es) with configurable latency, and requests go to the FastAPI app in-process through
+httpx's ASGI transport. Per-stage timings are read back from the telemetry log.
+
+Run from the repository root:
+    python -m bench.run --requests 500 --concurrency 32 --unique 0.3
+    python -m bench.run --endpoint batch --batch-size 50 --json bench.json --max-p95-ms 800
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Query mix: shapes the planner serves without the LLM, and free-form ones that need it
+PLANNER_QUERIES = [
+    "Count people per team",
+    "count people per location",
+    "Top 5 locations for cybersecurity training",
+    "People in Tokyo, Japan",
+]
+LLM_QUERIES = [
+    "People in Tokyo who joined a workshop.",
+    "list all those who lives in Vietnam",
+    "Who from Sales attended the global marketing summit?",
+    "Which teams completed advanced cybersecurity training in London?",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of values by nearest rank, or 0.0 if there are none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def summarize_ms(values: List[float]) -> Dict[str, float]:
+    """Return count, p50, p95, p99 and max of millisecond values."""
+    return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "max": max(values, default=0.0)}
+
+
+def make_queries(n: int, unique: float, planner_share: float, seed: int) -> List[str]:
+    """
+    Build the query sequence of a run.
+
+    Args:
+        n (int): Number of queries.
+        unique (float): Fraction made unique with a number suffix, so no cache can serve them.
+        planner_share (float): Fraction drawn from the planner shapes instead of the LLM ones.
+        seed (int): Random seed, for repeatable runs.
+
+    Returns:
+        list: The queries.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for i in range(n):
+        q = rng.choice(PLANNER_QUERIES if rng.random() < planner_share else LLM_QUERIES)
+        if rng.random() < unique:
+            q = f"{q} (request {i})"
+        queries.append(q)
+    return queries
+
+
+async def drive(app, queries: List[str], args) -> List[Dict[str, Any]]:
+    """
+    Send the queries to the app with at most `args.concurrency` requests in flight.
+
+    Returns:
+        list: One {"ms", "status"} result per request (per batch for the batch endpoint).
+    """
+    import httpx
+
+    sem = asyncio.Semaphore(args.concurrency)
+    results: List[Dict[str, Any]] = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=None) as client:
+        async def one(payload: Dict[str, Any], path: str):
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    resp = await client.post(path, json=payload)
+                    status = resp.status_code
+                    if path == "/search/stream" and b"event: error" in resp.content:
+                        status = 599
+                except Exception:
+                    status = 0
+                results.append({"ms": (time.perf_counter() - started) * 1000, "status": status})
+
+        item = lambda q: {"query": q, "size": args.size, "summarize": args.summarize}
+        if args.endpoint == "batch":
+            groups = [queries[i:i + args.batch_size] for i in range(0, len(queries), args.batch_size)]
+            await asyncio.gather(*(one({"items": [item(q) for q in g]}, "/search/batch") for g in groups))
+        else:
+            path = "/search/stream" if args.endpoint == "stream" else "/search"
+            await asyncio.gather(*(one(item(q), path) for q in queries))
+    return results
+
+
+def main():
+    """Main execution function."""
+    p = argparse.ArgumentParser(description="Offline load test of the search API with fake LLM and ES backends.")
+    p.add_argument("--requests", type=int, default=200, help="Measured requests (queries for the batch endpoint)")
+    p.add_argument("--warmup", type=int, default=20, help="Unmeasured requests sent first")
+    p.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    p.add_argument("--endpoint", choices=["search", "stream", "batch"], default="search", help="API endpoint to drive")
+    p.add_argument("--batch-size", type=int, default=20, help="Queries per batch request with --endpoint batch")
+    p.add_argument("--size", type=int, default=10, help="Hits requested per query")
+    p.add_argument("--summarize", action="store_true", help="Ask for summaries")
+    p.add_argument("--unique", type=float, default=0.2, help="Fraction of queries no cache can serve")
+    p.add_argument("--planner-share", type=float, default=0.4, help="Fraction of queries in planner-supported shapes")
+    p.add_argument("--no-cache", action="store_true", help="Disable the DSL, result and summary caches")
+    p.add_argument("--no-coalesce", action="store_true", help="Disable coalescing of identical in-flight calls")
+    p.add_argument("--llm-latency", type=float, default=0.3, help="Fake LLM base latency in seconds")
+    p.add_argument("--llm-jitter", type=float, default=0.1, help="Fake LLM random extra latency in seconds")
+    p.add_argument("--es-latency", type=float, default=0.005, help="Fake ES base latency in seconds")
+    p.add_argument("--es-jitter", type=float, default=0.005, help="Fake ES random extra latency in seconds")
+    p.add_argument("--es-clause-latency", type=float, default=0.001,
+                   help="Fake ES extra latency per query clause or aggregation in seconds")
+    p.add_argument("--csv", default=os.path.join(ROOT, "data", "data.csv"), help="Documents served by the fake ES")
+    p.add_argument("--seed", type=int, default=0, help="Random seed of the query mix")
+    p.add_argument("--tracemalloc", action="store_true", help="Track peak Python heap (slows the run)")
+    p.add_argument("--json", default="", help="Also write the report to this JSON file")
+    p.add_argument("--max-p95-ms", type=float, default=0, help="Exit with status 1 if p95 latency exceeds this")
+    args = p.parse_args()
+
+    # Imports below read their configuration from the environment, so it is set up first
+    from bench.fake_es import FakeElasticsearch
+    from bench.fake_openai import FakeOpenAI
+
+    fake_es = FakeElasticsearch(args.csv, args.es_latency, args.es_jitter, clause_latency=args.es_clause_latency)
+    fake_llm = FakeOpenAI([], args.llm_latency, args.llm_jitter)
+    telemetry_log = os.path.join(tempfile.mkdtemp(prefix="nl2es-bench-"), "telemetry.jsonl")
+    os.environ.update({
+        "ES_URL": fake_es.url,
+        "AZURE_OPENAI_ENDPOINT": fake_llm.url,
+        "AZURE_OPENAI_API_KEY": "bench",
+        "AZURE_OPENAI_API_VERSION": "2024-06-01",
+        "TELEMETRY_LOG": telemetry_log,
+        "TELEMETRY_SAMPLE": "1.0",
+    })
+    os.environ.setdefault("SYS_PROMPT", os.path.join(ROOT, "prompts", "sys_prompt_v2.txt"))
+    os.environ.setdefault("ES_INDEX", "people-index")
+    if args.no_cache:
+        for name in ("DSL_CACHE_ENABLED", "RESULT_CACHE_ENABLED", "SUMMARY_CACHE_ENABLED"):
+            os.environ[name] = "false"
+    if args.no_coalesce:
+        os.environ["COALESCE_ENABLED"] = "false"
+
+    from app.prompts import FEWSHOTS
+    fake_llm.load_fewshots(FEWSHOTS)
+    fake_es.start()
+    fake_llm.start()
+
+    import main as api
+    from app.telemetry import replay, writer
+    from app.es import aes
+    from app.llm import aclient
+
+    async def run():
+        if args.warmup:
+            await drive(api.app, make_queries(args.warmup, args.unique, args.planner_share, args.seed + 1), args)
+        queries = make_queries(args.requests, args.unique, args.planner_share, args.seed)
+        llm_before, es_before = fake_llm.requests, fake_es.requests
+        if args.tracemalloc:
+            tracemalloc.start()
+        started_ms = int(time.time() * 1000)
+        started = time.perf_counter()
+        results = await drive(api.app, queries, args)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        stats = api.cache_stats()
+        await aes.close()
+        await aclient.close()
+        return results, elapsed, started_ms, peak, stats, fake_llm.requests - llm_before, fake_es.requests - es_before
+
+    results, elapsed, started_ms, peak, stats, llm_calls, es_calls = asyncio.run(run())
+
+    # Stage timings come from the telemetry records of the measured requests
+    writer.close()
+    stages: Dict[str, List[float]] = {}
+    for record in replay(telemetry_log):
+        if record.get("ts", 0) >= started_ms:
+            for stage, ms in (record.get("stages_ms") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+
+    latencies = [r["ms"] for r in results]
+    report = {
+        "endpoint": args.endpoint, "requests": len(results), "concurrency": args.concurrency,
+        "errors": sum(1 for r in results if r["status"] != 200),
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize_ms(latencies),
+        "stages_ms": {stage: summarize_ms(values) for stage, values in sorted(stages.items())},
+        "backend_calls": {"llm": llm_calls, "es": es_calls},
+        "caches": stats,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_heap_mb": peak / 1e6 if peak is not None else None,
+    }
+
+    lat = report["latency_ms"]
+    print(f"{report['requests']} {args.endpoint} requests in {elapsed:.2f}s at concurrency {args.concurrency}: "
+          f"{report['throughput_rps']:.1f} req/s, {report['errors']} errors")
+    print(f"Latency ms: p50 {lat['p50']:.1f}  p95 {lat['p95']:.1f}  p99 {lat['p99']:.1f}  max {lat['max']:.1f}")
+    print(f"\n{'stage':<14} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, s in report["stages_ms"].items():
+        print(f"{stage:<14} {s['count']:>6} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f}")
+    print(f"\nBackend calls: {llm_calls} LLM, {es_calls} ES")
+    print(f"Memory: max RSS {report['max_rss_mb']:.0f} MB"
+          + (f", peak Python heap {report['peak_heap_mb']:.1f} MB" if peak is not None else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95_ms and lat["p95"] > args.max_p95_ms:
+        print(f"p95 {lat['p95']:.1f} ms exceeds --max-p95-ms {args.max_p95_ms}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
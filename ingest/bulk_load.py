@@ -2,11 +2,24 @@
 
 import argparse
 import hashlib
+import json
+import os
 import sys
+import time
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import Executor, ProcessPoolExecutor
 from elasticsearch import Elasticsearch, helpers
-from elasticsearch.exceptions import TransportError
-from typing import Optional, Generator
+from elasticsearch.exceptions import ApiError, TransportError
+from typing import Optional, Generator, Iterable, List, Tuple
+from ingest.index_settings import bulk_load_profile, bump_generation, force_merge
+from app.embeddings import EMBED_DIMS, EMBED_FIELD, doc_text, embed_texts
+from app.es_client import ES_URL, make_client
+
+# Source fields of each document, in make_id key order
+FIELDS = ["People", "Families", "Locations", "Events"]
 
 
 def ensure_columns(df: pd.DataFrame, cols: list):
@@ -59,7 +72,122 @@ def make_id(row: dict) -> str:
     return h.hexdigest()
 
 
-def gen_actions(df: pd.DataFrame, index: str, pipeline: Optional[str] = None, use_id: bool = True) -> Generator[dict, None, None]:
+def _hash_keys(keys: List[str]) -> List[str]:
+    """Hash pre-joined make_id keys; module-level so it can run in worker processes."""
+    return [hashlib.sha256(k.encode("utf-8")).hexdigest() for k in keys]
+
+
+def make_ids(df: pd.DataFrame, workers: int = 1, pool: Optional[Executor] = None) -> List[str]:
+    """
+    Generate the make_id of every row of a normalized DataFrame at once.
+
+    The key strings are built column-wise, then hashed in-process or across `workers` processes.
+
+    Args:
+        df (pd.DataFrame): The normalized DataFrame.
+        workers (int): Number of processes to hash with (default is 1, no pool).
+        pool (Optional[Executor]): A process pool to reuse across calls (created per call if omitted).
+
+    Returns:
+        list: The IDs, in row order, identical to calling make_id on each row.
+    """
+    keys = df[FIELDS[0]].str.cat(df[FIELDS[1:]], sep="|").tolist()
+    if workers <= 1 or len(keys) < 10000:
+        return _hash_keys(keys)
+    step = -(-len(keys) // (workers * 4))
+    parts = [keys[i:i + step] for i in range(0, len(keys), step)]
+    if pool is not None:
+        return [h for part in pool.map(_hash_keys, parts) for h in part]
+    with ProcessPoolExecutor(max_workers=workers) as own_pool:
+        return [h for part in own_pool.map(_hash_keys, parts) for h in part]
+
+
+def read_csv_chunks(csv_path: str, chunk_rows: int = 0, skip_rows: int = 0) -> Iterable[pd.DataFrame]:
+    """
+    Open a CSV file for reading, whole or in chunks.
+
+    Skipped rows are counted in records, not lines, so quoted multi-line values are skipped whole.
+    In chunked mode they are read and dropped a chunk at a time, so memory stays bounded on resume.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        chunk_rows (int): Rows per chunk; 0 reads the whole file as a single chunk.
+        skip_rows (int): Number of data rows (after the header) to skip, used when resuming.
+
+    Returns:
+        Iterable[pd.DataFrame]: The raw chunks, read lazily when chunk_rows > 0.
+    """
+    if chunk_rows > 0:
+        return skip_records(pd.read_csv(csv_path, chunksize=chunk_rows), skip_rows)
+    return [pd.read_csv(csv_path).iloc[skip_rows:]]
+
+
+def skip_records(chunks: Iterable[pd.DataFrame], skip_rows: int) -> Generator[pd.DataFrame, None, None]:
+    """Drop the first `skip_rows` records of a chunk stream, then pass the remaining chunks through."""
+    for df in chunks:
+        if skip_rows >= len(df):
+            skip_rows -= len(df)
+            continue
+        if skip_rows:
+            df, skip_rows = df.iloc[skip_rows:], 0
+        yield df
+
+
+def prepared_chunks(chunks: Iterable[pd.DataFrame], use_id: bool = True, workers: int = 1,
+                    stats: Optional[dict] = None) -> Generator[Tuple[pd.DataFrame, Optional[List[str]]], None, None]:
+    """
+    Validate and normalize CSV chunks and compute their document IDs, one chunk at a time.
+
+    Only one chunk is materialized at a time, so memory stays bounded by the chunk size.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Raw chunks from read_csv_chunks.
+        use_id (bool): Whether to compute document IDs (default is True).
+        workers (int): Number of processes used to compute document IDs.
+        stats (Optional[dict]): Updated in place with the `rows` and `bytes` read so far.
+
+    Yields:
+        tuple: The normalized chunk and its IDs (None when use_id is False).
+    """
+    pool = ProcessPoolExecutor(max_workers=workers) if use_id and workers > 1 else None
+    try:
+        for df in chunks:
+            ensure_columns(df, FIELDS)
+            df = normalize_df(df)
+            if stats is not None:
+                stats["rows"] = stats.get("rows", 0) + len(df)
+                stats["bytes"] = stats.get("bytes", 0) + source_bytes(df)
+            yield df, make_ids(df, workers=workers, pool=pool) if use_id else None
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def chunk_actions(chunks: Iterable[pd.DataFrame], index: str, pipeline: Optional[str] = None,
+                  use_id: bool = True, workers: int = 1, stats: Optional[dict] = None,
+                  embed_cache: Optional["EmbeddingCache"] = None) -> Generator[dict, None, None]:
+    """
+    Turn CSV chunks into a single flat stream of bulk actions.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Raw chunks from read_csv_chunks.
+        index (str): The target Elasticsearch index.
+        pipeline (Optional[str]): The ingest pipeline to apply (optional).
+        use_id (bool): Whether to set a document ID (default is True).
+        workers (int): Number of processes used to compute document IDs.
+        stats (Optional[dict]): Updated in place with the `rows` and `bytes` read so far.
+        embed_cache (Optional[EmbeddingCache]): If set, each document also gets its embedding (requires use_id).
+
+    Yields:
+        dict: A dictionary representing an Elasticsearch bulk action.
+    """
+    for df, ids in prepared_chunks(chunks, use_id=use_id, workers=workers, stats=stats):
+        vectors = embed_cache.embed(df, ids) if embed_cache is not None else None
+        yield from gen_actions(df, index, pipeline=pipeline, use_id=use_id, ids=ids, vectors=vectors)
+
+
+def gen_actions(df: pd.DataFrame, index: str, pipeline: Optional[str] = None, use_id: bool = True,
+                ids: Optional[List[str]] = None, vectors: Optional[np.ndarray] = None) -> Generator[dict, None, None]:
     """
     Generate the bulk actions for Elasticsearch.
 
@@ -68,25 +196,309 @@ def gen_actions(df: pd.DataFrame, index: str, pipeline: Optional[str] = None, us
         index (str): The target Elasticsearch index.
         pipeline (Optional[str]): The ingest pipeline to apply (optional).
         use_id (bool): Whether to set a document ID (default is True).
+        ids (Optional[List[str]]): Precomputed IDs from make_ids (computed here if omitted).
+        vectors (Optional[np.ndarray]): Row embeddings stored in the EMBED_FIELD dense_vector field (optional).
 
     Yields:
         dict: A dictionary representing an Elasticsearch bulk action.
     """
-    for _, r in df.iterrows():
-        src = {
-            "People": r["People"],
-            "Families": r["Families"],
-            "Locations": r["Locations"],
-            "Events": r["Events"],
-        }
-        action = {"_index": index, "_source": src}
+    if use_id and ids is None:
+        ids = make_ids(df)
+
+    # Iterate over plain column lists rather than df.iterrows(), which builds a Series per row
+    columns = [df[c].tolist() for c in FIELDS]
+    for i, values in enumerate(zip(*columns)):
+        action = {"_index": index, "_source": dict(zip(FIELDS, values))}
+        if vectors is not None:
+            action["_source"][EMBED_FIELD] = vectors[i].tolist()
         if use_id:
-            action["_id"] = make_id(src)
+            action["_id"] = ids[i]
         if pipeline:
             action["pipeline"] = pipeline
         yield action
 
 
+def ids_to_digests(ids: List[str]) -> np.ndarray:
+    """Pack hex make_id values into an array of raw 32-byte SHA-256 digests."""
+    return np.frombuffer(b"".join(bytes.fromhex(i) for i in ids), dtype="S32")
+
+
+def digests_to_ids(digests: np.ndarray) -> List[str]:
+    """Turn raw digests back into hex IDs (numpy strips trailing NUL bytes, so pad them back)."""
+    return [d.ljust(32, b"\0").hex() for d in digests.tolist()]
+
+
+def contains(sorted_digests: np.ndarray, digests: np.ndarray) -> np.ndarray:
+    """
+    Vectorized membership test against a sorted digest array.
+
+    Args:
+        sorted_digests (np.ndarray): The sorted manifest.
+        digests (np.ndarray): The digests to look up.
+
+    Returns:
+        np.ndarray: A boolean mask, True where the digest is in the manifest.
+    """
+    if len(sorted_digests) == 0:
+        return np.zeros(len(digests), dtype=bool)
+    pos = np.searchsorted(sorted_digests, digests)
+    return sorted_digests[np.minimum(pos, len(sorted_digests) - 1)] == digests
+
+
+def load_manifest(path: str) -> np.ndarray:
+    """Read the sorted manifest of indexed document digests (empty if the file does not exist)."""
+    if not os.path.exists(path):
+        return np.empty(0, dtype="S32")
+    return np.fromfile(path, dtype="S32")
+
+
+def save_manifest(path: str, digests: np.ndarray):
+    """Atomically write the manifest as sorted, unique raw 32-byte digests."""
+    tmp = f"{path}.tmp"
+    np.unique(digests).tofile(tmp)
+    os.replace(tmp, path)
+
+
+class EmbeddingCache:
+    """
+    Document embeddings keyed by make_id digest, persisted as an .npz file between runs.
+
+    Only rows whose ID is not cached are sent to the embedding model, in batches.
+
+    Args:
+        path (Optional[str]): The .npz cache file; None keeps the cache in memory only.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.keys = np.empty(0, dtype="S32")
+        self.vectors = np.empty((0, EMBED_DIMS), dtype=np.float32)
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                self.keys, self.vectors = data["keys"], data["vectors"]
+        self._new_keys, self._new_vectors = [], []
+
+    def embed(self, df: pd.DataFrame, ids: List[str]) -> np.ndarray:
+        """
+        Return the embeddings of a normalized chunk, computing only the uncached ones.
+
+        Args:
+            df (pd.DataFrame): The normalized chunk.
+            ids (List[str]): The chunk's make_id values.
+
+        Returns:
+            np.ndarray: One float32 vector per row.
+        """
+        digests = ids_to_digests(ids)
+        out = np.empty((len(ids), EMBED_DIMS), dtype=np.float32)
+        hit = contains(self.keys, digests)
+        if hit.any():
+            out[hit] = self.vectors[np.searchsorted(self.keys, digests[hit])]
+        miss = np.flatnonzero(~hit)
+        if len(miss):
+            columns = [df[c].tolist() for c in FIELDS]
+            texts = [doc_text({f: col[i] for f, col in zip(FIELDS, columns)}) for i in miss]
+            vectors = embed_texts(texts)
+            out[miss] = vectors
+            self._new_keys.append(digests[miss])
+            self._new_vectors.append(vectors)
+        return out
+
+    def save(self):
+        """Merge the new embeddings into the cache file (sorted by digest for lookups)."""
+        if not self.path or not self._new_keys:
+            return
+        keys = np.concatenate([self.keys, *self._new_keys])
+        vectors = np.concatenate([self.vectors, *self._new_vectors])
+        keys, first = np.unique(keys, return_index=True)
+        self.keys, self.vectors = keys, vectors[first]
+        self._new_keys, self._new_vectors = [], []
+        tmp = f"{self.path}.tmp.npz"
+        np.savez(tmp, keys=self.keys, vectors=self.vectors)
+        os.replace(tmp, self.path)
+
+
+def bulk_stream(es: Elasticsearch, actions: Iterable[dict], chunk_size: int, request_timeout: int,
+                threads: int = 1, queue_size: int = 4, raise_on_error: bool = True,
+                ignore_status: Tuple[int, ...] = ()) -> Iterable[tuple]:
+    """
+    Send actions through the bulk API, on one thread or several.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        actions (Iterable[dict]): The bulk actions to send.
+        chunk_size (int): Number of actions per bulk request.
+        request_timeout (int): ES request timeout in seconds.
+        threads (int): Number of concurrent bulk requests; above 1, parallel_bulk is used (no 429 retries).
+        queue_size (int): Number of chunks parallel_bulk buffers ahead of its threads.
+        raise_on_error (bool): Raise on the first rejected document instead of yielding it (default is True).
+        ignore_status (Tuple[int, ...]): Item statuses treated as success (e.g. 404 for deletes).
+
+    Returns:
+        Iterable[tuple]: The (ok, item) results of each action.
+    """
+    if threads > 1:
+        return helpers.parallel_bulk(
+            es.options(request_timeout=request_timeout), actions,
+            thread_count=threads, chunk_size=chunk_size, queue_size=queue_size, raise_on_error=raise_on_error,
+            ignore_status=ignore_status,
+        )
+    return helpers.streaming_bulk(
+        es, actions, chunk_size=chunk_size, max_retries=3, request_timeout=request_timeout,
+        raise_on_error=raise_on_error, ignore_status=ignore_status,
+    )
+
+
+def load_checkpoint(path: str) -> dict:
+    """Read the checkpoint journal, or return an empty dict if there is none."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, state: dict):
+    """Atomically replace the checkpoint journal with `state`."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def dead_letter(item: dict, actions_by_id: dict) -> dict:
+    """
+    Build the dead-letter record of a rejected bulk item.
+
+    Args:
+        item (dict): The failed item yielded by the bulk helpers.
+        actions_by_id (dict): The recently sent actions keyed by _id, used to recover the rejected action.
+
+    Returns:
+        dict: The action (None if it cannot be recovered, e.g. with --no-id), its status and the ES error.
+    """
+    op, info = next(iter(item.items()))
+    error = info.get("error")
+    if not isinstance(error, (str, dict)):
+        error = str(error)
+    return {"action": actions_by_id.get(info.get("_id")), "op": op, "_id": info.get("_id"),
+            "status": info.get("status"), "error": error}
+
+
+def remember_actions(actions: Iterable[dict], ring: "OrderedDict[str, dict]", size: int) -> Generator[dict, None, None]:
+    """
+    Pass actions through while keeping the last `size` of them in `ring`, keyed by _id.
+
+    The bulk helpers read a few chunks ahead of the results they yield, so a ring covering those
+    chunks still holds a rejected action when its result comes back, without materializing the
+    stream. An action already evicted is dead-lettered without its body, as with --no-id.
+
+    Args:
+        actions (Iterable[dict]): The bulk actions to send.
+        ring (OrderedDict[str, dict]): Filled with the most recent actions, oldest first.
+        size (int): The maximum number of actions kept.
+
+    Yields:
+        dict: The actions, unchanged.
+    """
+    for action in actions:
+        if "_id" in action:
+            ring[action["_id"]] = action
+            ring.move_to_end(action["_id"])
+            if len(ring) > size:
+                ring.popitem(last=False)
+        yield action
+
+
+def read_dead_letters(path: str) -> List[dict]:
+    """Read all dead-letter records from a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_dead_letters(path: str, records: List[dict], mode: str = "a"):
+    """Append (or with mode "w", write) dead-letter records to a JSONL file."""
+    with open(path, mode, encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+
+
+def send_actions(es: Elasticsearch, actions: Iterable[dict], args: argparse.Namespace,
+                 dead_letters: Optional[str] = None, failed_ids: Optional[list] = None,
+                 ignore_status: Tuple[int, ...] = ()) -> Tuple[int, int]:
+    """
+    Send one batch of actions and wait for every result.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        actions (Iterable[dict]): The bulk actions to send.
+        args (argparse.Namespace): The parsed CLI arguments (chunk size, threads, timeouts).
+        dead_letters (Optional[str]): If set, rejected actions are appended to this JSONL file
+            instead of aborting the load.
+        failed_ids (Optional[list]): If given, the _id of every rejected action is appended to it.
+        ignore_status (Tuple[int, ...]): Item statuses treated as success.
+
+    Returns:
+        tuple: The number of successful and failed actions.
+    """
+    # Keep only the actions the bulk helpers can still report on: the chunks in flight and queued
+    actions_by_id = OrderedDict()
+    if dead_letters:
+        size = args.chunk_size * (max(args.threads, 1) + args.queue_size + 2)
+        actions = remember_actions(actions, actions_by_id, size)
+
+    success, failed, rejected = 0, 0, []
+    for ok, item in bulk_stream(
+        es, actions,
+        chunk_size=args.chunk_size,
+        request_timeout=args.request_timeout,
+        threads=args.threads,
+        queue_size=args.queue_size,
+        raise_on_error=not dead_letters,
+        ignore_status=ignore_status,
+    ):
+        if ok:
+            success += 1
+        else:
+            failed += 1
+            if dead_letters:
+                rejected.append(dead_letter(item, actions_by_id))
+            if failed_ids is not None:
+                failed_ids.append(next(iter(item.values())).get("_id"))
+
+    if rejected:
+        write_dead_letters(dead_letters, rejected)
+    return success, failed
+
+
+def retry_dead_letters(es: Elasticsearch, args: argparse.Namespace) -> Tuple[int, int]:
+    """
+    Re-send the actions recorded in the dead-letter file; those rejected again are written back to it.
+
+    The previous file is kept as `<path>.retrying` until the retry completes.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        args (argparse.Namespace): The parsed CLI arguments.
+
+    Returns:
+        tuple: The number of successful and failed actions.
+    """
+    records = read_dead_letters(args.dead_letters)
+    retrying = f"{args.dead_letters}.retrying"
+    os.replace(args.dead_letters, retrying)
+
+    # Records without a recoverable action cannot be retried; keep them for inspection
+    write_dead_letters(args.dead_letters, [r for r in records if not r.get("action")], mode="w")
+    result = send_actions(es, [r["action"] for r in records if r.get("action")], args, dead_letters=args.dead_letters)
+    os.remove(retrying)
+    return result
+
+
+def source_bytes(df: pd.DataFrame) -> int:
+    """Return the total length of the source fields, used for throughput reporting."""
+    return int(sum(df[c].str.len().sum() for c in FIELDS))
+
+
 def main():
     """
     Main function to load data from a CSV file into Elasticsearch using bulk API.
@@ -96,59 +508,171 @@ def main():
     """
     # Argument parser setup
     p = argparse.ArgumentParser(description="Bulk load CSV into Elasticsearch.")
-    p.add_argument("--es", default="http://localhost:9200", help="Elasticsearch URL")
+    p.add_argument("--es", default=ES_URL, help="Elasticsearch URL, or several comma-separated node URLs")
     p.add_argument("--csv", default="data/data.csv", help="Path to CSV file")
     p.add_argument("--index", default="people-index", help="Target index name")
     p.add_argument("--pipeline", default="people_loc_split", help="Ingest pipeline (or '' to disable)")
     p.add_argument("--chunk-size", type=int, default=2000, help="Bulk chunk size")
     p.add_argument("--request-timeout", type=int, default=120, help="ES request timeout (seconds)")
     p.add_argument("--no-id", action="store_true", help="Do not set document _id (not idempotent)")
+    p.add_argument("--threads", type=int, default=1, help="Concurrent bulk requests (uses parallel_bulk when > 1)")
+    p.add_argument("--queue-size", type=int, default=4, help="Chunks buffered ahead of the bulk threads")
+    p.add_argument("--workers", type=int, default=1, help="Processes used to compute document IDs")
+    p.add_argument("--csv-chunk-rows", type=int, default=0,
+                   help="Stream the CSV in chunks of this many rows to bound memory (0 reads the whole file)")
+    p.add_argument("--checkpoint", default="", help="Checkpoint journal updated after each acknowledged CSV chunk")
+    p.add_argument("--resume", action="store_true", help="Skip the rows already acknowledged in --checkpoint")
+    p.add_argument("--dead-letters", default="",
+                   help="JSONL file receiving rejected actions with their ES errors, instead of aborting")
+    p.add_argument("--retry-dead-letters", action="store_true",
+                   help="Only re-send the actions recorded in --dead-letters")
+    p.add_argument("--manifest", default="",
+                   help="Delta mode: file of known document digests; rows already in it are not re-sent")
+    p.add_argument("--delete-missing", action="store_true",
+                   help="With --manifest, delete documents whose rows disappeared from the CSV")
+    p.add_argument("--bulk-profile", action="store_true",
+                   help="Disable refresh and replicas and use async translog during the load, restoring them afterwards")
+    p.add_argument("--force-merge", type=int, default=0, metavar="N",
+                   help="Force-merge the index to N segments after a successful load (0 disables)")
+    p.add_argument("--embed", action="store_true",
+                   help="Store a local-model embedding of each row in the dense_vector field (needs the 'vectors' extra)")
+    p.add_argument("--embed-cache", default="", help="With --embed, .npz cache of embeddings keyed by document ID")
     args = p.parse_args()
 
-    # Elasticsearch client setup
-    es = Elasticsearch(args.es, request_timeout=args.request_timeout)
+    if args.resume and not args.checkpoint:
+        p.error("--resume requires --checkpoint")
+    if args.retry_dead_letters and not args.dead_letters:
+        p.error("--retry-dead-letters requires --dead-letters")
+    if args.manifest and args.no_id:
+        p.error("--manifest requires document IDs (drop --no-id)")
+    if args.delete_missing and (not args.manifest or args.resume):
+        p.error("--delete-missing requires --manifest and a full (non --resume) run")
+    if args.embed and args.no_id:
+        p.error("--embed requires document IDs (drop --no-id)")
+
+    # Elasticsearch client setup; without document IDs a retried timeout could index a row twice
+    es = make_client(args.es, request_timeout=args.request_timeout, retry_on_timeout=not args.no_id)
+
+    # Retry mode only replays the dead-letter file
+    if args.retry_dead_letters:
+        try:
+            success, failed = retry_dead_letters(es, args)
+        except (ApiError, TransportError) as e:
+            print(f"Elasticsearch error: {e}", file=sys.stderr)
+            sys.exit(2)
+        except Exception as e:
+            print(f"Unexpected error during retry: {e}", file=sys.stderr)
+            sys.exit(3)
+        print(f"Retried dead letters. Success: {success}, Failed: {failed}")
+        return
+
+    # Pick up where the last run stopped, if asked to
+    state = {"csv": args.csv, "index": args.index, "rows_done": 0, "success": 0, "failed": 0, "done": False}
+    if args.resume:
+        previous = load_checkpoint(args.checkpoint)
+        if previous and (previous.get("csv"), previous.get("index")) != (args.csv, args.index):
+            print(f"Checkpoint {args.checkpoint} belongs to another CSV or index", file=sys.stderr)
+            sys.exit(1)
+        state.update(previous)
+        print(f"Resuming after {state['rows_done']} acknowledged rows")
 
-    # Read the CSV file into a DataFrame
+    # Open the CSV file, whole or as a chunked reader
     try:
-        df = pd.read_csv(args.csv)
+        chunks = read_csv_chunks(args.csv, args.csv_chunk_rows, skip_rows=state["rows_done"])
     except Exception as e:
         print(f"Failed to read CSV: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Ensure required columns are present
-    required = ["People", "Families", "Locations", "Events"]
-    ensure_columns(df, required)
-
-    # Normalize the DataFrame
-    df = normalize_df(df)
-
     # Set pipeline, if provided
     pipeline = args.pipeline if args.pipeline else None
 
+    # In delta mode, load the digests of documents already indexed
+    manifest = load_manifest(args.manifest) if args.manifest else None
+    seen, rejected_ids = [], []
+
+    # Embeddings of unchanged rows are reused from the cache
+    embed_cache = EmbeddingCache(args.embed_cache or None) if args.embed else None
+
     # Initialize counters for successful and failed operations
-    success, failed = 0, 0
+    success, failed, unchanged, deleted = 0, 0, 0, 0
+    stats = {"rows": 0, "bytes": 0}
+    started = time.perf_counter()
+
+    # Optionally switch the index to the bulk-load profile; settings are restored even on failure
+    profile = bulk_load_profile(es, args.index) if args.bulk_profile else nullcontext()
     try:
-        # Perform bulk insert using Elasticsearch's streaming_bulk helper
-        for ok, item in helpers.streaming_bulk(
-            es,
-            gen_actions(df, args.index, pipeline=pipeline, use_id=not args.no_id),
-            chunk_size=args.chunk_size,
-            max_retries=3,
-            request_timeout=args.request_timeout,
-        ):
-            if ok:
-                success += 1
-            else:
-                failed += 1
-    except TransportError as e:
-        print(f"Elasticsearch transport error: {e}", file=sys.stderr)
+        with profile:
+            # Validate, normalize and send each chunk as it is read; journal it once fully acknowledged
+            for df, ids in prepared_chunks(chunks, use_id=not args.no_id, workers=args.workers, stats=stats):
+                rows = len(df)
+                if manifest is not None:
+                    # Only rows whose digest is not in the manifest are new or changed
+                    digests = ids_to_digests(ids)
+                    seen.append(digests)
+                    new = ~contains(manifest, digests)
+                    unchanged += int(rows - new.sum())
+                    df, ids = df[new], [i for i, n in zip(ids, new) if n]
+                vectors = embed_cache.embed(df, ids) if embed_cache is not None else None
+                actions = gen_actions(df, args.index, pipeline=pipeline, use_id=not args.no_id, ids=ids, vectors=vectors)
+                ok_count, failed_count = send_actions(es, actions, args, dead_letters=args.dead_letters or None,
+                                                      failed_ids=rejected_ids if manifest is not None else None)
+                success += ok_count
+                failed += failed_count
+                if args.checkpoint:
+                    state["rows_done"] += rows
+                    state["success"] += ok_count
+                    state["failed"] += failed_count
+                    save_checkpoint(args.checkpoint, state)
+
+            if manifest is not None:
+                current = np.unique(np.concatenate(seen)) if seen else np.empty(0, dtype="S32")
+                if args.delete_missing:
+                    # Documents in the manifest whose rows are gone from the CSV
+                    gone = manifest[~contains(current, manifest)]
+                    deletes = ({"_op_type": "delete", "_index": args.index, "_id": i} for i in digests_to_ids(gone))
+                    deleted, _ = send_actions(es, deletes, args, ignore_status=(404,))
+                else:
+                    current = np.concatenate([manifest, current])
+                # Rejected documents stay out of the manifest so the next run sends them again
+                if rejected_ids:
+                    current = current[~contains(np.unique(ids_to_digests(rejected_ids)), current)]
+                save_manifest(args.manifest, current)
+    except (ApiError, TransportError) as e:
+        print(f"Elasticsearch error: {e}", file=sys.stderr)
         sys.exit(2)
     except Exception as e:
         print(f"Unexpected error during bulk: {e}", file=sys.stderr)
         sys.exit(3)
+    finally:
+        # Embeddings computed so far stay valid even if the load failed
+        if embed_cache is not None:
+            embed_cache.save()
+        # Even a partial load changed documents; invalidate the API's cached results.
+        # A 4xx/5xx response raises ApiError, which is not a TransportError in elasticsearch-py 8
+        if success or deleted:
+            try:
+                bump_generation(es, args.index)
+            except (ApiError, TransportError) as e:
+                print(f"Failed to bump the index generation: {e}", file=sys.stderr)
 
-    # Output the results
+    if args.checkpoint:
+        state["done"] = True
+        save_checkpoint(args.checkpoint, state)
+
+    # Output the results and throughput
+    elapsed = max(time.perf_counter() - started, 1e-9)
     print(f"Done. Success: {success}, Failed: {failed}")
+    if manifest is not None:
+        print(f"Delta: {unchanged} unchanged rows skipped, {deleted} documents deleted")
+    print(f"Throughput: {(success + failed) / elapsed:.0f} docs/s, "
+          f"{stats['bytes'] / elapsed / 1e6:.2f} MB/s of source data in {elapsed:.1f}s")
+
+    # Merge segments once the load is complete and refresh is back on
+    if args.force_merge > 0:
+        try:
+            force_merge(es, args.index, args.force_merge)
+        except (ApiError, TransportError) as e:
+            print(f"Force-merge failed: {e}", file=sys.stderr)
 
 
 if __name__ == "__main__":
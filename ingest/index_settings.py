@@ -0,0 +1,99 @@
+# ingest/index_settings.py
+
+import sys
+from contextlib import contextmanager
+from elasticsearch import Elasticsearch
+from typing import Dict, Optional
+
+# Settings applied for the duration of a bulk load: no periodic refresh, no replicas to keep
+# in sync, and fsync of the translog in the background instead of on every bulk request
+BULK_PROFILE = {
+    "index.refresh_interval": "-1",
+    "index.number_of_replicas": "0",
+    "index.translog.durability": "async",
+}
+
+
+def get_settings(es: Elasticsearch, index: str, names=tuple(BULK_PROFILE)) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Read the explicitly set values of some settings for every concrete index behind `index`.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        index (str): An index name or alias.
+        names (tuple): The flat setting names to read.
+
+    Returns:
+        dict: Concrete index name -> {setting: value, or None when the setting is left at its default}.
+    """
+    resp = es.indices.get_settings(index=index, name=list(names), flat_settings=True)
+    return {
+        concrete: {n: body.get("settings", {}).get(n) for n in names}
+        for concrete, body in resp.items()
+    }
+
+
+@contextmanager
+def bulk_load_profile(es: Elasticsearch, index: str):
+    """
+    Switch an index to BULK_PROFILE for the duration of a `with` block, then restore its settings.
+
+    The original values are restored even if the block raises (or calls sys.exit); settings that
+    were at their default are reset to it. The index is refreshed afterwards so the loaded
+    documents become searchable.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        index (str): The index (or alias) being loaded.
+    """
+    original = get_settings(es, index)
+    for concrete in original:
+        es.indices.put_settings(index=concrete, settings=BULK_PROFILE)
+    print(f"Applied bulk-load profile to {', '.join(original)}")
+    try:
+        yield
+    finally:
+        for concrete, values in original.items():
+            try:
+                es.indices.put_settings(index=concrete, settings=values)
+            except Exception as e:
+                print(f"Failed to restore settings of '{concrete}' ({values}): {e}", file=sys.stderr)
+        es.indices.refresh(index=index)
+        print(f"Restored settings of {', '.join(original)}")
+
+
+def force_merge(es: Elasticsearch, index: str, max_num_segments: int):
+    """
+    Force-merge an index down to at most `max_num_segments` segments per shard.
+
+    Fewer segments make subsequent searches cheaper. This call can take minutes on large
+    indices, so it runs without a request timeout.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        index (str): The index (or alias) to merge.
+        max_num_segments (int): The target number of segments per shard.
+    """
+    print(f"Force-merging '{index}' to {max_num_segments} segment(s)...")
+    es.options(request_timeout=None).indices.forcemerge(index=index, max_num_segments=max_num_segments)
+    print(f"Force-merge of '{index}' done.")
+
+
+def bump_generation(es: Elasticsearch, index: str):
+    """
+    Refresh an index and increment the `_meta.generation` counter of every concrete index behind it.
+
+    The API's result cache polls this counter and drops cached responses when it changes, so call
+    this after any run that adds, updates or deletes documents.
+
+    Args:
+        es (Elasticsearch): The Elasticsearch client.
+        index (str): The index (or alias) that was written to.
+    """
+    # Refresh first so no search after the bump can see (and cache) the pre-load state
+    es.indices.refresh(index=index)
+    for concrete, body in es.indices.get_mapping(index=index).items():
+        meta = dict((body.get("mappings") or {}).get("_meta", {}))
+        meta["generation"] = int(meta.get("generation", 0)) + 1
+        es.indices.put_mapping(index=concrete, meta=meta)
+        print(f"Index '{concrete}' is now at generation {meta['generation']}")
@@ -1,13 +1,30 @@
 # main.py
 
 import os
+import json
+import asyncio
+from contextlib import asynccontextmanager, aclosing
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict
-from app.llm import llm_to_dsl, summarize
+from fastapi.responses import PlainTextResponse, StreamingResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, AsyncIterator, List, Literal, Tuple
+from app.llm import allm_to_dsl, asummarize, astream_summary, aclient, dsl_flight, summary_flight
 from app.validators import validate_dsl
-from app.es import execute_search
-from app.telemetry import log_query
+from app.cost import guard_dsl
+from app.es import aexecute_search, ahybrid_search, amulti_search, aes, search_flight
+from app.pagination import apage, aexport, decode_cursor, EXPORT_PAGE_SIZE
+from app.telemetry import log_query, writer as telemetry_writer
+from app.cache import dsl_cache, result_cache, summary_cache, DSL_CACHE_ENABLED
+from app.planner import aplan, path_counts
+from app.metrics import span, start_trace, register_collector, render as render_metrics, RequestTimer
+from app.deadline import set_deadline, request_budget, remaining, expired, enforce, DeadlineExceeded
+
+# Search responses are serialized with orjson when it is installed (pip install '.[fast-json]')
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as SearchResponse
+except ImportError:
+    SearchResponse = JSONResponse
 
 
 class SearchRequest(BaseModel):
@@ -18,60 +35,629 @@ class SearchRequest(BaseModel):
         query (str): The natural language query to search.
         size (Optional[int]): The number of results to return (optional).
         summarize (bool): Whether to return a summary of the results (default is True).
+        mode (str): "lexical" runs the DSL only; "hybrid" fuses it with kNN on the query embedding (default is "lexical").
+        fields (Optional[List[str]]): Source fields to return per hit (wildcards allowed); all fields if omitted.
+        paginate (bool): Return the first page with a `next_cursor` for the following ones (lexical mode only).
+        cursor (Optional[str]): A `next_cursor` from an earlier response; the page after it is returned and
+                                `query` and `size` are ignored (the page is summarized for the query of
+                                the first page). Batch items asking for pagination get an error.
+        timeout (Optional[float]): Time budget of the request in seconds, > 0 (default REQUEST_TIMEOUT, at most
+                                   MAX_REQUEST_TIMEOUT). Ignored on batch items; see BatchSearchRequest.
     """
     query: str
     size: Optional[int] = 100
     summarize: bool = True
+    mode: Literal["lexical", "hybrid"] = "lexical"
+    fields: Optional[List[str]] = None
+    paginate: bool = False
+    cursor: Optional[str] = None
+    timeout: Optional[float] = Field(None, gt=0)
+
+
+class ExportRequest(BaseModel):
+    """
+    Pydantic model for validating export requests.
+
+    Args:
+        query (str): The natural language query whose matches are exported.
+        fields (Optional[List[str]]): Source fields to export per document; all fields if omitted.
+        page_size (Optional[int]): Documents fetched from Elasticsearch per round-trip (default EXPORT_PAGE_SIZE).
+    """
+    query: str
+    fields: Optional[List[str]] = None
+    page_size: Optional[int] = None
+
+
+class BatchSearchRequest(BaseModel):
+    """
+    Pydantic model for validating batch search requests.
+
+    Args:
+        items (List[SearchRequest]): The search requests to run together.
+        timeout (Optional[float]): Time budget of the whole batch in seconds, > 0 (default REQUEST_TIMEOUT, at
+                                   most MAX_REQUEST_TIMEOUT).
+    """
+    items: List[SearchRequest]
+    timeout: Optional[float] = Field(None, gt=0)
+
+
+# Batch endpoint limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "500"))
+
+# A summary is not started with less time than this left before the deadline
+SUMMARY_MIN_TIME = float(os.getenv("SUMMARY_MIN_TIME", "1.0"))
+
+# Share of a batch's time budget kept for its search, so one slow item cannot plan the others out of time
+BATCH_SEARCH_SHARE = 0.2
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the shared async LLM and Elasticsearch clients and flush telemetry on shutdown."""
+    yield
+    await aes.close()
+    await aclient.close()
+    await asyncio.to_thread(telemetry_writer.close)
 
 
 # Initialize FastAPI application
-app = FastAPI(title="NL → ES DSL Search")
+app = FastAPI(title="NL → ES DSL Search", lifespan=lifespan)
+
+
+# Time every request to its response headers
+app.add_middleware(RequestTimer)
+
 
+# Coalescing of identical in-flight work, per stage
+FLIGHTS = (dsl_flight, search_flight, summary_flight)
 
-@app.post("/search")
-def search(req: SearchRequest) -> Dict:
+
+def cache_metrics() -> List[str]:
+    """Render the cache, coalescing, planner-path and telemetry counters as Prometheus metrics at scrape time."""
+    lines = []
+    for stat, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        name = f"nl2es_cache_{stat}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} Cache {stat} per cache.", f"# TYPE {name} {kind}"]
+        for cache_name, cache in (("dsl", dsl_cache), ("results", result_cache), ("summaries", summary_cache)):
+            lines.append(f'{name}{{cache="{cache_name}"}} {cache.stats()[stat]}')
+    lines += ["# HELP nl2es_coalesced_total Calls served by an identical call already in flight, per stage.",
+              "# TYPE nl2es_coalesced_total counter"]
+    lines += [f'nl2es_coalesced_total{{stage="{flight.name}"}} {flight.followers}' for flight in FLIGHTS]
+    lines += ["# HELP nl2es_dsl_path_total Requests per DSL source.", "# TYPE nl2es_dsl_path_total counter"]
+    lines += [f'nl2es_dsl_path_total{{path="{path}"}} {count}' for path, count in sorted(path_counts.items())]
+    lines += ["# HELP nl2es_telemetry_records_total Telemetry records written or dropped on a full queue.",
+              "# TYPE nl2es_telemetry_records_total counter",
+              f'nl2es_telemetry_records_total{{outcome="written"}} {telemetry_writer.written}',
+              f'nl2es_telemetry_records_total{{outcome="dropped"}} {telemetry_writer.dropped}']
+    return lines
+
+
+register_collector(cache_metrics)
+
+
+async def plan_dsl(req: SearchRequest) -> Tuple[Dict[str, Any], str]:
     """
-    Search for documents in Elasticsearch based on a natural language query.
+    Turn a search request into a validated DSL query, avoiding the LLM when possible.
+
+    The rule-based planner is tried first, then the DSL cache, then the LLM. The validated DSL then
+    goes through the cost guard.
 
     Args:
         req (SearchRequest): The request payload containing the user's query and optional parameters.
 
     Returns:
-        dict: The search results, including the DSL query, Elasticsearch metadata, hits, and a summary (if requested).
+        tuple: The validated DSL query and the path that produced it ("planner", "cache" or "llm").
 
     Raises:
-        HTTPException: If an error occurs during the process, a 400 HTTPException is raised with the error message.
+        ValueError: If the generated DSL fails validation or is over the cost budget.
     """
-    try:
-        # Convert the user's natural language query to a DSL query
-        dsl = llm_to_dsl(req.query)
+    # Common query shapes are planned locally without the LLM
+    with span("planner"):
+        planned = await aplan(req.query)
+    dsl, path = (planned.dsl, "planner") if planned else (None, "llm")
+
+    # Reuse the DSL of an identical or near-identical earlier query when possible
+    if dsl is None and DSL_CACHE_ENABLED:
+        with span("dsl_cache"):
+            dsl = dsl_cache.get(req.query)
+        path = "cache" if dsl is not None else path
 
-        # Set the size of the search if provided in the request
-        if req.size is not None:
-            dsl["size"] = req.size
+    # Otherwise convert the user's natural language query to a DSL query
+    if dsl is None:
+        dsl = await allm_to_dsl(req.query)
 
-        # Validate the DSL query to ensure it's well-formed
+    # Set the size of the search if provided in the request
+    if req.size is not None:
+        dsl["size"] = req.size
+
+    # Validate the DSL query to ensure it's well-formed
+    with span("validate"):
         validate_dsl(dsl)
 
-        # Execute the search query on Elasticsearch
-        res = execute_search(dsl)
+    # Only cache LLM output that passed validation
+    if DSL_CACHE_ENABLED and path == "llm":
+        dsl_cache.put(req.query, dsl)
+
+    # Project hits onto the requested source fields; set after caching as it belongs to this request only
+    if req.fields:
+        dsl["_source"] = list(req.fields)
+
+    # Rewrite expensive constructs, degrading or rejecting queries over the cost budget
+    with span("cost"):
+        dsl = guard_dsl(dsl)
+
+    path_counts[path] += 1
+    return dsl, path
+
+
+async def resolve_dsl(req: SearchRequest) -> Tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]:
+    """
+    Plan the DSL of a search request, or take it from the request's cursor.
+
+    Args:
+        req (SearchRequest): The request payload.
+
+    Returns:
+        tuple: The DSL to execute, its path ("cursor" when resumed) and the decoded cursor (or None).
+
+    Raises:
+        ValueError: If the cursor is malformed, pagination is asked for in hybrid mode, or the DSL
+                    fails validation or the cost guard.
+    """
+    if (req.paginate or req.cursor) and req.mode != "lexical":
+        raise ValueError("Cursor pagination supports lexical mode only")
+    if not req.cursor:
+        dsl, path = await plan_dsl(req)
+        return dsl, path, None
+
+    # The cursor's DSL comes back from the client, so it is checked again like fresh LLM output
+    state = decode_cursor(req.cursor)
+    with span("validate"):
+        validate_dsl(state["dsl"])
+    with span("cost"):
+        dsl = guard_dsl(state["dsl"])
+    return dsl, "cursor", state
+
+
+def cursor_query(req: SearchRequest, state: Optional[Dict[str, Any]]) -> str:
+    """Return the natural language query of a page: the request's, or the first page's when resuming a cursor."""
+    return state["query"] if state is not None else req.query
+
+
+async def run_search(req: SearchRequest, dsl: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Execute a validated DSL in the retrieval mode the request asked for.
+
+    Args:
+        req (SearchRequest): The request payload.
+        dsl (dict): The validated DSL query.
+
+    Returns:
+        dict: The search result from Elasticsearch (RRF-fused in hybrid mode).
+    """
+    with span("es"):
+        if req.mode == "hybrid":
+            return await ahybrid_search(dsl, req.query)
+        return await aexecute_search(dsl)
+
+
+def shape_results(res: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract the metadata, hits and aggregations returned to clients from an Elasticsearch response.
+
+    Args:
+        res (dict): The search result from Elasticsearch.
+
+    Returns:
+        dict: The `es_meta`, `hits` and `aggs` parts of the API response.
+    """
+    # Extract the total number of hits and the time taken for the query
+    hits_total = res.get("hits", {}).get("total", {}).get("value") or res.get("hits", {}).get("total")
+    took = res.get("took")
+    shaped = {
+        "es_meta": {"took_ms": took, "hits_total": hits_total},
+        "hits": [h.get("_source",{}) for h in res.get("hits",{}).get("hits",[])],
+        "aggs": res.get("aggregations"),
+    }
+
+    # Shards that hit the search timeout returned only what they had found
+    if res.get("timed_out"):
+        shaped["partial"] = True
+    return shaped
+
+
+async def execute(req: SearchRequest, dsl: Dict[str, Any],
+                  state: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Run a planned search, as one point-in-time page when paginating, and shape its results.
+
+    Args:
+        req (SearchRequest): The request payload.
+        dsl (dict): The DSL returned by `resolve_dsl`.
+        state (Optional[dict]): The decoded cursor returned by `resolve_dsl`.
+
+    Returns:
+        tuple: The Elasticsearch response and the shaped results (with `next_cursor` when paginating).
+    """
+    if req.paginate or state is not None:
+        res, next_cursor = await apage(dsl, state, req.query)
+        return res, {**shape_results(res), "next_cursor": next_cursor}
+    res = await run_search(req, dsl)
+    return res, shape_results(res)
+
+
+async def bounded_summary(nl_query: str, res: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Summarize results within the time left before the request's deadline.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        res (dict): The search result from Elasticsearch.
+
+    Returns:
+        tuple: The summary, or None with the reason it was skipped or cut off.
+    """
+    left = remaining()
+    if left is not None and left < SUMMARY_MIN_TIME:
+        return None, "Deadline too close; summary skipped"
+    try:
+        async with enforce("summarization"):
+            return await asummarize(nl_query, res), None
+    except Exception as e:
+        # A summary that runs out of time is dropped; the hits are still returned
+        if isinstance(e, DeadlineExceeded) or expired():
+            return None, str(e) or "Deadline exceeded during summarization"
+        raise
+
+
+def failure_status(e: Exception) -> int:
+    """Map a failed request to its HTTP status: 504 when it ran out of time, 400 otherwise."""
+    return 504 if isinstance(e, DeadlineExceeded) or expired() else 400
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/search", response_class=SearchResponse)
+async def search(req: SearchRequest) -> SearchResponse:
+    """
+    Search for documents in Elasticsearch based on a natural language query.
+
+    Every stage runs within the request's deadline. If the summary does not fit in the time left,
+    the hits are returned without it, with `partial` set and the reason in `summary_error`.
+
+    Args:
+        req (SearchRequest): The request payload containing the user's query and optional parameters.
+
+    Returns:
+        SearchResponse: The search results, including the DSL query, Elasticsearch metadata, hits, and a summary
+                        (if requested). Paginated requests also get `next_cursor` (None after the last page).
+
+    Raises:
+        HTTPException: 504 if planning or the search runs out of time, 400 with the error message on any other error.
+    """
+    stages = start_trace()
+    set_deadline(request_budget(req.timeout))
+    nl_query = req.query
+    try:
+        # Convert the user's natural language query to a validated DSL query, or resume the cursor's
+        async with enforce("planning"):
+            with span("plan"):
+                dsl, path, state = await resolve_dsl(req)
+        nl_query = cursor_query(req, state)
+
+        # Execute the search query on Elasticsearch, one point-in-time page at a time when paginating
+        async with enforce("search"):
+            res, results = await execute(req, dsl, state)
 
-        # Extract the total number of hits and the time taken for the query
-        hits_total = res.get("hits", {}).get("total", {}).get("value") or res.get("hits", {}).get("total")
-        took = res.get("took")
+        # Summarize the results if requested and there is time left
+        summary = None
+        if req.summarize and nl_query:
+            with span("summarize"):
+                summary, skipped = await bounded_summary(nl_query, res)
+            if skipped:
+                results.update(partial=True, summary_error=skipped)
 
-        # Log the query details for telemetry
-        log_query(req.query, dsl, True, hits_total, took, None)
+        # Log the query details and stage timings for telemetry
+        log_query(nl_query, dsl, True, results["es_meta"]["hits_total"], results["es_meta"]["took_ms"], None,
+                  stages=stages)
 
-        # Return the search results, including DSL, metadata, hits, aggregations, and summary if requested
-        return {
-            "dsl": dsl,
-            "es_meta": {"took_ms": took, "hits_total": hits_total},
-            "hits": [h.get("_source",{}) for h in res.get("hits",{}).get("hits",[])],
-            "aggs": res.get("aggregations"),
-            "summary": summarize(req.query, res) if req.summarize else None
-        }
+        # Return the search results, including DSL, metadata, hits, aggregations, and summary if requested;
+        # the response is built directly so FastAPI does not re-validate and re-encode it
+        return SearchResponse({"dsl": dsl, "path": path, **results, "summary": summary})
     except Exception as e:
         # Log the error and raise an HTTP exception if something goes wrong
-        log_query(req.query, {}, False, None, None, str(e))
-        raise HTTPException(status_code=400, detail=str(e))
+        log_query(nl_query, {}, False, None, None, str(e), stages=stages)
+        raise HTTPException(status_code=failure_status(e), detail=str(e))
+
+
+async def stream_summary(nl_query: str, res: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Stream the summary of search results as `summary` events within the request's deadline.
+
+    The summary is not started with less than SUMMARY_MIN_TIME left, and stops at the first token
+    past the deadline (the LLM call itself times out at the deadline too); either way a `partial`
+    event with the reason follows.
+
+    Args:
+        nl_query (str): The natural language query from the user.
+        res (dict): The search result from Elasticsearch.
+
+    Yields:
+        str: Formatted Server-Sent Events.
+    """
+    left = remaining()
+    if left is not None and left < SUMMARY_MIN_TIME:
+        yield sse("partial", {"summary_error": "Deadline too close; summary skipped"})
+        return
+    error = None
+    with span("summarize"):
+        try:
+            async with aclosing(astream_summary(nl_query, res)) as tokens:
+                async for token in tokens:
+                    yield sse("summary", token)
+                    if expired():
+                        error = "Deadline exceeded during summarization"
+                        break
+        except Exception as e:
+            if not expired():
+                raise
+            error = str(e) or "Deadline exceeded during summarization"
+    if error:
+        yield sse("partial", {"summary_error": error})
+
+
+@app.post("/search/stream")
+async def search_stream(req: SearchRequest) -> StreamingResponse:
+    """
+    Search like `/search`, but stream each stage to the client as Server-Sent Events.
+
+    Events are emitted in order: `dsl` (the validated DSL and its path), `results` (es_meta, hits, aggs
+    and, when paginating, `next_cursor`), then one `summary` event per summary token if requested, and
+    finally `done`. A summary skipped or cut off by the deadline is followed by a `partial` event with
+    its `summary_error`. Any other failure ends the stream with an `error` event carrying the message
+    and the HTTP status the same failure gets from `/search`.
+
+    Args:
+        req (SearchRequest): The request payload containing the user's query and optional parameters.
+
+    Returns:
+        StreamingResponse: A `text/event-stream` response.
+    """
+    async def events() -> AsyncIterator[str]:
+        dsl = {}
+        stages = start_trace()
+        set_deadline(request_budget(req.timeout))
+        nl_query = req.query
+        try:
+            # Deadlines are enforced around each await, never across a yield to the client
+            async with enforce("planning"):
+                with span("plan"):
+                    dsl, path, state = await resolve_dsl(req)
+            nl_query = cursor_query(req, state)
+            yield sse("dsl", {"dsl": dsl, "path": path})
+
+            async with enforce("search"):
+                res, results = await execute(req, dsl, state)
+            yield sse("results", results)
+
+            if req.summarize and nl_query:
+                async for event in stream_summary(nl_query, res):
+                    yield event
+            log_query(nl_query, dsl, True, results["es_meta"]["hits_total"], results["es_meta"]["took_ms"], None,
+                      stages=stages)
+            yield sse("done", {})
+        except Exception as e:
+            log_query(nl_query, dsl, False, None, None, str(e), stages=stages)
+            yield sse("error", {"detail": str(e), "status": failure_status(e)})
+
+    # Disable proxy buffering so events reach the client as soon as they are produced
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/search/export")
+async def search_export(req: ExportRequest) -> StreamingResponse:
+    """
+    Stream the `_source` of every document matching a natural language query as NDJSON.
+
+    The DSL is planned like `/search` (without its size limit) and read page by page through a
+    point in time with `search_after`, so memory stays constant whatever the number of matches.
+    Planning gets REQUEST_TIMEOUT and each page EXPORT_PAGE_TIMEOUT. If Elasticsearch fails or a
+    page runs out of time mid-stream, the last line is `{"error": ...}`.
+
+    Args:
+        req (ExportRequest): The query and optional page size.
+
+    Returns:
+        StreamingResponse: An `application/x-ndjson` response, one document per line.
+
+    Raises:
+        HTTPException: 504 if planning runs out of time (REQUEST_TIMEOUT), 400 if the query cannot be planned.
+    """
+    stages = start_trace()
+    set_deadline(request_budget())
+    try:
+        async with enforce("planning"):
+            with span("plan"):
+                dsl, _ = await plan_dsl(SearchRequest(query=req.query, size=None, summarize=False, fields=req.fields))
+    except Exception as e:
+        log_query(req.query, {}, False, None, None, str(e), stages=stages)
+        raise HTTPException(status_code=failure_status(e), detail=str(e))
+
+    async def lines() -> AsyncIterator[str]:
+        count = 0
+        try:
+            async for doc in aexport(dsl, req.page_size or EXPORT_PAGE_SIZE):
+                count += 1
+                yield json.dumps(doc, ensure_ascii=False) + "\n"
+            log_query(req.query, dsl, True, count, None, None, stages=stages)
+        except Exception as e:
+            log_query(req.query, dsl, False, count, None, str(e), stages=stages)
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def batch_key(item: SearchRequest) -> Tuple[str, Optional[int], str, Optional[Tuple[str, ...]], bool]:
+    """Identify the batch items that plan, execute and summarize identically."""
+    fields = tuple(item.fields) if item.fields else None
+    return item.query, item.size, item.mode, fields, bool(item.paginate or item.cursor)
+
+
+@app.post("/search/batch", response_class=SearchResponse)
+async def search_batch(req: BatchSearchRequest) -> SearchResponse:
+    """
+    Run many searches at once: plan them concurrently, then execute them in one `_msearch` call.
+
+    Identical (query, size, mode, fields) items are planned, executed and summarized only once. Planning and
+    summarization run with at most BATCH_CONCURRENCY items in flight. A failing item gets an
+    `error` entry instead of failing the whole batch, as do items asking for cursor pagination, which
+    batches do not support. The whole batch shares one deadline: items
+    not planned or searched in time get an `error`, and summaries that do not fit are dropped
+    with `partial` set and the reason in `summary_error`.
+
+    Args:
+        req (BatchSearchRequest): The search requests to run.
+
+    Returns:
+        SearchResponse: `results`, one entry per item in request order, each shaped like a `/search` response or
+                        `{"error": ...}`.
+
+    Raises:
+        HTTPException: If the batch has more than MAX_BATCH_ITEMS items.
+    """
+    if len(req.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch too large: at most {MAX_BATCH_ITEMS} items.")
+    stages = start_trace()
+    search_reserve = request_budget(req.timeout) * BATCH_SEARCH_SHARE
+    set_deadline(request_budget(req.timeout))
+
+    # Deduplicate identical items; the first occurrence stands for the others
+    unique: Dict[tuple, SearchRequest] = {}
+    for item in req.items:
+        unique.setdefault(batch_key(item), item)
+    keys = list(unique)
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    # Each distinct item gets its own trace; the shared _msearch is timed on the batch's
+    traces: Dict[tuple, Dict[str, float]] = {k: {} for k in keys}
+
+    async def plan_one(key):
+        start_trace(traces[key])
+        if unique[key].paginate or unique[key].cursor:
+            return ValueError("Cursor pagination is not supported by /search/batch")
+        try:
+            async with enforce("planning", reserve=search_reserve):
+                async with sem:
+                    return await plan_dsl(unique[key])
+        except Exception as e:
+            return e
+
+    # Plan all distinct items concurrently
+    planned = dict(zip(keys, await asyncio.gather(*(plan_one(k) for k in keys))))
+
+    # Execute every successfully planned lexical DSL in one round-trip
+    ok_keys = [k for k in keys if not isinstance(planned[k], Exception)]
+    lexical_keys = [k for k in ok_keys if k[2] == "lexical"]
+    try:
+        async with enforce("search"):
+            with span("es"):
+                responses = await amulti_search([planned[k][0] for k in lexical_keys]) if lexical_keys else []
+    except Exception as e:
+        responses = [{"error": str(e)}] * len(lexical_keys)
+    executed = dict(zip(lexical_keys, responses))
+
+    # Hybrid items need their own kNN leg, so they run concurrently beside the _msearch
+    async def hybrid_one(key):
+        start_trace(traces[key])
+        try:
+            async with enforce("search"):
+                return await run_search(unique[key], planned[key][0])
+        except Exception as e:
+            return {"error": str(e)}
+
+    hybrid_keys = [k for k in ok_keys if k[2] == "hybrid"]
+    executed.update(zip(hybrid_keys, await asyncio.gather(*(hybrid_one(k) for k in hybrid_keys))))
+
+    # Summarize distinct successful items that asked for it
+    async def summarize_one(key):
+        start_trace(traces[key])
+        async with sem:
+            try:
+                summary, skipped = await bounded_summary(key[0], executed[key])
+            except Exception as e:
+                return e
+            return DeadlineExceeded(skipped) if skipped else summary
+
+    wants_summary = {batch_key(i) for i in req.items if i.summarize}
+    to_summarize = [k for k in ok_keys if k in wants_summary and "error" not in executed[k]]
+    summaries = dict(zip(to_summarize, await asyncio.gather(*(summarize_one(k) for k in to_summarize))))
+
+    # Assemble the results in request order
+    results = []
+    for item in req.items:
+        key = batch_key(item)
+        if isinstance(planned[key], Exception):
+            log_query(item.query, {}, False, None, None, str(planned[key]), stages=traces[key])
+            results.append({"error": str(planned[key])})
+            continue
+        dsl, path = planned[key]
+        res = executed[key]
+        item_stages = {**stages, **traces[key]}
+        if "error" in res:
+            error = res["error"] if isinstance(res["error"], str) else json.dumps(res["error"])
+            log_query(item.query, dsl, False, None, None, error, stages=item_stages)
+            results.append({"dsl": dsl, "path": path, "error": error})
+            continue
+        shaped = shape_results(res)
+        log_query(item.query, dsl, True, shaped["es_meta"]["hits_total"], shaped["es_meta"]["took_ms"], None,
+                  stages=item_stages)
+        summary = summaries.get(key) if item.summarize else None
+        if isinstance(summary, Exception):
+            shaped["summary_error"] = str(summary)
+            if isinstance(summary, DeadlineExceeded):
+                shaped["partial"] = True
+            summary = None
+        results.append({"dsl": dsl, "path": path, **shaped, "summary": summary})
+    return SearchResponse({"results": results})
+
+
+@app.get("/cache/stats")
+def cache_stats() -> Dict:
+    """
+    Report the hit/miss counters of the NL → DSL cache, the search result cache and the summary cache.
+
+    Returns:
+        dict: Per cache, its size and hit, miss and eviction counters (plus approximate hits for
+              the DSL cache, and cached bytes and generation invalidations for the result cache),
+              and under `coalescing` the leader/follower counters of each stage's in-flight work.
+    """
+    return {"dsl": dsl_cache.stats(), "results": result_cache.stats(), "summaries": summary_cache.stats(),
+            "coalescing": {flight.name: flight.stats() for flight in FLIGHTS}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """
+    Expose stage latencies, request latencies, LLM token counts and cache counters for Prometheus.
+
+    Returns:
+        PlainTextResponse: The metrics in Prometheus text exposition format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/planner/stats")
+def planner_stats() -> Dict:
+    """
+    Report how many requests were served by each DSL path.
+
+    Returns:
+        dict: Request counts for the "planner", "cache" and "llm" paths.
+    """
+    return {"paths": dict(path_counts)}
@@ -0,0 +1,88 @@
+"""
+Benchmark app.validators.validate_dsl against the previous implementation on large generated DSLs.
+
+The previous validator rebuilt a jsonschema validator on every call and scanned str(dsl) for
+forbidden words. Both are timed on the same DSLs; the new one must also accept all of them.
+
+Run from the repository root: python -m scripts.bench_validators
+"""
+
+import argparse
+import timeit
+from jsonschema import validate, ValidationError
+from app.schema import DSL_SCHEMA
+from app.validators import ALLOWED_INDEXES, ES_INDEX, validate_dsl
+
+
+def legacy_validate_dsl(dsl):
+    """The validator as it was before the precompiled schema and structural walk."""
+    if dsl.get("index") not in ALLOWED_INDEXES:
+        raise ValueError("Index not allowed.")
+    try:
+        validate(instance=dsl, schema=DSL_SCHEMA)
+    except ValidationError as e:
+        raise ValueError(f"DSL schema invalid: {e.message}")
+    txt = str(dsl).lower()
+    for bad in ["update_by_query", "delete", "script", "reindex"]:
+        if bad in txt:
+            raise ValueError(f"Disallowed operation: {bad}")
+    return True
+
+
+def wide_bool(clauses):
+    """A bool query with `clauses` should/filter clauses, like a long OR of locations."""
+    should = [{"match": {"Locations": f"City {i}, Country {i % 50}"}} for i in range(clauses)]
+    return {
+        "index": ES_INDEX, "size": 100,
+        "query": {"bool": {
+            "should": should, "minimum_should_match": 1,
+            "filter": [{"terms": {"Families.keyword": [f"Team {i}" for i in range(min(clauses, 1000))]}}],
+        }},
+    }
+
+
+def deep_aggs(width):
+    """A three-level terms aggregation tree with `width` sibling aggregations at the top."""
+    leaf = {"people": {"cardinality": {"field": "People.keyword"}}}
+    mid = {"by_city": {"terms": {"field": "City.keyword", "size": 50}, "aggs": leaf}}
+    return {
+        "index": ES_INDEX, "size": 0, "query": {"match_all": {}},
+        "aggs": {f"by_team_{i}": {"terms": {"field": "Families.keyword", "size": 100}, "aggs": mid}
+                 for i in range(width)},
+    }
+
+
+def main():
+    """Main execution function."""
+    p = argparse.ArgumentParser(description="Benchmark the DSL validators.")
+    p.add_argument("--number", type=int, default=200, help="Validations per DSL and implementation")
+    args = p.parse_args()
+
+    cases = {
+        "few-shot": {"index": ES_INDEX, "size": 0, "query": {"match_all": {}},
+                     "aggs": {"by_team": {"terms": {"field": "Families.keyword", "size": 50}}}},
+        "bool x 50": wide_bool(50),
+        "bool x 250": wide_bool(250),
+        "aggs x 6": deep_aggs(6),
+    }
+    print(f"{'DSL':<12} {'bytes':>8} {'legacy us':>10} {'new us':>10} {'speedup':>8}")
+    for name, dsl in cases.items():
+        validate_dsl(dsl)
+        legacy_validate_dsl(dsl)
+        legacy = timeit.timeit(lambda: legacy_validate_dsl(dsl), number=args.number) / args.number * 1e6
+        new = timeit.timeit(lambda: validate_dsl(dsl), number=args.number) / args.number * 1e6
+        print(f"{name:<12} {len(str(dsl)):>8} {legacy:>10.1f} {new:>10.1f} {legacy / new:>7.1f}x")
+
+    # The old substring scan rejected legitimate values that contain a forbidden word
+    false_positive = {"index": ES_INDEX, "query": {"match": {"Events": "How to delete customer data (GDPR)"}}, "size": 10}
+    try:
+        legacy_validate_dsl(false_positive)
+        legacy_ok = True
+    except ValueError:
+        legacy_ok = False
+    print(f"\nValue containing 'delete': legacy {'accepts' if legacy_ok else 'rejects'}, "
+          f"new {'accepts' if validate_dsl(false_positive) else 'rejects'}")
+
+
+if __name__ == "__main__":
+    main()
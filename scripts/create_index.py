@@ -1,17 +1,19 @@
 """
 Script to create or recreate an Elasticsearch index with a predefined mapping.
+
+Run from the repository root: python -m scripts.create_index
 """
 
 import json
 import os
-from elasticsearch import Elasticsearch, exceptions
+from elasticsearch import exceptions
 from dotenv import load_dotenv
+from app.es_client import ES_URL, make_client
 
 # Load environment variables from .env
 load_dotenv()
 
 # Configuration
-ES_HOST = os.getenv("ES_URL", "http://localhost:9200")
 INDEX_NAME = os.getenv("ES_INDEX", "people-index")
 
 # Define the mapping for the index
@@ -29,7 +31,7 @@ MAPPING = {
 
 def connect_elasticsearch():
     """Create an Elasticsearch client."""
-    return Elasticsearch(ES_HOST)
+    return make_client(ES_URL)
 
 
 def delete_index_if_exists(es, index_name):
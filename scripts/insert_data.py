@@ -1,19 +1,26 @@
 """
 Bulk insert structured CSV data into an existing Elasticsearch index.
+
+Run from the repository root: python -m scripts.insert_data
 """
 
 import os
 import pandas as pd
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import helpers
+from elasticsearch.exceptions import ApiError, TransportError
 from dotenv import load_dotenv
+from app.es_client import ES_URL, make_client
+from ingest.bulk_load import prepared_chunks, gen_actions
+from ingest.index_settings import bump_generation
 
 # Load environment variables from .env
 load_dotenv()
 
 # Configuration
-ES_HOST = os.getenv("ES_URL", "http://localhost:9200")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 INDEX_NAME = os.getenv("ES_INDEX", "people-index")
-CSV_PATH = os.getenv("CSV_PATH", "../data/data.csv")
+CSV_PATH = os.getenv("CSV_PATH", os.path.join(ROOT, "data", "data.csv"))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "0"))
 
 
 def load_csv(csv_path):
@@ -24,9 +31,20 @@ def load_csv(csv_path):
     return df
 
 
+def iter_csv(csv_path, chunk_rows=CSV_CHUNK_ROWS):
+    """Yield the CSV as DataFrames of at most chunk_rows rows (the whole file if chunk_rows is 0)."""
+    if chunk_rows <= 0:
+        yield load_csv(csv_path)
+        return
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV file not found at: {csv_path}")
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        yield chunk.fillna("")
+
+
 def connect_elasticsearch():
     """Return an Elasticsearch client."""
-    return Elasticsearch(ES_HOST)
+    return make_client(ES_URL)
 
 
 def index_exists(es, index_name):
@@ -35,40 +53,42 @@ def index_exists(es, index_name):
 
 
 # Convert rows to ES bulk format
-def generate_actions(df):
-    """Yield Elasticsearch bulk insert actions from a DataFrame."""
-    for _, row in df.iterrows():
-        yield {
-            "_index": INDEX_NAME,
-            "_source": {
-                "People": row["People"],
-                "Families": row["Families"],
-                "Locations": row["Locations"],
-                "Events": row["Events"]
-            }
-        }
+def generate_actions(chunks):
+    """
+    Yield Elasticsearch bulk insert actions from one DataFrame or an iterable of chunks.
+
+    Each chunk is validated and normalized like in ingest.bulk_load before its actions are built.
+    """
+    chunks = [chunks] if isinstance(chunks, pd.DataFrame) else chunks
+    for df, _ in prepared_chunks(chunks, use_id=False):
+        yield from gen_actions(df, INDEX_NAME, use_id=False)
 
 
 # Bulk upload
-def bulk_insert(es, df):
-    """Perform bulk insert into Elasticsearch."""
+def bulk_insert(es, chunks):
+    """Perform bulk insert into Elasticsearch from one DataFrame or an iterable of chunks."""
     try:
-        response = helpers.bulk(es, generate_actions(df))
+        response = helpers.bulk(es, generate_actions(chunks))
         print(f"Inserted {response[0]} documents into '{INDEX_NAME}'")
     except Exception as e:
         print(f"Bulk insert failed: {str(e)}")
 
+    # Even a failed insert may have written some chunks; invalidate the API's cached responses
+    try:
+        bump_generation(es, INDEX_NAME)
+    except (ApiError, TransportError) as e:
+        print(f"Failed to bump the index generation: {e}")
+
 
 def main():
     """Main execution function."""
     print("Starting CSV to Elasticsearch import...")
-    df = load_csv(CSV_PATH)
     es = connect_elasticsearch()
 
     if not index_exists(es, INDEX_NAME):
         raise ValueError(f"Index '{INDEX_NAME}' does not exist. Please create it first.")
 
-    bulk_insert(es, df)
+    bulk_insert(es, iter_csv(CSV_PATH))
 
 
 if __name__ == "__main__":
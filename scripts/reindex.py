@@ -0,0 +1,189 @@
+"""
+Zero-downtime reindex: build a new versioned index behind the read alias and swap the alias atomically.
+
+Steps:
+    1. Create `<alias>-vN` (N = highest existing version + 1) from es/mapping_v2.json.
+    2. Install the ingest pipeline and bulk load the CSV into the new index.
+    3. Warm the new index by replaying recent queries from the telemetry log.
+    4. Atomically point the alias (ES_INDEX, which the API and validators use) at the new index.
+    5. Delete versions older than the newest --keep ones.
+
+Run from the repository root: python -m scripts.reindex
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from elasticsearch import helpers
+from dotenv import load_dotenv
+from ingest.bulk_load import read_csv_chunks, chunk_actions, EmbeddingCache
+from app.embeddings import EMBED_FIELD, vector_mapping
+from app.telemetry import replay
+from ingest.index_settings import bulk_load_profile, force_merge
+from app.es_client import ES_URL, make_client
+
+# Load environment variables from .env
+load_dotenv()
+
+# Configuration
+ALIAS = os.getenv("ES_INDEX", "people-index")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def versioned_indices(es, alias):
+    """Return {version: index name} for the existing `<alias>-vN` indices."""
+    pattern = re.compile(rf"^{re.escape(alias)}-v(\d+)$")
+    names = es.indices.get(index=f"{alias}-v*", allow_no_indices=True, expand_wildcards="open,closed")
+    return {int(m.group(1)): name for name in names for m in [pattern.match(name)] if m}
+
+
+def create_versioned_index(es, alias, mapping_path, vectors=False, int8=False):
+    """Create the next `<alias>-vN` index from the mapping file (plus the dense_vector field if asked) and return its name."""
+    versions = versioned_indices(es, alias)
+    name = f"{alias}-v{max(versions, default=0) + 1}"
+    with open(mapping_path, "r", encoding="utf-8") as f:
+        mapping = json.load(f)
+    if vectors:
+        mapping.setdefault("mappings", {}).setdefault("properties", {})[EMBED_FIELD] = vector_mapping(quantize=int8)
+    print(f"Creating index '{name}' from {mapping_path}...")
+    es.indices.create(index=name, settings=mapping.get("settings"), mappings=mapping.get("mappings"))
+    return name
+
+
+def put_pipeline(es, name, pipeline_path):
+    """Install (or update) the ingest pipeline used during the load."""
+    with open(pipeline_path, "r", encoding="utf-8") as f:
+        es.ingest.put_pipeline(id=name, **json.load(f))
+    print(f"Pipeline '{name}' installed from {pipeline_path}.")
+
+
+def load_csv(es, index, csv_path, pipeline, chunk_rows, chunk_size, embed_cache=None):
+    """Bulk load the CSV into the new index under the bulk-load profile; return (success, failed)."""
+    success, failed = 0, 0
+    with bulk_load_profile(es, index):
+        try:
+            actions = chunk_actions(read_csv_chunks(csv_path, chunk_rows), index, pipeline=pipeline,
+                                    embed_cache=embed_cache)
+            for ok, _ in helpers.streaming_bulk(es, actions, chunk_size=chunk_size, max_retries=3, raise_on_error=False):
+                if ok:
+                    success += 1
+                else:
+                    failed += 1
+        finally:
+            if embed_cache is not None:
+                embed_cache.save()
+    return success, failed
+
+
+def recent_dsls(log_path, limit):
+    """Read the most recent distinct successful DSLs from a telemetry log (see app.telemetry.replay)."""
+    seen, dsls = set(), []
+    for record in reversed(list(replay(log_path))):
+        dsl = record.get("dsl")
+        if not record.get("ok") or not dsl:
+            continue
+        key = json.dumps(dsl, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            dsls.append(dsl)
+        if len(dsls) >= limit:
+            break
+    return dsls
+
+
+def warm(es, index, dsls):
+    """Replay DSLs against the new index so its caches are hot before it takes traffic."""
+    ok = 0
+    for dsl in dsls:
+        body = {k: v for k, v in dsl.items() if k in {"query", "aggs", "size", "sort"}}
+        try:
+            es.search(index=index, body=body, request_cache=body.get("size") == 0)
+            ok += 1
+        except Exception as e:
+            print(f"Warm-up query failed: {e}", file=sys.stderr)
+    print(f"Warmed '{index}' with {ok}/{len(dsls)} recent queries.")
+
+
+def swap_alias(es, alias, new_index, drop_legacy_index=False):
+    """
+    Atomically move the alias to `new_index`.
+
+    If a concrete index named like the alias exists (as created by create_index.py), it is removed
+    in the same atomic request, but only when `drop_legacy_index` is set.
+    """
+    actions = []
+    if es.indices.exists(index=alias) and not es.indices.exists_alias(name=alias):
+        if not drop_legacy_index:
+            raise ValueError(f"'{alias}' is a concrete index; pass --drop-legacy-index to replace it with the alias")
+        actions.append({"remove_index": {"index": alias}})
+    elif es.indices.exists_alias(name=alias):
+        for current in es.indices.get_alias(name=alias):
+            actions.append({"remove": {"index": current, "alias": alias}})
+    actions.append({"add": {"index": new_index, "alias": alias}})
+    es.indices.update_aliases(actions=actions)
+    print(f"Alias '{alias}' now points to '{new_index}'.")
+
+
+def delete_old_versions(es, alias, keep):
+    """Delete all but the newest `keep` versioned indices that the alias no longer points to."""
+    live = set(es.indices.get_alias(name=alias)) if es.indices.exists_alias(name=alias) else set()
+    versions = versioned_indices(es, alias)
+    for version in sorted(versions)[:-keep] if keep > 0 else sorted(versions):
+        name = versions[version]
+        if name not in live:
+            es.indices.delete(index=name)
+            print(f"Deleted old index '{name}'.")
+
+
+def main():
+    """Main execution function."""
+    p = argparse.ArgumentParser(description="Blue/green reindex behind a read alias.")
+    p.add_argument("--es", default=ES_URL, help="Elasticsearch URL, or several comma-separated node URLs")
+    p.add_argument("--alias", default=ALIAS, help="Read alias used by the API (ES_INDEX)")
+    p.add_argument("--csv", default=os.path.join(ROOT, "data", "data.csv"), help="Path to CSV file")
+    p.add_argument("--mapping", default=os.path.join(ROOT, "es", "mapping_v2.json"), help="Index mapping file")
+    p.add_argument("--pipeline", default="people_loc_split", help="Ingest pipeline name (or '' to disable)")
+    p.add_argument("--pipeline-file", default=os.path.join(ROOT, "es", "pipeline_loc_split_v2.json"),
+                   help="Ingest pipeline definition")
+    p.add_argument("--csv-chunk-rows", type=int, default=100000, help="CSV rows read per chunk")
+    p.add_argument("--chunk-size", type=int, default=2000, help="Bulk chunk size")
+    p.add_argument("--warm-log", default=os.getenv("TELEMETRY_LOG", ""), help="Telemetry log to replay for warm-up")
+    p.add_argument("--warm-limit", type=int, default=200, help="Maximum number of distinct queries to replay")
+    p.add_argument("--force-merge", type=int, default=1, metavar="N", help="Segments to merge to before the swap (0 disables)")
+    p.add_argument("--vectors", action="store_true",
+                   help="Add the dense_vector field and embed every document for hybrid search (needs the 'vectors' extra)")
+    p.add_argument("--int8", action="store_true", help="With --vectors, quantize the HNSW vectors to int8")
+    p.add_argument("--embed-cache", default="", help="With --vectors, .npz cache of embeddings keyed by document ID")
+    p.add_argument("--keep", type=int, default=2, help="Versioned indices to keep, including the new one")
+    p.add_argument("--drop-legacy-index", action="store_true",
+                   help="Delete a concrete index named like the alias as part of the atomic swap")
+    args = p.parse_args()
+
+    es = make_client(args.es, request_timeout=120)
+    new_index = create_versioned_index(es, args.alias, args.mapping, args.vectors, args.int8)
+    try:
+        pipeline = args.pipeline or None
+        if pipeline:
+            put_pipeline(es, pipeline, args.pipeline_file)
+        embed_cache = EmbeddingCache(args.embed_cache or None) if args.vectors else None
+        success, failed = load_csv(es, new_index, args.csv, pipeline, args.csv_chunk_rows, args.chunk_size, embed_cache)
+        print(f"Loaded '{new_index}'. Success: {success}, Failed: {failed}")
+        if failed:
+            raise ValueError(f"{failed} document(s) failed to index")
+        if args.force_merge > 0:
+            force_merge(es, new_index, args.force_merge)
+        warm(es, new_index, recent_dsls(args.warm_log, args.warm_limit))
+        swap_alias(es, args.alias, new_index, args.drop_legacy_index)
+    except Exception as e:
+        # The alias was not moved, so the API keeps serving the previous index
+        print(f"Reindex failed, '{args.alias}' unchanged; deleting '{new_index}': {e}", file=sys.stderr)
+        es.indices.delete(index=new_index)
+        sys.exit(1)
+
+    delete_old_versions(es, args.alias, args.keep)
+
+
+if __name__ == "__main__":
+    main()
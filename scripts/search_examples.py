@@ -1,20 +1,21 @@
 """
 Script to perform common Elasticsearch queries and aggregations on an Index.
+
+Run from the repository root: python -m scripts.search_examples
 """
 
 import os
-from elasticsearch import Elasticsearch
 from dotenv import load_dotenv
+from app.es_client import ES_URL, make_client
 
 # Load environment variables from .env
 load_dotenv()
 
 # Configuration
-ES_HOST = os.getenv("ES_URL", "http://localhost:9200")
 INDEX_NAME = os.getenv("ES_INDEX", "people-index")
 
 # Create an Elasticsearch client.
-es = Elasticsearch(ES_HOST)
+es = make_client(ES_URL)
 
 
 def search_by_event(term):
@@ -0,0 +1,14 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# The app modules read their configuration at import time; give them harmless local values
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://localhost:1")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-06-01")
+os.environ.setdefault("ES_URL", "http://localhost:1")
+os.environ.setdefault("ES_INDEX", "people-index")
+os.environ.setdefault("SYS_PROMPT", os.path.join(ROOT, "prompts", "sys_prompt_v2.txt"))
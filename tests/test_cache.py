@@ -0,0 +1,55 @@
+# tests/test_cache.py
+
+import pytest
+from app.cache import SemanticDSLCache, normalize_query, negations, shingles, STOPWORDS, NEGATIONS
+
+CS_DSL = {"index": "people-index", "query": {"bool": {"must": [
+    {"match": {"Families": "Customer Success"}},
+    {"match": {"Events": "cross-cultural communication workshop"}},
+]}}}
+
+
+@pytest.fixture
+def cache():
+    c = SemanticDSLCache(max_entries=16, ttl=0, similarity=0.7)
+    c.put("people in Customer Success who joined the cross-cultural communication workshop", CS_DSL)
+    return c
+
+
+def test_normalize_query():
+    assert normalize_query("  People in Tokyo, JAPAN?! ") == "people in tokyo japan"
+    assert normalize_query("Who didn't join?") == "who didn t join"
+
+
+def test_negations():
+    assert negations(normalize_query("people not in Sales who never joined")) == ["never", "not"]
+    assert negations(normalize_query("who didn't join")) == ["not"]
+    assert negations(normalize_query("people in Sales")) == []
+    assert not STOPWORDS & NEGATIONS
+    assert "not" in " ".join(sorted(shingles("people not in sales")))
+
+
+def test_exact_hit_returns_private_copy(cache):
+    dsl = cache.get("People in Customer Success who joined the cross-cultural communication workshop!")
+    assert dsl == CS_DSL
+    dsl["size"] = 1
+    assert "size" not in cache.get("people in customer success who joined the cross cultural communication workshop")
+
+
+def test_approximate_hit(cache):
+    assert cache.get("list people in Customer Success who joined the cross-cultural communication workshops") == CS_DSL
+    assert cache.approx_hits == 1
+
+
+@pytest.mark.parametrize("query", [
+    "people not in Customer Success who joined the cross-cultural communication workshop",
+    "people in Customer Success who never joined the cross-cultural communication workshop",
+    "people in Customer Success who didn't join the cross-cultural communication workshop",
+])
+def test_negated_query_never_hits_approximately(cache, query):
+    assert cache.get(query) is None
+
+
+def test_numbers_must_match(cache):
+    cache.put("top 5 teams for cybersecurity training", {"size": 0})
+    assert cache.get("top 10 teams for cybersecurity training") is None
@@ -0,0 +1,58 @@
+# tests/test_cost.py
+
+import pytest
+from app.cost import rewrite, guard_dsl, estimate_cost, TERMS_SIZE_CAP, TRACK_TOTAL_HITS_LIMIT
+
+
+def dsl(query, **extra):
+    return {"index": "people-index", "query": query, **extra}
+
+
+def test_match_on_text_field_is_kept():
+    # An OR match on the ngram field must not become an exact keyword term
+    query = {"match": {"Locations": "Tokyo, Japan"}}
+    out, rewrites = rewrite(dsl(query))
+    assert out["query"] == query
+    assert rewrites == []
+
+
+def test_and_match_on_text_field_is_kept():
+    query = {"match": {"City": {"query": "Tokyo", "operator": "and"}}}
+    assert rewrite(dsl(query))[0]["query"] == query
+
+
+def test_match_on_keyword_field_becomes_term():
+    out, _ = rewrite(dsl({"match": {"City.keyword": {"query": "Tokyo", "operator": "and"}}}))
+    assert out["query"] == {"term": {"City.keyword": "Tokyo"}}
+
+
+def test_non_scoring_clauses_move_to_filter():
+    out, _ = rewrite(dsl({"bool": {"must": [{"match": {"Events": "summit"}}, {"term": {"City.keyword": "Tokyo"}}]}}))
+    assert out["query"] == {"bool": {"must": [{"match": {"Events": "summit"}}],
+                                     "filter": [{"term": {"City.keyword": "Tokyo"}}]}}
+
+
+def test_size_zero_runs_in_filter_context_and_caps_apply():
+    original = dsl({"match": {"Events": "summit"}}, size=0, track_total_hits=True,
+                   aggs={"t": {"terms": {"field": "City.keyword", "size": 5000}}})
+    out, _ = rewrite(original)
+    assert out["query"] == {"bool": {"filter": [{"match": {"Events": "summit"}}]}}
+    assert out["aggs"]["t"]["terms"]["size"] == TERMS_SIZE_CAP
+    assert out["track_total_hits"] == TRACK_TOTAL_HITS_LIMIT
+    assert original["aggs"]["t"]["terms"]["size"] == 5000
+
+
+def test_leading_wildcards_are_expensive():
+    assert estimate_cost(dsl({"wildcard": {"People.keyword": "*son"}})) > \
+        estimate_cost(dsl({"wildcard": {"People.keyword": "son*"}}))
+    assert estimate_cost(dsl({"query_string": {"query": "*son"}})) > \
+        estimate_cost(dsl({"query_string": {"query": "Events:summit"}}))
+
+
+def test_guard_degrades_then_rejects():
+    nested = {"a": {"terms": {"field": "City.keyword", "size": 100},
+                    "aggs": {"b": {"terms": {"field": "Families.keyword", "size": 100}}}}}
+    out = guard_dsl(dsl({"match_all": {}}, size=0, aggs=nested), budget=20)
+    assert estimate_cost(out) <= 20
+    with pytest.raises(ValueError, match="too expensive"):
+        guard_dsl(dsl({"wildcard": {"People.keyword": "*x"}}), budget=20)
@@ -0,0 +1,55 @@
+# tests/test_deadline.py
+
+import asyncio
+import pytest
+from app import deadline
+from app.deadline import DeadlineExceeded, enforce, expired, request_budget, set_deadline
+
+
+def test_request_budget_defaults_and_caps(monkeypatch):
+    monkeypatch.setattr(deadline, "REQUEST_TIMEOUT", 30.0)
+    monkeypatch.setattr(deadline, "MAX_REQUEST_TIMEOUT", 120.0)
+    assert request_budget() == 30.0
+    assert request_budget(5) == 5
+    assert request_budget(600) == 120.0
+
+
+def test_enforce_raises_deadline_exceeded_when_the_deadline_passes():
+    async def run():
+        set_deadline(0.05)
+        async with enforce("search"):
+            await asyncio.sleep(1)
+
+    with pytest.raises(DeadlineExceeded, match="during search"):
+        asyncio.run(run())
+
+
+def test_enforce_fails_fast_inside_the_reserve():
+    async def run():
+        set_deadline(1)
+        async with enforce("planning", reserve=2):
+            pass
+
+    with pytest.raises(DeadlineExceeded, match="before planning"):
+        asyncio.run(run())
+
+
+def test_enforce_passes_other_timeouts_through():
+    async def run():
+        set_deadline(10)
+        async with enforce("search"):
+            raise TimeoutError("connection timed out")
+
+    with pytest.raises(TimeoutError, match="connection timed out") as info:
+        asyncio.run(run())
+    assert not isinstance(info.value, DeadlineExceeded)
+
+
+def test_enforce_without_a_deadline_never_cancels():
+    async def run():
+        set_deadline(None)
+        async with enforce("search"):
+            await asyncio.sleep(0.01)
+        return expired()
+
+    assert asyncio.run(run()) is False
@@ -0,0 +1,43 @@
+# tests/test_es.py
+
+from app import es
+from app.es import build_search, knn_filter, with_search_timeout, MAX_SIZE, EMBED_FIELD
+from app.deadline import set_deadline
+
+
+def test_build_search_keeps_known_keys_and_caps_size():
+    index, body = build_search({"index": "people-index", "query": {"match_all": {}}, "size": 10 ** 6,
+                                "script": {"source": "x"}})
+    assert index == "people-index"
+    assert body["size"] == MAX_SIZE
+    assert "script" not in body
+    assert body["_source"] == {"excludes": [EMBED_FIELD]}
+
+
+def test_build_search_projects_fields():
+    _, body = build_search({"query": {"match_all": {}}, "_source": ["People"]})
+    assert body["_source"] == {"excludes": [EMBED_FIELD], "includes": ["People"]}
+
+
+def test_knn_filter_carries_the_dsl_constraints():
+    query = {"bool": {"must": [{"match": {"Events": "summit"}}], "filter": [{"term": {"Families.keyword": "Sales"}}]}}
+    assert knn_filter(query) == query
+    assert knn_filter({"match_all": {}}) is None
+    assert knn_filter(None) is None
+
+
+def test_search_timeout_follows_the_deadline():
+    set_deadline(None)
+    assert "timeout" not in with_search_timeout({"size": 1})
+    set_deadline(10)
+    try:
+        assert with_search_timeout({"size": 1})["timeout"].endswith("ms")
+    finally:
+        set_deadline(None)
+
+
+def test_filter_path_can_be_turned_off(monkeypatch):
+    assert es.filter_path(es.SEARCH_FILTER_PATH) == es.SEARCH_FILTER_PATH
+    assert all(p.startswith("responses.") for p in es.MSEARCH_FILTER_PATH)
+    monkeypatch.setattr(es, "FILTER_PATH_ENABLED", False)
+    assert es.filter_path(es.SEARCH_FILTER_PATH) is None
@@ -0,0 +1,63 @@
+# tests/test_es_client.py
+
+import asyncio
+from app import es_client
+from app.deadline import MIN_CALL_TIMEOUT, set_deadline
+from app.es_client import bounded, client_options, es_hosts
+
+
+class FakeClient:
+    """Records the per-call options a view of the client was asked for."""
+
+    def __init__(self):
+        self.options_calls = []
+
+    def options(self, **kwargs):
+        self.options_calls.append(kwargs)
+        return ("view", kwargs)
+
+
+def test_es_hosts_splits_comma_separated_urls():
+    assert es_hosts(" http://a:9200, http://b:9200 ,,") == ["http://a:9200", "http://b:9200"]
+    assert es_hosts(["http://a:9200", " "]) == ["http://a:9200"]
+
+
+def test_client_options_apply_the_configured_policy(monkeypatch):
+    monkeypatch.setattr(es_client, "ES_MAX_RETRIES", 5)
+    monkeypatch.setattr(es_client, "ES_RETRY_ON_STATUS", [429])
+    options = client_options()
+    assert options["max_retries"] == 5 and options["retry_on_status"] == [429]
+    assert options["dead_node_backoff_factor"] == es_client.ES_DEAD_NODE_BACKOFF
+    assert "api_key" not in options and "basic_auth" not in options
+    assert "sniff_on_start" not in options
+
+
+def test_client_options_prefer_the_api_key_and_take_overrides(monkeypatch):
+    monkeypatch.setattr(es_client, "ES_API_KEY", "key")
+    monkeypatch.setattr(es_client, "ES_USERNAME", "elastic")
+    monkeypatch.setattr(es_client, "ES_SNIFF", True)
+    options = client_options(request_timeout=120)
+    assert options["api_key"] == "key" and "basic_auth" not in options
+    assert options["sniff_on_start"] and options["sniff_on_node_failure"]
+    assert options["request_timeout"] == 120
+
+
+def test_client_options_fall_back_to_basic_auth(monkeypatch):
+    monkeypatch.setattr(es_client, "ES_API_KEY", "")
+    monkeypatch.setattr(es_client, "ES_USERNAME", "elastic")
+    monkeypatch.setattr(es_client, "ES_PASSWORD", "secret")
+    assert client_options()["basic_auth"] == ("elastic", "secret")
+
+
+def test_bounded_shortens_the_timeout_to_the_deadline():
+    async def run(seconds):
+        set_deadline(seconds)
+        client = FakeClient()
+        return bounded(client), client
+
+    view, client = asyncio.run(run(None))
+    assert view is client and client.options_calls == []
+
+    view, client = asyncio.run(run(0.5))
+    assert client.options_calls[0]["retry_on_timeout"] is False
+    assert MIN_CALL_TIMEOUT <= client.options_calls[0]["request_timeout"] <= 0.5
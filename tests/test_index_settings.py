@@ -0,0 +1,64 @@
+# tests/test_index_settings.py
+
+import pytest
+from types import SimpleNamespace
+from ingest.index_settings import BULK_PROFILE, bulk_load_profile, bump_generation, force_merge
+
+
+class FakeIndices:
+    """Records the index API calls made against two concrete indices behind an alias."""
+
+    def __init__(self):
+        self.calls = []
+        self.settings = {"people-v1": {"index.refresh_interval": "5s"}, "people-v2": {}}
+        self.meta = {"people-v1": {"generation": 4}, "people-v2": {}}
+
+    def get_settings(self, index, name, flat_settings):
+        return {c: {"settings": dict(s)} for c, s in self.settings.items()}
+
+    def put_settings(self, index, settings):
+        self.calls.append(("put_settings", index, dict(settings)))
+
+    def refresh(self, index):
+        self.calls.append(("refresh", index))
+
+    def get_mapping(self, index):
+        return {c: {"mappings": {"_meta": dict(m)}} for c, m in self.meta.items()}
+
+    def put_mapping(self, index, meta):
+        self.calls.append(("put_mapping", index, meta))
+
+    def forcemerge(self, index, max_num_segments):
+        self.calls.append(("forcemerge", index, max_num_segments))
+
+
+@pytest.fixture
+def es():
+    client = SimpleNamespace(indices=FakeIndices())
+    client.options = lambda **kwargs: client
+    return client
+
+
+def test_bulk_load_profile_restores_settings_even_on_failure(es):
+    with pytest.raises(RuntimeError):
+        with bulk_load_profile(es, "people"):
+            assert es.indices.calls == [("put_settings", "people-v1", BULK_PROFILE),
+                                        ("put_settings", "people-v2", BULK_PROFILE)]
+            raise RuntimeError("load failed")
+    restore = es.indices.calls[2:]
+    assert ("put_settings", "people-v1", {n: ("5s" if n == "index.refresh_interval" else None)
+                                          for n in BULK_PROFILE}) in restore
+    assert ("put_settings", "people-v2", dict.fromkeys(BULK_PROFILE)) in restore
+    assert restore[-1] == ("refresh", "people")
+
+
+def test_bump_generation_refreshes_then_increments_every_concrete_index(es):
+    bump_generation(es, "people")
+    assert es.indices.calls == [("refresh", "people"),
+                                ("put_mapping", "people-v1", {"generation": 5}),
+                                ("put_mapping", "people-v2", {"generation": 1})]
+
+
+def test_force_merge(es):
+    force_merge(es, "people", 1)
+    assert es.indices.calls == [("forcemerge", "people", 1)]
@@ -0,0 +1,100 @@
+# tests/test_ingest.py
+
+from argparse import Namespace
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders
+from elasticsearch.exceptions import ApiError
+from ingest import bulk_load
+from ingest.bulk_load import remember_actions
+from scripts import insert_data
+
+FRAME = pd.DataFrame([{"People": "Ann", "Families": "Lee", "Locations": "Paris", "Events": "Birth"}])
+
+
+def api_error(status):
+    meta = ApiResponseMeta(status=status, http_version="1.1", headers=HttpHeaders(), duration=0.0, node=None)
+    return ApiError("error", meta=meta, body={})
+
+
+def test_insert_data_bumps_the_generation(monkeypatch):
+    bumped = []
+    monkeypatch.setattr(insert_data.helpers, "bulk", lambda es, actions: (len(list(actions)), []))
+    monkeypatch.setattr(insert_data, "bump_generation", lambda es, index: bumped.append(index))
+    insert_data.bulk_insert(object(), FRAME)
+    assert bumped == [insert_data.INDEX_NAME]
+
+
+def test_insert_data_survives_an_api_error_on_bump(monkeypatch, capsys):
+    def bump(es, index):
+        raise api_error(403)
+
+    monkeypatch.setattr(insert_data.helpers, "bulk", lambda es, actions: (len(list(actions)), []))
+    monkeypatch.setattr(insert_data, "bump_generation", bump)
+    insert_data.bulk_insert(object(), FRAME)
+    assert "Failed to bump the index generation" in capsys.readouterr().out
+
+
+def test_remember_actions_keeps_a_bounded_ring():
+    ring = OrderedDict()
+    actions = [{"_id": str(i)} for i in range(10)]
+    assert list(remember_actions(iter(actions), ring, 3)) == actions
+    assert list(ring) == ["7", "8", "9"]
+
+
+def test_send_actions_dead_letters_rejected_actions_without_listing_them(monkeypatch, tmp_path):
+    def bulk_stream(es, actions, **kwargs):
+        for action in actions:
+            if action["_id"] == "3":
+                yield False, {"index": {"_id": "3", "status": 400, "error": {"type": "mapper_parsing_exception"}}}
+            else:
+                yield True, {"index": {"_id": action["_id"], "status": 201}}
+
+    monkeypatch.setattr(bulk_load, "bulk_stream", bulk_stream)
+    args = Namespace(chunk_size=2, request_timeout=1, threads=1, queue_size=1)
+    path = str(tmp_path / "dead.jsonl")
+    actions = ({"_index": "i", "_id": str(i), "_source": {"n": i}} for i in range(10))
+    assert bulk_load.send_actions(None, actions, args, dead_letters=path) == (9, 1)
+    [record] = bulk_load.read_dead_letters(path)
+    assert record["action"] == {"_index": "i", "_id": "3", "_source": {"n": 3}}
+    assert record["status"] == 400
+
+
+def test_make_ids_match_make_id_per_row():
+    df = bulk_load.normalize_df(pd.DataFrame([
+        {"People": " Ann ", "Families": "Lee", "Locations": "Paris, France", "Events": "Birth"},
+        {"People": "Bo", "Families": None, "Locations": "Oslo", "Events": ""},
+    ]))
+    expected = [bulk_load.make_id(row) for row in df.to_dict("records")]
+    assert bulk_load.make_ids(df) == expected
+    assert bulk_load.make_ids(df, workers=2) == expected
+
+
+def test_digests_round_trip_including_trailing_zero_bytes():
+    ids = ["ab" * 32, "00" * 31 + "01", "01" + "00" * 31]
+    digests = bulk_load.ids_to_digests(ids)
+    assert bulk_load.digests_to_ids(digests) == ids
+    manifest = np.unique(digests[:2])
+    assert bulk_load.contains(manifest, digests).tolist() == [True, True, False]
+    assert not bulk_load.contains(np.empty(0, dtype="S32"), digests).any()
+
+
+def test_insert_data_validates_and_normalizes_each_chunk():
+    chunks = [FRAME.assign(People=" Ann "), FRAME.assign(People="Bo")]
+    actions = list(insert_data.generate_actions(chunks))
+    assert [a["_source"]["People"] for a in actions] == ["Ann", "Bo"]
+    assert actions[0] == {"_index": insert_data.INDEX_NAME, "_source": {"People": "Ann", "Families": "Lee",
+                                                                         "Locations": "Paris", "Events": "Birth"}}
+    with pytest.raises(ValueError, match="Missing required columns"):
+        list(insert_data.generate_actions(FRAME.drop(columns=["Events"])))
+
+
+@pytest.mark.parametrize("chunk_rows", [0, 2])
+def test_resume_skips_records_not_lines(tmp_path, chunk_rows):
+    path = tmp_path / "data.csv"
+    path.write_text('People,Families,Locations,Events\n'
+                    'A,T,"Paris,\nFrance",E\nB,T,Oslo,E\nC,T,Rome,E\nD,T,Kyiv,E\nE,T,Lima,E\n')
+    chunks = bulk_load.read_csv_chunks(str(path), chunk_rows, skip_rows=3)
+    assert [p for df in chunks for p in df["People"]] == ["D", "E"]
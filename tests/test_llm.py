@@ -0,0 +1,60 @@
+# tests/test_llm.py
+
+import asyncio
+from types import SimpleNamespace
+from app import llm
+from app.prompts import FEWSHOTS, QUERY_SYS, minify_prompt
+
+
+class FakeCompletions:
+    """Answers chat completions with canned texts, in order, and records the messages sent."""
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs["messages"])
+        message = SimpleNamespace(content=self.texts.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def fake_client(monkeypatch, *texts) -> FakeCompletions:
+    completions = FakeCompletions(*texts)
+    monkeypatch.setattr(llm, "aclient", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return completions
+
+
+def test_llm_to_dsl_parses_the_answer(monkeypatch):
+    completions = fake_client(monkeypatch, '{"query": {"match_all": {}}}')
+    assert asyncio.run(llm.allm_to_dsl("everyone")) == {"query": {"match_all": {}}}
+    assert completions.calls[0][-1] == {"role": "user", "content": "everyone"}
+
+
+def test_llm_to_dsl_repairs_invalid_json_once(monkeypatch):
+    completions = fake_client(monkeypatch, "{'query': oops", '{"query": {"match_all": {}}}')
+    assert asyncio.run(llm.allm_to_dsl("everyone")) == {"query": {"match_all": {}}}
+    assert len(completions.calls) == 2
+    assert completions.calls[1][-1] == {"role": "user", "content": "{'query': oops"}
+
+
+def test_minify_prompt_compacts_json_blocks_and_blank_lines():
+    text = 'Mapping:\n```json\n{\n  "a": 1,\n  "b": [1, 2]\n}\n```   \n\n\n\nRules.\n```json\nnot json\n```'
+    assert minify_prompt(text) == 'Mapping:\n```json\n{"a":1,"b":[1,2]}\n```\n\nRules.\n```json\nnot json\n```'
+
+
+def test_select_fewshots_prefers_similar_examples_within_budget():
+    # The best match is kept even over budget; the rest are added in rank order while they fit
+    assert llm.select_fewshots("People in Osaka who joined a workshop", budget=1) == [1]
+    chosen = llm.select_fewshots("People in Osaka who joined a workshop")
+    assert 1 in chosen and chosen == sorted(chosen)
+    assert sum(llm.FEWSHOT_MESSAGES[i][1] for i in chosen) <= llm.FEWSHOT_TOKEN_BUDGET
+    assert llm.select_fewshots("anything", budget=0) == list(range(len(FEWSHOTS)))
+
+
+def test_messages_share_a_stable_prefix():
+    first, second = llm.build_messages("people in Tokyo"), llm.build_messages("people in Osaka")
+    assert first[0] == second[0] == {"role": "system", "content": QUERY_SYS}
+    assert first[0] is llm.PREFIX_MESSAGES[0]
+    assert first[1:-1] == second[1:-1]
+    assert first[-1] == {"role": "user", "content": "people in Tokyo"}
@@ -0,0 +1,220 @@
+# tests/test_main.py
+
+import json
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import main
+from app.deadline import remaining
+from app.pagination import encode_cursor
+
+DSL = {"index": "people-index", "query": {"match": {"Locations": "Tokyo"}}}
+RESPONSE = {"took": 3, "timed_out": False,
+            "hits": {"total": {"value": 2, "relation": "eq"},
+                     "hits": [{"_source": {"People": "Ann"}}, {"_source": {"People": "Bo"}}]}}
+
+
+def sse_events(text):
+    """Parse a text/event-stream body into (event, data) pairs."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """The app with the planner and DSL cache off and the LLM and Elasticsearch calls replaced."""
+    calls = {"llm": [], "es": [], "summary": []}
+
+    async def no_plan(nl_query):
+        return None
+
+    async def llm_to_dsl(nl_query):
+        calls["llm"].append(nl_query)
+        return dict(DSL)
+
+    async def execute_search(dsl):
+        calls["es"].append(dsl)
+        return RESPONSE
+
+    async def summarize(nl_query, res):
+        calls["summary"].append(nl_query)
+        return "Two people."
+
+    async def stream_summary(nl_query, res):
+        calls["summary"].append(nl_query)
+        for token in ("Two", " people."):
+            yield token
+
+    async def multi_search(dsls):
+        calls["es"].extend(dsls)
+        return [RESPONSE for _ in dsls]
+
+    monkeypatch.setattr(main, "aplan", no_plan)
+    monkeypatch.setattr(main, "DSL_CACHE_ENABLED", False)
+    monkeypatch.setattr(main, "allm_to_dsl", llm_to_dsl)
+    monkeypatch.setattr(main, "aexecute_search", execute_search)
+    monkeypatch.setattr(main, "amulti_search", multi_search)
+    monkeypatch.setattr(main, "asummarize", summarize)
+    monkeypatch.setattr(main, "astream_summary", stream_summary)
+    return TestClient(main.app), calls
+
+
+def test_search_plans_executes_and_summarizes(api):
+    client, calls = api
+    resp = client.post("/search", json={"query": "people in Tokyo", "size": 5})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["path"] == "llm"
+    assert body["dsl"]["size"] == 5
+    assert body["hits"] == [{"People": "Ann"}, {"People": "Bo"}]
+    assert body["es_meta"] == {"took_ms": 3, "hits_total": 2}
+    assert body["summary"] == "Two people."
+    assert calls["llm"] == ["people in Tokyo"] and len(calls["es"]) == 1
+
+
+def test_search_reports_invalid_dsl_as_400(api, monkeypatch):
+    async def bad_dsl(nl_query):
+        return {"index": "people-index", "query": {"script": {"source": "x"}}}
+
+    monkeypatch.setattr(main, "allm_to_dsl", bad_dsl)
+    client, calls = api
+    resp = client.post("/search", json={"query": "anything", "summarize": False})
+    assert resp.status_code == 400
+    assert calls["es"] == []
+
+
+def test_stream_emits_each_stage_in_order(api):
+    client, calls = api
+    resp = client.post("/search/stream", json={"query": "people in Tokyo"})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(resp.text)
+    assert [e for e, _ in events] == ["dsl", "results", "summary", "summary", "done"]
+    assert events[0][1]["path"] == "llm"
+    assert events[1][1]["hits"] == [{"People": "Ann"}, {"People": "Bo"}]
+    assert "".join(data for e, data in events if e == "summary") == "Two people."
+
+
+def test_stream_ends_with_an_error_event(api, monkeypatch):
+    async def failing_search(dsl):
+        raise RuntimeError("index missing")
+
+    monkeypatch.setattr(main, "aexecute_search", failing_search)
+    client, _ = api
+    events = sse_events(client.post("/search/stream", json={"query": "people in Tokyo"}).text)
+    assert [e for e, _ in events] == ["dsl", "error"]
+    assert events[1][1] == {"detail": "index missing", "status": 400}
+
+
+def test_batch_runs_identical_items_once(api):
+    client, calls = api
+    items = [{"query": "people in Tokyo", "summarize": True}, {"query": "people in Oslo", "summarize": False},
+             {"query": "people in Tokyo", "summarize": True}]
+    results = client.post("/search/batch", json={"items": items}).json()["results"]
+    assert len(results) == 3
+    assert results[0] == results[2]
+    assert results[0]["summary"] == "Two people." and results[1]["summary"] is None
+    assert calls["llm"] == ["people in Tokyo", "people in Oslo"]
+    assert len(calls["es"]) == 2
+    assert calls["summary"] == ["people in Tokyo"]
+
+
+def test_batch_reports_failing_items_in_place(api, monkeypatch):
+    async def llm_to_dsl(nl_query):
+        if "Oslo" in nl_query:
+            return {"index": "people-index", "query": {"script": {"source": "x"}}}
+        return dict(DSL)
+
+    monkeypatch.setattr(main, "allm_to_dsl", llm_to_dsl)
+    client, _ = api
+    items = [{"query": "people in Oslo"}, {"query": "people in Tokyo", "summarize": False}]
+    results = client.post("/search/batch", json={"items": items}).json()["results"]
+    assert "error" in results[0]
+    assert results[1]["hits"] == [{"People": "Ann"}, {"People": "Bo"}]
+
+
+def test_batch_rejects_too_many_items(api, monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH_ITEMS", 1)
+    client, _ = api
+    resp = client.post("/search/batch", json={"items": [{"query": "a"}, {"query": "b"}]})
+    assert resp.status_code == 400
+
+
+def test_cursor_pages_are_summarized_for_the_first_page_query(api, monkeypatch):
+    async def page(dsl, state, nl_query):
+        return RESPONSE, None
+
+    monkeypatch.setattr(main, "apage", page)
+    client, calls = api
+    cursor = encode_cursor(DSL, "pit-1", [1.0, 7], "people in Tokyo")
+    body = client.post("/search", json={"query": "", "cursor": cursor}).json()
+    assert body["path"] == "cursor" and body["summary"] == "Two people."
+    assert calls["summary"] == ["people in Tokyo"] and calls["llm"] == []
+
+
+def test_batch_rejects_pagination_per_item(api):
+    client, calls = api
+    items = [{"query": "people in Tokyo", "paginate": True}, {"query": "people in Tokyo", "summarize": False}]
+    results = client.post("/search/batch", json={"items": items}).json()["results"]
+    assert results[0] == {"error": "Cursor pagination is not supported by /search/batch"}
+    assert results[1]["hits"] == [{"People": "Ann"}, {"People": "Bo"}]
+    assert calls["llm"] == ["people in Tokyo"]
+
+
+def test_fields_project_hits_without_reaching_the_dsl_cache(api, monkeypatch):
+    monkeypatch.setattr(main, "DSL_CACHE_ENABLED", True)
+    client, calls = api
+    query = "projection test: people in Tokyo"
+    body = client.post("/search", json={"query": query, "fields": ["People"], "summarize": False}).json()
+    assert body["dsl"]["_source"] == ["People"]
+    assert calls["es"][0]["_source"] == ["People"]
+    assert "_source" not in main.dsl_cache.get(query)
+
+
+def test_search_responses_are_plain_json(api):
+    client, _ = api
+    resp = client.post("/search", json={"query": "people in Tokyo", "summarize": False})
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.json()["summary"] is None
+
+
+@pytest.mark.parametrize("timeout", [0, -1])
+def test_non_positive_timeouts_are_rejected(api, timeout):
+    client, calls = api
+    assert client.post("/search", json={"query": "people in Tokyo", "timeout": timeout}).status_code == 422
+    assert client.post("/search/batch", json={"items": [{"query": "a"}], "timeout": timeout}).status_code == 422
+    assert calls["llm"] == []
+
+
+def test_slow_planning_returns_504(api, monkeypatch):
+    async def slow_llm(nl_query):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(main, "allm_to_dsl", slow_llm)
+    client, calls = api
+    resp = client.post("/search", json={"query": "people in Tokyo", "timeout": 0.1})
+    assert resp.status_code == 504
+    assert calls["es"] == []
+
+
+def test_batch_keeps_time_for_the_search_when_planning_is_slow(api, monkeypatch):
+    async def llm_to_dsl(nl_query):
+        if "Oslo" in nl_query:
+            await asyncio.sleep(5)
+        return dict(DSL)
+
+    async def multi_search(dsls):
+        left.append(remaining())
+        return [RESPONSE for _ in dsls]
+
+    left = []
+    monkeypatch.setattr(main, "allm_to_dsl", llm_to_dsl)
+    monkeypatch.setattr(main, "amulti_search", multi_search)
+    client, _ = api
+    items = [{"query": "people in Oslo", "summarize": False}, {"query": "people in Tokyo", "summarize": False}]
+    results = client.post("/search/batch", json={"items": items, "timeout": 0.5}).json()["results"]
+    assert "Deadline exceeded" in results[0]["error"]
+    assert results[1]["hits"] == [{"People": "Ann"}, {"People": "Bo"}]
+    assert left[0] > 0
@@ -0,0 +1,43 @@
+# tests/test_metrics.py
+
+import asyncio
+from app.metrics import Counter, Histogram, RequestTimer, request_seconds
+
+
+def test_counter_renders_full_precision():
+    c = Counter("t_tokens_total", "Tokens.", ("kind",))
+    c.inc("prompt", amount=1234567)
+    c.inc("prompt", amount=3)
+    assert c.render()[-1] == 't_tokens_total{kind="prompt"} 1234570.0'
+
+
+def test_counter_escapes_labels():
+    c = Counter("t_total", "Help.", ("name",))
+    c.inc('a"b\\c\nd')
+    assert c.render()[-1] == 't_total{name="a\\"b\\\\c\\nd"} 1.0'
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "Durations.", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, "es")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="es",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="es",le="1"} 2' in lines
+    assert 't_seconds_bucket{stage="es",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="es"} 3' in lines
+
+
+def test_request_timer_observes_status():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(RequestTimer(app)({"type": "http"}, None, send))
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
+    assert any('endpoint="unmatched",status="404"' in line for line in request_seconds.render())
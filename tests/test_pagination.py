@@ -0,0 +1,52 @@
+# tests/test_pagination.py
+
+import json
+import zlib
+import base64
+import pytest
+from app.pagination import encode_cursor, decode_cursor, page_sort
+
+DSL = {"index": "people-index", "query": {"match": {"Locations": "Tokyo"}}, "size": 10}
+
+
+def _forge(state: dict, signature: str) -> str:
+    payload = zlib.compress(json.dumps(state).encode())
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=") + "." + signature
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(DSL, "pit-1", [1.5, 42])
+    assert decode_cursor(token) == {"dsl": DSL, "pit": "pit-1", "after": [1.5, 42], "query": ""}
+
+
+def test_cursor_is_url_safe():
+    token = encode_cursor(DSL, "p+/=", ["a b"])
+    assert all(c.isalnum() or c in "-_." for c in token)
+
+
+@pytest.mark.parametrize("change", [
+    {"pit": "pit-on-another-index"},
+    {"dsl": {**DSL, "index": "secrets"}},
+    {"after": [0, 0]},
+])
+def test_tampered_cursor_is_rejected(change):
+    signature = encode_cursor(DSL, "pit-1", [1.5, 42]).split(".")[1]
+    forged = _forge({"dsl": DSL, "pit": "pit-1", "after": [1.5, 42], **change}, signature)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(forged)
+
+
+@pytest.mark.parametrize("token", ["", "garbage", "a.b.c", encode_cursor(DSL, "pit-1", [1]).split(".")[0]])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(token)
+
+
+def test_page_sort_adds_tiebreaker():
+    assert page_sort({}) == [{"_score": "desc"}, {"_shard_doc": "asc"}]
+    assert page_sort({}, scored=False) == [{"_shard_doc": "asc"}]
+    assert page_sort({"sort": {"Date": "desc"}}) == [{"Date": "desc"}, {"_shard_doc": "asc"}]
+
+
+def test_cursor_carries_the_first_page_query():
+    assert decode_cursor(encode_cursor(DSL, "pit-1", [1], "people in Tokyo"))["query"] == "people in Tokyo"
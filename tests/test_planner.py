@@ -0,0 +1,118 @@
+# tests/test_planner.py
+
+import time
+import asyncio
+import pytest
+from types import SimpleNamespace
+from app import planner
+from app.planner import Gazetteer, plan
+from app.es import ES_CONCURRENCY
+
+
+@pytest.fixture
+def gaz():
+    g = Gazetteer()
+    g.terms["locations"] = {"tokyo, japan": "Tokyo, Japan"}
+    g.terms["countries"] = {"japan": "Japan"}
+    g.terms["families"] = {"customer success": "Customer Success"}
+    return g
+
+
+def test_count_per_dimension(gaz):
+    p = plan("Count people per team", gaz)
+    assert p.rule == "count_per"
+    assert p.dsl["aggs"] == {"by_team": {"terms": {"field": "Families.keyword", "size": 50}}}
+
+
+def test_top_n_for_event(gaz):
+    p = plan("Top 5 locations for cybersecurity training", gaz)
+    assert p.rule == "top_n_for"
+    assert p.dsl["query"]["match"]["Events"]["query"] == "cybersecurity training"
+    assert p.dsl["aggs"]["top_locations"]["terms"]["size"] == 5
+
+
+def test_people_in_known_place(gaz):
+    p = plan("People in Tokyo, Japan", gaz)
+    assert p.rule == "people_in"
+    assert p.dsl["query"] == {"match": {"Locations": "Tokyo, Japan"}}
+
+
+def test_people_in_with_event(gaz):
+    p = plan("people in Japan who joined the workshop", gaz)
+    assert p.rule == "people_in_with_event"
+    assert {"match": {"Events": "workshop"}} in p.dsl["query"]["bool"]["must"]
+
+
+def test_unknown_place_is_not_planned(gaz):
+    assert plan("people in Atlantis", gaz) is None
+
+
+@pytest.mark.parametrize("query", [
+    "people in Japan who did not join the workshop",
+    "people in Japan who did not attend any workshop",
+    "people in Japan who joined a workshop and not the summit",
+    "people in Japan who never attended the summit",
+    "people in Customer Success who didn't complete the training",
+    "people in Japan without a workshop",
+    "Top 3 teams for training except the workshop",
+    "Count people per team not in Japan",
+])
+def test_negations_are_not_planned(gaz, query):
+    assert plan(query, gaz) is None
+
+
+@pytest.mark.parametrize("query", [
+    "Top 3 teams for workshop in Tokyo",
+    "Top 3 teams for the summit at London",
+    "people in Japan who joined the workshop in Tokyo",
+    "people in Japan who attended the summit from Sales",
+])
+def test_event_followed_by_place_is_not_planned(gaz, query):
+    assert plan(query, gaz) is None
+
+
+class FakeES:
+    """Answers the gazetteer's terms aggregation, counting calls and the ES slots they held."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.slots = []
+
+    def options(self, **kwargs):
+        return self
+
+    async def search(self, **kwargs):
+        self.calls += 1
+        self.slots.append(planner.es_semaphore._value)
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(body={"aggregations": {"cities": {"buckets": [{"key": f"Oslo{self.calls}"}]}}})
+
+
+def test_gazetteer_first_load_waits_under_the_es_limit(monkeypatch):
+    es = FakeES()
+    monkeypatch.setattr(planner, "aes", es)
+    g = Gazetteer()
+    asyncio.run(g.refresh())
+    assert g.lookup("oslo1") == ("cities", "Oslo1")
+    assert es.slots == [ES_CONCURRENCY - 1]
+
+
+def test_gazetteer_reloads_stale_terms_in_the_background(monkeypatch):
+    es = FakeES(delay=0.02)
+    monkeypatch.setattr(planner, "aes", es)
+    g = Gazetteer()
+    g.terms["cities"] = {"bergen": "Bergen"}
+    g.loaded_at = time.monotonic() - planner.GAZETTEER_TTL - 1
+
+    async def main():
+        await g.refresh()
+        await g.refresh()
+        # The request is not held up: the stale terms are still served while the reload runs
+        served = g.lookup("bergen")
+        await g._task
+        return served
+
+    assert asyncio.run(main()) == ("cities", "Bergen")
+    assert es.calls == 1
+    assert g.lookup("oslo1") == ("cities", "Oslo1")
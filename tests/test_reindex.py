@@ -0,0 +1,61 @@
+# tests/test_reindex.py
+
+import pytest
+from types import SimpleNamespace
+from scripts.reindex import swap_alias, delete_old_versions, versioned_indices
+
+
+class FakeIndices:
+    """An index namespace where `aliases` maps alias -> indices and `concrete` lists the indices."""
+
+    def __init__(self, concrete, aliases=None):
+        self.concrete = set(concrete)
+        self.aliases = aliases or {}
+        self.updates, self.deleted = [], []
+
+    def exists(self, index):
+        return index in self.concrete or index in self.aliases
+
+    def exists_alias(self, name):
+        return name in self.aliases
+
+    def get_alias(self, name):
+        return {i: {"aliases": {name: {}}} for i in self.aliases[name]}
+
+    def get(self, index, **kwargs):
+        prefix = index.rstrip("*")
+        return {i: {} for i in self.concrete if i.startswith(prefix)}
+
+    def update_aliases(self, actions):
+        self.updates.append(actions)
+
+    def delete(self, index):
+        self.deleted.append(index)
+
+
+def client(concrete, aliases=None):
+    return SimpleNamespace(indices=FakeIndices(concrete, aliases))
+
+
+def test_swap_moves_the_alias_in_one_request():
+    es = client({"people-v1", "people-v2"}, {"people": ["people-v1"]})
+    swap_alias(es, "people", "people-v2")
+    assert es.indices.updates == [[{"remove": {"index": "people-v1", "alias": "people"}},
+                                   {"add": {"index": "people-v2", "alias": "people"}}]]
+
+
+def test_swap_replaces_a_legacy_index_only_when_asked():
+    es = client({"people", "people-v1"})
+    with pytest.raises(ValueError):
+        swap_alias(es, "people", "people-v1")
+    assert es.indices.updates == []
+    swap_alias(es, "people", "people-v1", drop_legacy_index=True)
+    assert es.indices.updates == [[{"remove_index": {"index": "people"}},
+                                   {"add": {"index": "people-v1", "alias": "people"}}]]
+
+
+def test_old_versions_are_deleted_but_never_the_live_one():
+    es = client({"people-v1", "people-v2", "people-v3", "people-v10"}, {"people": ["people-v2"]})
+    assert versioned_indices(es, "people") == {1: "people-v1", 2: "people-v2", 3: "people-v3", 10: "people-v10"}
+    delete_old_versions(es, "people", keep=2)
+    assert es.indices.deleted == ["people-v1"]
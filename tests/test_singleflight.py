@@ -0,0 +1,101 @@
+# tests/test_singleflight.py
+
+import asyncio
+import pytest
+from app.deadline import set_deadline
+from app.singleflight import SingleFlight
+
+
+def test_followers_share_one_call_and_get_copies():
+    async def main():
+        flights, calls = SingleFlight("test"), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"hits": [1]}
+
+        results = await asyncio.gather(*(flights.do("k", work) for _ in range(3)))
+        results[1]["hits"].append(2)
+        return flights, calls, results
+
+    flights, calls, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert results[0] == results[2] == {"hits": [1]}
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": 2}
+
+
+def test_leader_exception_reaches_followers():
+    async def main():
+        flights = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.02)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flights.do("k", work) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_follower_takes_over_from_a_cancelled_leader():
+    async def main():
+        flights, calls = SingleFlight("test"), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, calls
+
+    result, calls = asyncio.run(main())
+    assert result == "done"
+    assert len(calls) == 2
+
+
+def test_follower_takes_over_from_a_leader_out_of_time():
+    async def main():
+        flights = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def short():
+            set_deadline(0.01)
+            async with flights.lead("k"):
+                await asyncio.sleep(0.02)
+                raise TimeoutError("out of time")
+
+        leader = asyncio.create_task(short())
+        await asyncio.sleep(0.005)
+        follower = asyncio.create_task(flights.do("k", work))
+        with pytest.raises(TimeoutError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_disabled_never_coalesces():
+    async def main():
+        flights, calls = SingleFlight("test", enabled=False), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 1
+
+        await asyncio.gather(*(flights.do("k", work) for _ in range(3)))
+        return calls
+
+    assert len(asyncio.run(main())) == 3
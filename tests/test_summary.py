@@ -0,0 +1,62 @@
+# tests/test_summary.py
+
+from app.summary import (compact_results, estimate_tokens, summary_key, trim_aggs, SUMMARY_AGG_ONLY_HITS,
+                         SUMMARY_TOP_K)
+
+
+def hit(score, **source):
+    return {"_score": score, "_source": {"Families": "Sales", **source}}
+
+
+def response(hits, total=None, aggs=None):
+    res = {"hits": {"total": {"value": len(hits) if total is None else total}, "hits": hits}}
+    if aggs is not None:
+        res["aggregations"] = aggs
+    return res
+
+
+def test_trim_aggs_keeps_the_top_buckets_at_every_level():
+    inner = {"buckets": [{"key": c, "doc_count": 1} for c in "xyz"]}
+    aggs = {"by_team": {"buckets": [{"key": k, "doc_count": 3, "by_city": inner} for k in "abcd"]}, "n": {"value": 4}}
+    trimmed = trim_aggs(aggs, 2)
+    assert [b["key"] for b in trimmed["by_team"]["buckets"]] == ["a", "b"]
+    assert trimmed["by_team"]["other_buckets"] == 2
+    assert trimmed["by_team"]["buckets"][0]["by_city"]["other_buckets"] == 1
+    assert trimmed["n"] == {"value": 4}
+    assert len(aggs["by_team"]["buckets"]) == 4
+
+
+def test_compact_results_ranks_projects_and_dedupes_hits():
+    hits = [hit(1.0, People="Bo", Embedding=[0.1]), hit(3.0, People="Ann"), hit(2.0, People="Ann")]
+    payload = compact_results("sales people", response(hits))
+    assert payload["common"] == {"Families": "Sales"}
+    assert payload["hits"] == [{"People": "Ann", "count": 2}, {"People": "Bo"}]
+    assert payload["hits_total"] == 3 and payload["hits_omitted"] == 0
+
+
+def test_compact_results_keeps_only_the_top_k_hits():
+    hits = [hit(float(i), People=f"P{i}") for i in range(SUMMARY_TOP_K + 5)]
+    payload = compact_results("sales people", response(hits), budget=10 ** 6)
+    assert payload["hits_omitted"] == 5
+    assert payload["hits"][0] == {"People": f"P{SUMMARY_TOP_K + 4}"}
+
+
+def test_compact_results_sends_only_aggregations_for_large_result_sets():
+    aggs = {"by_team": {"buckets": [{"key": "Sales", "doc_count": 900}]}}
+    payload = compact_results("count per team", response([hit(1.0, People="Ann")], SUMMARY_AGG_ONLY_HITS + 1, aggs))
+    assert payload["hits"] == [] and payload["aggs"] == aggs
+
+
+def test_compact_results_fits_the_budget():
+    hits = [hit(float(i), People=f"Person {i}", Events="A long event name " * 5) for i in range(20)]
+    aggs = {"by_city": {"buckets": [{"key": f"City {i}", "doc_count": i} for i in range(40)]}}
+    payload = compact_results("sales people", response(hits, aggs=aggs), budget=200)
+    assert estimate_tokens(payload) <= 200
+    assert payload["hits_omitted"] > 0
+
+
+def test_summary_key_ignores_query_phrasing_but_not_results():
+    payload = compact_results("Sales people", response([hit(1.0, People="Ann")]))
+    other = compact_results("Sales people", response([hit(1.0, People="Bo")]))
+    assert summary_key("Sales people", payload) == summary_key("  sales PEOPLE?", payload)
+    assert summary_key("Sales people", payload) != summary_key("Sales people", other)
@@ -0,0 +1,42 @@
+# tests/test_telemetry.py
+
+from app.telemetry import TelemetryWriter, replay
+
+
+def record(nl, dsl):
+    return {"ts": 0, "nl_query": nl, "dsl": dsl, "ok": True, "hits_total": 1, "took_ms": 1, "error": None,
+            "stages_ms": {}}
+
+
+def test_records_round_trip_through_the_file(tmp_path):
+    path = str(tmp_path / "telemetry.jsonl")
+    w = TelemetryWriter(path)
+    for i in range(3):
+        w.submit(record(f"q{i}", {"query": {"match_all": {}}}))
+    w.close()
+    records = list(replay(path))
+    assert [r["nl_query"] for r in records] == ["q0", "q1", "q2"]
+    assert all(r["dsl"] == {"query": {"match_all": {}}} for r in records)
+    assert w.written == 3 and w.dropped == 0
+    assert sum(1 for line in open(path) if '"type":"dsl"' in line) == 1
+
+
+def test_seen_hashes_are_bounded(tmp_path):
+    path = str(tmp_path / "telemetry.jsonl")
+    w = TelemetryWriter(path, seen=2)
+    for i in range(10):
+        w.submit(record("q", {"query": {"term": {"n": i}}}))
+    w.submit(record("q", {"query": {"term": {"n": 0}}}))
+    w.close()
+    assert len(w._seen) == 2
+    # The forgotten DSL is written again, so the file still resolves every record
+    assert [r["dsl"]["query"]["term"]["n"] for r in replay(path)] == list(range(10)) + [0]
+
+
+def test_logger_mode_is_bounded_too():
+    w = TelemetryWriter("", seen=3)
+    for i in range(20):
+        w.submit(record("q", {"query": {"term": {"n": i}}}))
+    w.close()
+    assert len(w._seen) == 3
+    assert w.written == 20
@@ -0,0 +1,54 @@
+# tests/test_validators.py
+
+import pytest
+from app.validators import validate_dsl, MAX_QUERY_DEPTH, MAX_TERMS_VALUES, MAX_AGG_SIZE
+
+
+def dsl(query, **extra):
+    return {"index": "people-index", "query": query, **extra}
+
+
+@pytest.mark.parametrize("query", [
+    {"match": {"Locations": "Tokyo"}},
+    {"bool": {"must": [{"match": {"Events": "summit"}}], "filter": [{"term": {"Families.keyword": "Sales"}}]}},
+    {"regexp": {"People.keyword": "Lau.*"}},
+    {"query_string": {"query": "Events:(summit OR workshop)"}},
+    {"match": {"Events": "delete customer data"}},
+])
+def test_valid_queries(query):
+    assert validate_dsl(dsl(query)) is True
+
+
+def test_other_index_is_rejected():
+    with pytest.raises(ValueError, match="Index not allowed"):
+        validate_dsl({"index": "secrets", "query": {"match_all": {}}})
+
+
+@pytest.mark.parametrize("query, message", [
+    ({"script": {"script": "ctx"}}, "Disallowed operation"),
+    ({"function_score": {"query": {"match_all": {}}}}, "Query type not allowed"),
+    ({"match": {"Events": {"query": "x", "script": "y"}}}, "Disallowed operation"),
+    ({"match": {"Events": "x"}, "term": {"a": 1}}, "exactly one query type"),
+    ({"terms": {"City.keyword": ["x"] * (MAX_TERMS_VALUES + 1)}}, "more than"),
+])
+def test_invalid_queries(query, message):
+    with pytest.raises(ValueError, match=message):
+        validate_dsl(dsl(query))
+
+
+def test_depth_limit():
+    query = {"match_all": {}}
+    for _ in range(MAX_QUERY_DEPTH):
+        query = {"bool": {"must": [query]}}
+    with pytest.raises(ValueError, match="nested deeper"):
+        validate_dsl(dsl(query))
+
+
+def test_aggregations():
+    ok = {"by_team": {"terms": {"field": "Families.keyword", "size": 10},
+                      "aggs": {"top": {"top_hits": {"size": 1}}}}}
+    assert validate_dsl(dsl({"match_all": {}}, aggs=ok)) is True
+    with pytest.raises(ValueError, match="size exceeds"):
+        validate_dsl(dsl({"match_all": {}}, aggs={"t": {"terms": {"field": "x", "size": MAX_AGG_SIZE + 1}}}))
+    with pytest.raises(ValueError, match="Disallowed operation"):
+        validate_dsl(dsl({"match_all": {}}, aggs={"s": {"scripted_metric": {}}}))